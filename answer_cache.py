@@ -0,0 +1,206 @@
+import atexit
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+def normalize_query(query: str) -> str:
+    """Нормализация вопроса: регистр, ё/е, пунктуация и лишние пробелы"""
+    query = query.lower().replace("ё", "е")
+    query = re.sub(r"[^\w\s-]", " ", query)
+    return " ".join(query.split())
+
+class AnswerCache:
+    """
+    Кэш готовых ответов по руководству.
+    Точный уровень - по нормализованному вопросу,
+    семантический - по косинусному расстоянию между эмбеддингами вопросов.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 7 * 24 * 3600,
+                 semantic_distance: float = 0.08, persist_path: Optional[str] = None,
+                 save_interval: float = 60):
+        """
+        save_interval - файл переписывается не чаще раза в столько секунд
+        (и при выходе процесса), а не при каждом новом ответе.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic_distance = semantic_distance
+        self.persist_path = persist_path
+        self.save_interval = save_interval
+
+        self._entries: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        # Нормированные эмбеддинги по руководствам для семантического поиска
+        self._matrices: Dict[str, Tuple[List[Tuple[str, str]], np.ndarray]] = {}
+        self._lock = threading.Lock()
+        # Запись файла - отдельно от блокировки записей, чтобы get не ждал сериализацию
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+        self.stats_counters = {"hits": 0, "semantic_hits": 0, "misses": 0}
+
+        if persist_path:
+            self._load()
+            atexit.register(self.flush)
+
+    def get(self, manual: str, query: str, index_version: str,
+            query_embedding=None) -> Optional[str]:
+        """Ответ из кэша или None"""
+        key = (manual, normalize_query(query))
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._is_valid(entry, index_version, now):
+                self._entries.move_to_end(key)
+                self.stats_counters["hits"] += 1
+                return entry["answer"]
+
+            if query_embedding is not None and self.semantic_distance > 0:
+                similar_key = self._find_similar(manual, query_embedding, index_version, now)
+                if similar_key is not None:
+                    self._entries.move_to_end(similar_key)
+                    self.stats_counters["semantic_hits"] += 1
+                    return self._entries[similar_key]["answer"]
+
+            self.stats_counters["misses"] += 1
+            return None
+
+    def put(self, manual: str, query: str, answer: str, index_version: str,
+            query_embedding=None):
+        key = (manual, normalize_query(query))
+
+        with self._lock:
+            self._entries[key] = {
+                "answer": answer,
+                "index_version": index_version,
+                "created": time.time(),
+                "embedding": self._normalize(query_embedding)
+            }
+            self._entries.move_to_end(key)
+            self._matrices.pop(manual, None)
+
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._matrices.pop(old_key[0], None)
+            self._dirty = True
+
+        self._save_if_due()
+
+    def invalidate(self, manual: str):
+        """Сброс ответов по руководству (например, после переиндексации)"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == manual]:
+                del self._entries[key]
+            self._matrices.pop(manual, None)
+            self._dirty = True
+
+        self._save_if_due()
+
+    def flush(self):
+        """Запись несохраненных изменений на диск (при остановке бота)"""
+        self._save()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats_counters, size=len(self._entries))
+
+    def _is_valid(self, entry: Dict, index_version: str, now: float) -> bool:
+        return entry["index_version"] == index_version and now - entry["created"] <= self.ttl
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        if embedding is None:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _find_similar(self, manual: str, query_embedding, index_version: str,
+                      now: float) -> Optional[Tuple[str, str]]:
+        query_vector = self._normalize(query_embedding)
+        if query_vector is None:
+            return None
+
+        if manual not in self._matrices:
+            keys = [key for key, entry in self._entries.items()
+                    if key[0] == manual and entry["embedding"] is not None]
+            if not keys:
+                return None
+            self._matrices[manual] = (keys, np.stack([self._entries[k]["embedding"] for k in keys]))
+
+        keys, matrix = self._matrices[manual]
+        distances = 1.0 - matrix @ query_vector
+
+        for i in np.argsort(distances):
+            if distances[i] > self.semantic_distance:
+                break
+            entry = self._entries.get(keys[i])
+            if entry and self._is_valid(entry, index_version, now):
+                return keys[i]
+
+        return None
+
+    def _load(self):
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        except (OSError, ValueError):
+            print(f"⚠️ Не удалось прочитать кэш ответов '{self.persist_path}'")
+            return
+
+        for item in items:
+            self._entries[(item["manual"], item["query"])] = {
+                "answer": item["answer"],
+                "index_version": item["index_version"],
+                "created": item["created"],
+                "embedding": self._normalize(item.get("embedding"))
+            }
+
+    def _save_if_due(self):
+        if self.persist_path and time.monotonic() - self._last_save >= self.save_interval:
+            self._save()
+
+    def _save(self):
+        if not self.persist_path:
+            return
+
+        with self._save_lock:
+            # Под блокировкой - только снимок ссылок: записи не меняются на месте, put заменяет их целиком
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = list(self._entries.items())
+                self._dirty = False
+                self._last_save = time.monotonic()
+
+            items = [
+                {
+                    "manual": manual,
+                    "query": query,
+                    "answer": entry["answer"],
+                    "index_version": entry["index_version"],
+                    "created": entry["created"],
+                    "embedding": entry["embedding"].tolist() if entry["embedding"] is not None else None
+                }
+                for (manual, query), entry in snapshot
+            ]
+
+            try:
+                os.makedirs(os.path.dirname(self.persist_path) or ".", exist_ok=True)
+                tmp_path = self.persist_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(items, f, ensure_ascii=False)
+                os.replace(tmp_path, self.persist_path)
+            except OSError as e:
+                with self._lock:
+                    self._dirty = True
+                print(f"⚠️ Не удалось сохранить кэш ответов: {str(e)}")
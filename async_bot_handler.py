@@ -0,0 +1,308 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Optional
+from telebot.async_telebot import AsyncTeleBot
+from config.settings import settings
+from agents.ollama_client import LLMError
+from utils.metrics import metrics
+from utils.startup import BackgroundCoordinator, format_startup_text
+from telegram_bot.bot_handler import (
+    STARTING_TEXT, STARTUP_FAILED_TEXT, WELCOME_TEXT,
+    format_pdf_list_text, format_stats_text, format_status_text
+)
+from telegram_bot.stream_editor import StreamingMessageEditor, format_load_progress
+
+class WorkerPools:
+    """Отдельные ограниченные пулы потоков для каждого этапа обработки"""
+
+    def __init__(self):
+        self.pools = {
+            "embedding": ThreadPoolExecutor(settings.EMBEDDING_WORKERS, thread_name_prefix="embed"),
+            "retrieval": ThreadPoolExecutor(settings.RETRIEVAL_WORKERS, thread_name_prefix="retrieve"),
+            "llm": ThreadPoolExecutor(settings.LLM_WORKERS, thread_name_prefix="llm"),
+            # Индексация PDF долгая - держим ее отдельно, чтобы не занимать пулы вопросов
+            "indexing": ThreadPoolExecutor(settings.INDEXING_WORKERS, thread_name_prefix="index")
+        }
+
+    async def run(self, pool_name: str, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+
+        def timed():
+            metrics.queue_seconds.observe(time.perf_counter() - submitted, pool=pool_name)
+            return func(*args)
+
+        return await loop.run_in_executor(self.pools[pool_name], timed)
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+class ChatScheduler:
+    """
+    Порядок и ограничение нагрузки: задачи одного чата выполняются по очереди,
+    одновременно обрабатывается не больше MAX_CONCURRENT_REQUESTS задач,
+    а при переполнении очереди новые запросы отклоняются.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int, max_pending_per_chat: int):
+        self.max_queued = max_queued
+        self.max_pending_per_chat = max_pending_per_chat
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_pending: Dict[int, int] = {}
+        self._pending = 0
+
+    async def submit(self, chat_id: int, job: Callable[[], Awaitable[None]]) -> bool:
+        """Выполнение задачи чата. Возвращает False, если задача отклонена из-за перегрузки"""
+        if (self._pending >= self.max_queued
+                or self._chat_pending.get(chat_id, 0) >= self.max_pending_per_chat):
+            return False
+
+        self._pending += 1
+        self._chat_pending[chat_id] = self._chat_pending.get(chat_id, 0) + 1
+        lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+        submitted = time.perf_counter()
+
+        try:
+            async with lock:
+                async with self._semaphore:
+                    metrics.queue_seconds.observe(time.perf_counter() - submitted, pool="scheduler")
+                    await job()
+        finally:
+            self._pending -= 1
+            self._chat_pending[chat_id] -= 1
+            if not self._chat_pending[chat_id]:
+                del self._chat_pending[chat_id]
+                if not lock.locked():
+                    self._chat_locks.pop(chat_id, None)
+
+        return True
+
+class AsyncTelegramBotHandler:
+    """Асинхронный обработчик Telegram бота с пулами воркеров"""
+
+    def __init__(self, bot: Optional[AsyncTeleBot] = None,
+                 coordinator=None):
+        """
+        bot и coordinator можно подменить (нагрузочный тест с имитацией Telegram).
+        Без coordinator агенты создаются в фоне (LAZY_STARTUP), а бот уже отвечает на команды.
+        """
+        self.bot = bot or AsyncTeleBot(settings.TELEGRAM_BOT_TOKEN)
+        self.startup = BackgroundCoordinator(coordinator=coordinator).start(background=settings.LAZY_STARTUP)
+        self.user_sessions: Dict[int, Dict] = {}
+        self.workers = WorkerPools()
+        self.scheduler: ChatScheduler = None
+
+        self.setup_handlers()
+
+    @property
+    def coordinator(self):
+        return self.startup.coordinator
+
+    async def reply_if_not_ready(self, message) -> bool:
+        """Ответ «бот запускается», пока агенты не загружены"""
+        if self.startup.ready:
+            return False
+        failed = self.startup.state == BackgroundCoordinator.FAILED
+        await self.bot.reply_to(message, STARTUP_FAILED_TEXT if failed else STARTING_TEXT)
+        return True
+
+    def setup_handlers(self):
+        """Настройка обработчиков команд"""
+
+        @self.bot.message_handler(commands=['start', 'help'])
+        async def send_welcome(message):
+            await self.bot.reply_to(message, WELCOME_TEXT)
+
+        @self.bot.message_handler(commands=['load_pdf'])
+        async def handle_load_pdf(message):
+            """Показать список доступных PDF файлов"""
+            if await self.reply_if_not_ready(message):
+                return
+            await self.bot.reply_to(message, format_pdf_list_text(self.coordinator.pdf_catalogue()))
+
+            self.user_sessions[message.chat.id] = {"waiting_for_pdf": True}
+
+        @self.bot.message_handler(commands=['search_all'])
+        async def handle_search_all(message):
+            """Поиск по всем руководствам с группировкой по моделям"""
+            question = message.text.partition(' ')[2].strip()
+            if not question:
+                await self.bot.reply_to(message, "Укажите вопрос: /search_all в каких моделях есть вариатор")
+                return
+            if await self.reply_if_not_ready(message):
+                return
+
+            accepted = await self.scheduler.submit(
+                message.chat.id, lambda: self.search_all(message, question)
+            )
+            if not accepted:
+                await self.bot.reply_to(message, "Бот сейчас перегружен, повторите запрос через минуту.")
+
+        @self.bot.message_handler(commands=['status'])
+        async def handle_status(message):
+            startup = self.startup.status()
+            if not self.startup.ready:
+                await self.bot.reply_to(message, "Статус системы:\n\n" + format_startup_text(startup))
+                return
+            # Счетчики коллекции и кэша берутся под блокировками - не на цикле событий
+            status = await self.workers.run("retrieval", self.coordinator.get_system_status, message.chat.id)
+            status["startup"] = startup
+            await self.bot.reply_to(message, format_status_text(status))
+
+        @self.bot.message_handler(commands=['stats'])
+        async def handle_stats(message):
+            if message.chat.id not in settings.ADMIN_CHAT_IDS:
+                await self.bot.reply_to(message, "Команда доступна только администраторам")
+                return
+            await self.bot.reply_to(message, format_stats_text(metrics.summary()))
+
+        @self.bot.message_handler(func=lambda message: True)
+        async def handle_all_messages(message):
+            """Обработка ВСЕХ сообщений"""
+            user_id = message.chat.id
+
+            if not message.text.startswith('/') and await self.reply_if_not_ready(message):
+                return
+
+            if user_id in self.user_sessions and self.user_sessions[user_id].get("waiting_for_pdf"):
+                pdf_filename = message.text.strip()
+
+                if pdf_filename not in self.coordinator.available_pdfs():
+                    await self.bot.reply_to(message, f"Файл '{pdf_filename}' не найден в списке доступных. Пожалуйста, выберите из списка выше.")
+                    return
+
+                del self.user_sessions[user_id]
+                accepted = await self.scheduler.submit(
+                    user_id, lambda: self.load_pdf(message, pdf_filename)
+                )
+
+            elif message.text.startswith('/'):
+                await self.bot.reply_to(message, "Неизвестная команда. Используйте /help для списка команд")
+                return
+
+            else:
+                accepted = await self.scheduler.submit(
+                    user_id, lambda: self.answer_question(message)
+                )
+
+            if not accepted:
+                await self.bot.reply_to(message, "Бот сейчас перегружен, повторите запрос через минуту.")
+
+    async def load_pdf(self, message, pdf_filename: str):
+        processing_msg = await self.bot.reply_to(message, f"Загружаю файл '{pdf_filename}'...")
+        loop = asyncio.get_running_loop()
+
+        progress = StreamingMessageEditor(
+            edit_func=lambda text: asyncio.run_coroutine_threadsafe(self.bot.edit_message_text(
+                text, message.chat.id, processing_msg.message_id
+            ), loop).result(timeout=30),
+            cursor=""
+        )
+
+        def report_progress(page: int, total: int, added: int):
+            progress.update(format_load_progress(pdf_filename, page, total, added))
+
+        try:
+            response = await self.workers.run(
+                "indexing", self.coordinator.load_pdf, pdf_filename, message.chat.id, report_progress
+            )
+            await self.bot.delete_message(message.chat.id, processing_msg.message_id)
+            await self.bot.reply_to(message, response)
+        except Exception as e:
+            metrics.errors.inc(stage="load")
+            await self.bot.delete_message(message.chat.id, processing_msg.message_id)
+            await self.bot.reply_to(message, f"Ошибка при загрузке: {str(e)}")
+
+    async def search_all(self, message, question: str):
+        processing_msg = await self.bot.reply_to(message, "🔍 Ищу во всех руководствах...")
+        try:
+            response = await self.workers.run(
+                "retrieval", self.coordinator.search_all_manuals, question
+            )
+        except Exception as e:
+            response = f"Ошибка при поиске: {str(e)}"
+        await self.bot.delete_message(message.chat.id, processing_msg.message_id)
+        await self.bot.reply_to(message, response)
+
+    async def answer_question(self, message):
+        user_id = message.chat.id
+
+        if not self.coordinator.has_pdf(user_id):
+            await self.bot.reply_to(message, "Сначала загрузите PDF-файл командой /load_pdf")
+            return
+
+        question = message.text
+        started = time.perf_counter()
+        processing_msg = await self.bot.reply_to(message, "🔍 Ищу информацию в документах...")
+
+        try:
+            # Эмбеддинг, поиск в Chroma и генерация идут в разных пулах
+            query_embedding = await self.workers.run(
+                "embedding", self.coordinator.embed_query, question, user_id
+            )
+            prepared = await self.workers.run(
+                "retrieval", self.coordinator.prepare_answer, question, user_id, query_embedding
+            )
+            if settings.STREAM_RESPONSES:
+                await self.stream_answer(message, processing_msg, question, prepared)
+            else:
+                response = await self.workers.run(
+                    "llm", self.coordinator.generate_answer, question, prepared
+                )
+                # span привязан к потоку, в корутине время отправки замеряем вручную
+                send_started = time.perf_counter()
+                await self.bot.delete_message(message.chat.id, processing_msg.message_id)
+                await self.bot.reply_to(message, response)
+                metrics.observe_stage("send", time.perf_counter() - send_started)
+        except LLMError as e:
+            print(f"⚠️ Ошибка генерации ({e.__class__.__name__}): {str(e)[:200]}")
+            metrics.errors.inc(stage="generate", error=e.__class__.__name__)
+            await self.bot.delete_message(message.chat.id, processing_msg.message_id)
+            await self.bot.reply_to(message, e.user_message)
+        except Exception as e:
+            metrics.errors.inc(stage="query")
+            await self.bot.delete_message(message.chat.id, processing_msg.message_id)
+            await self.bot.reply_to(message, f"Ошибка при обработке вопроса: {str(e)}")
+        finally:
+            metrics.request_seconds.observe(time.perf_counter() - started)
+
+    async def stream_answer(self, message, processing_msg, question: str, prepared: Dict):
+        """Потоковый ответ: генерация идет в пуле llm, правки сообщения - в event loop"""
+        loop = asyncio.get_running_loop()
+
+        def call_in_loop(coro):
+            # Ждем завершения правки, чтобы сохранить порядок обновлений
+            asyncio.run_coroutine_threadsafe(coro, loop).result(timeout=30)
+
+        editor = StreamingMessageEditor(
+            edit_func=lambda text: call_in_loop(self.bot.edit_message_text(
+                text, message.chat.id, processing_msg.message_id
+            )),
+            send_func=lambda text: call_in_loop(self.bot.send_message(message.chat.id, text))
+        )
+
+        def generate():
+            response = self.coordinator.generate_answer(question, prepared, on_partial=editor.update)
+            editor.finish(response)
+
+        await self.workers.run("llm", generate)
+
+    async def _polling(self):
+        # Семафор и блокировки asyncio создаются внутри работающего event loop
+        self.scheduler = ChatScheduler(
+            max_concurrent=settings.MAX_CONCURRENT_REQUESTS,
+            max_queued=settings.MAX_QUEUED_REQUESTS,
+            max_pending_per_chat=settings.MAX_PENDING_PER_CHAT
+        )
+        await self.bot.infinity_polling()
+
+    def run(self):
+        """Запуск бота"""
+        print("Telegram бот запущен (асинхронный режим)...")
+        try:
+            asyncio.run(self._polling())
+        finally:
+            self.workers.shutdown()
@@ -0,0 +1,334 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from config.settings import settings
+from utils.stub_ollama import StubOllamaServer
+
+# Факты синтетического руководства: (текст на странице, вопрос с другими формулировками)
+SYNTHETIC_FACTS = [
+    ("Рекомендуемое давление в шинах передних колес составляет 2,3 бар при нормальной нагрузке.",
+     "Какое давление накачивать в передние шины?"),
+    ("Замену моторного масла выполняйте каждые 15 000 км пробега или один раз в год.",
+     "Как часто менять масло в двигателе?"),
+    ("Используйте моторное масло вязкости 5W-30, соответствующее классу API SN.",
+     "Какое масло заливать в мотор?"),
+    ("Предохранитель F12 на 15 А защищает цепь прикуривателя и розетки 12 В.",
+     "Какой предохранитель отвечает за прикуриватель?"),
+    ("Объем топливного бака составляет 55 литров, используйте бензин с октановым числом не ниже 95.",
+     "Сколько литров бензина помещается в бак?"),
+    ("Тормозную жидкость DOT 4 заменяйте каждые два года независимо от пробега.",
+     "Когда менять тормозную жидкость?"),
+    ("Уровень охлаждающей жидкости должен находиться между метками MIN и MAX на расширительном бачке.",
+     "Где проверить уровень антифриза?"),
+    ("Для сброса индикатора сервисного интервала удерживайте кнопку сброса суточного пробега 10 секунд.",
+     "Как обнулить напоминание о техобслуживании?"),
+    ("Аккумуляторная батарея имеет емкость 60 А·ч, при замене соблюдайте полярность подключения.",
+     "Какой емкости нужен аккумулятор?"),
+    ("Щетки стеклоочистителя заменяйте при появлении полос на стекле, но не реже одного раза в год.",
+     "Когда пора менять дворники?"),
+    ("Воздушный фильтр салона заменяйте каждые 15 000 км, при эксплуатации в пыльных условиях чаще.",
+     "Как часто менять салонный фильтр?"),
+    ("Момент затяжки колесных болтов составляет 110 Н·м, затягивайте их крест-накрест.",
+     "С каким усилием затягивать колеса?"),
+    ("Контрольная лампа неисправности двигателя загорается желтым цветом при обнаружении ошибки системы управления.",
+     "Что означает желтая лампа двигателя на панели?"),
+    ("Запасное колесо и домкрат находятся под панелью пола багажного отделения.",
+     "Где лежит запаска?"),
+    ("Система ABS предотвращает блокировку колес при экстренном торможении.",
+     "Зачем нужна антиблокировочная система?"),
+    ("Свечи зажигания заменяйте каждые 30 000 км, зазор между электродами 1,0 мм.",
+     "Когда менять свечи и какой у них зазор?"),
+    ("Ремень привода газораспределительного механизма заменяйте через 90 000 км пробега.",
+     "Какой ресурс ремня ГРМ?"),
+    ("Для буксировки используйте буксирную проушину, которая вворачивается в передний бампер.",
+     "Как правильно взять машину на буксир?"),
+    ("Кондиционер включается кнопкой A/C, при этом индикатор на кнопке загорается зеленым цветом.",
+     "Как включить кондиционер?"),
+    ("Детское кресло закрепляйте креплениями ISOFIX на заднем сиденье.",
+     "Как установить детское кресло?")
+]
+
+FILLER_WORDS = ("автомобиль водитель система режим панель двигатель сиденье салон кузов дверь "
+                "педаль рычаг кнопка индикатор сигнал работа проверка эксплуатация условие "
+                "дорога скорость нагрузка температура движение положение обслуживание").split()
+
+def generate_manual(pdf_path: str, pages: int = 40, seed: int = 0) -> List[Dict]:
+    """
+    Синтетическое руководство: на первых страницах - по одному факту среди случайного текста,
+    остальные - только текст-заполнитель. Возвращает размеченные вопросы.
+    Требует PyMuPDF >= 1.23 (insert_htmlbox со встроенными шрифтами с кириллицей).
+    """
+    import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    questions = []
+
+    for page_num in range(1, pages + 1):
+        sentences = []
+        for _ in range(rng.randint(8, 14)):
+            words = rng.sample(FILLER_WORDS, rng.randint(6, 12))
+            sentences.append(" ".join(words).capitalize() + ".")
+
+        fact_index = page_num - 1
+        if fact_index < len(SYNTHETIC_FACTS):
+            fact, question = SYNTHETIC_FACTS[fact_index]
+            sentences.insert(rng.randint(0, len(sentences)), fact)
+            questions.append({"question": question, "pages": [page_num]})
+
+        page = doc.new_page()
+        page.insert_htmlbox(page.rect + (50, 50, -50, -50), " ".join(sentences))
+
+    doc.save(pdf_path)
+    doc.close()
+    return questions
+
+def load_questions(path: str) -> List[Dict]:
+    """Вопросы в JSONL: {"question": "...", "pages": [номера страниц с ответом]}"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+def latency_summary(seconds: List[float]) -> Dict:
+    return {
+        "p50_ms": percentile(seconds, 0.50) * 1000,
+        "p95_ms": percentile(seconds, 0.95) * 1000,
+        "p99_ms": percentile(seconds, 0.99) * 1000
+    }
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковое потребление памяти процессом (нет модуля resource на Windows - None)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def hit_rank(results: List[Dict], pages: List[int]) -> Optional[int]:
+    """Позиция (с 1) первого фрагмента, покрывающего одну из размеченных страниц"""
+    for rank, result in enumerate(results, 1):
+        metadata = result["metadata"]
+        page = metadata.get("page", 0)
+        page_end = metadata.get("page_end", page)
+        if any(page <= labelled <= page_end for labelled in pages):
+            return rank
+    return None
+
+# Направление метрики: 1 - больше лучше, -1 - меньше лучше
+BASELINE_METRICS = {
+    "ingest.pages_per_s": 1,
+    "ingest.chunks_per_s": 1,
+    "retrieval.recall_at_k": 1,
+    "retrieval.mrr": 1,
+    "retrieval.p95_ms": -1,
+    "end_to_end.p50_ms": -1,
+    "end_to_end.p95_ms": -1,
+    "peak_rss_mb": -1
+}
+
+def _metric(results: Dict, path: str) -> Optional[float]:
+    value = results
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+def compare_with_baseline(results: Dict, baseline: Dict, tolerance: float) -> List[Tuple[str, float, float, bool]]:
+    """[(метрика, базовое значение, текущее, регрессия)] - регрессия, если хуже больше чем на tolerance"""
+    rows = []
+    for path, direction in BASELINE_METRICS.items():
+        old, new = _metric(baseline, path), _metric(results, path)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        rows.append((path, old, new, change * direction < -tolerance))
+    return rows
+
+def prepare_manual(args, workdir: str) -> Tuple[str, str, List[Dict]]:
+    """PDF и вопросы для замера: (папка PDF, имя файла, вопросы)"""
+    pdf_folder = os.path.join(workdir, "pdf")
+    os.makedirs(pdf_folder, exist_ok=True)
+
+    if args.pdf:
+        pdf_filename = os.path.basename(args.pdf)
+        if os.path.abspath(os.path.dirname(args.pdf)) != os.path.abspath(pdf_folder):
+            shutil.copy(args.pdf, os.path.join(pdf_folder, pdf_filename))
+        questions = load_questions(args.questions)
+    else:
+        pdf_filename = "synthetic_manual.pdf"
+        questions = generate_manual(os.path.join(pdf_folder, pdf_filename), args.pages, args.seed)
+        with open(os.path.join(workdir, "questions.jsonl"), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(q, ensure_ascii=False) + "\n" for q in questions)
+    return pdf_folder, pdf_filename, questions
+
+def start_offline_environment(args, workdir: str) -> StubOllamaServer:
+    """
+    Заглушка Ollama и настройки для замера: индекс во временной папке, без кэша ответов.
+    Вызывается до импорта модулей, которые читают настройки при создании синглтонов.
+    """
+    stub = StubOllamaServer(
+        token_latency_ms=args.token_latency_ms,
+        prefill_ms=args.prefill_ms,
+        answer_tokens=args.answer_tokens
+    ).start()
+
+    settings.VECTOR_DB_PATH = os.path.join(workdir, "vector_db")
+    settings.OLLAMA_BASE_URL = stub.url
+    settings.ANSWER_CACHE_ENABLED = False
+    if args.backend:
+        settings.VECTOR_BACKEND = args.backend
+    return stub
+
+def add_offline_arguments(parser: argparse.ArgumentParser):
+    """Общие параметры бенчмарка и нагрузочного теста: PDF, вопросы и заглушка LLM"""
+    parser.add_argument("--pdf", help="PDF для замера (по умолчанию - сгенерированное руководство)")
+    parser.add_argument("--questions", help="JSONL с вопросами и страницами ответов (обязателен с --pdf)")
+    parser.add_argument("--pages", type=int, default=40, help="Число страниц сгенерированного PDF")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], help="Векторное хранилище")
+    parser.add_argument("--token-latency-ms", type=float, default=20, help="Задержка заглушки LLM на токен")
+    parser.add_argument("--prefill-ms", type=float, default=50, help="Задержка заглушки LLM до первого токена")
+    parser.add_argument("--answer-tokens", type=int, default=40, help="Длина ответа заглушки в токенах")
+    parser.add_argument("--workdir", help="Папка для PDF и индекса (по умолчанию - временная)")
+
+def run_benchmark(args) -> Dict:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="autobot_bench_")
+    pdf_folder, pdf_filename, questions = prepare_manual(args, workdir)
+    stub = start_offline_environment(args, workdir)
+    # Индекс из прошлого запуска с тем же --workdir прошел бы быструю проверку манифеста,
+    # и замер индексации показал бы ее, а не эмбеддинг страниц
+    shutil.rmtree(settings.VECTOR_DB_PATH, ignore_errors=True)
+
+    # Импорт после настройки окружения: синглтоны читают settings при создании
+    from agents.coordinator import CoordinatorAgent
+    from database.embedding_engine import embedding_engine
+
+    embedding_engine.warm_up()
+    coordinator = CoordinatorAgent()
+    coordinator.pdf_analyzer.pdf_folder = pdf_folder
+
+    total_pages = coordinator.pdf_analyzer.page_count(os.path.join(pdf_folder, pdf_filename))
+    started = time.perf_counter()
+    _, stats = coordinator.pdf_indexer.index(pdf_filename)
+    ingest_seconds = time.perf_counter() - started
+
+    chat_id = 1
+    coordinator.load_pdf(pdf_filename, chat_id)
+    vector_db = coordinator.sessions.get(chat_id).vector_db
+
+    search_seconds, e2e_seconds, reciprocal_ranks = [], [], []
+    hits = 0
+    for _ in range(args.repeat):
+        for item in questions:
+            # Каждый замер - как новый вопрос: эмбеддинг из LRU-кэша (повтор круга или
+            # тот же вопрос при замере поиска) занизил бы задержку
+            embedding_engine.clear_query_cache()
+            started = time.perf_counter()
+            results = vector_db.search(item["question"], n_results=args.k)
+            search_seconds.append(time.perf_counter() - started)
+
+            rank = hit_rank(results, item["pages"])
+            hits += rank is not None
+            reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+            embedding_engine.clear_query_cache()
+            started = time.perf_counter()
+            prepared = coordinator.prepare_answer(item["question"], chat_id)
+            coordinator.generate_answer(
+                item["question"], prepared, on_partial=(lambda text: None) if args.stream else None
+            )
+            e2e_seconds.append(time.perf_counter() - started)
+
+    stub.stop()
+    measured = len(reciprocal_ranks) or 1
+
+    return {
+        "config": {
+            "pdf": pdf_filename,
+            "questions": len(questions),
+            "k": args.k,
+            "backend": settings.VECTOR_BACKEND,
+            "chunker": coordinator.pdf_indexer.chunker_settings(),
+            "token_latency_ms": args.token_latency_ms,
+            "stream": args.stream
+        },
+        "ingest": {
+            "pages": total_pages,
+            "chunks": stats["chunks"],
+            "seconds": ingest_seconds,
+            "pages_per_s": total_pages / ingest_seconds,
+            "chunks_per_s": stats["chunks"] / ingest_seconds
+        },
+        "retrieval": dict(
+            latency_summary(search_seconds),
+            recall_at_k=hits / measured,
+            mrr=sum(reciprocal_ranks) / measured
+        ),
+        "end_to_end": latency_summary(e2e_seconds),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+def print_report(results: Dict):
+    ingest, retrieval, e2e = results["ingest"], results["retrieval"], results["end_to_end"]
+    k = results["config"]["k"]
+    print(f"\n📥 Индексация: {ingest['pages']} стр., {ingest['chunks']} чанков за {ingest['seconds']:.1f} с "
+          f"({ingest['pages_per_s']:.1f} стр/с, {ingest['chunks_per_s']:.1f} чанков/с)")
+    print(f"🔍 Поиск: recall@{k} {retrieval['recall_at_k']:.3f}, MRR {retrieval['mrr']:.3f}, "
+          f"p50 {retrieval['p50_ms']:.1f} мс, p95 {retrieval['p95_ms']:.1f} мс, p99 {retrieval['p99_ms']:.1f} мс")
+    print(f"💬 Ответ целиком: p50 {e2e['p50_ms']:.0f} мс, p95 {e2e['p95_ms']:.0f} мс, p99 {e2e['p99_ms']:.0f} мс")
+    if results["peak_rss_mb"] is not None:
+        print(f"🧠 Пиковая память: {results['peak_rss_mb']:.0f} МБ")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк индексации, поиска и ответа без настоящей Ollama")
+    add_offline_arguments(parser)
+    parser.add_argument("--k", type=int, default=5, help="Глубина для recall@k")
+    parser.add_argument("--repeat", type=int, default=1, help="Сколько раз прогнать вопросы")
+    parser.add_argument("--stream", action="store_true", help="Потоковая генерация")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="Сравнить с сохраненными результатами")
+    parser.add_argument("--save-baseline", help="Сохранить результаты как базовые")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Допустимое ухудшение относительно базовых результатов (доля)")
+    args = parser.parse_args(argv)
+
+    if args.pdf and not args.questions:
+        parser.error("с --pdf нужен --questions")
+
+    results = run_benchmark(args)
+    print_report(results)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print(f"\n📊 Сравнение с {args.baseline} (допуск {args.tolerance:.0%}):")
+    regressions = 0
+    for path, old, new, regressed in compare_with_baseline(results, baseline, args.tolerance):
+        regressions += regressed
+        print(f"   {'❌' if regressed else '✅'} {path}: {old:.3f} → {new:.3f}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
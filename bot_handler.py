@@ -1,100 +1,204 @@
+import time
 import telebot
-from typing import Dict
+from typing import Dict, Optional
 from config.settings import settings
-from agents.coordinator import CoordinatorAgent
+from agents.ollama_client import LLMError
+from utils.metrics import metrics
+from utils.startup import BackgroundCoordinator, format_startup_text
+from telegram_bot.stream_editor import StreamingMessageEditor, format_load_progress
+
+WELCOME_TEXT = (
+    "Добро пожаловать в AutoBot! Чат-бот предназначен для автовладельцев и может дать ответы на вопросы по эксплуатации Вашего автомобиля.\n\n"
+    "Доступные команды:\n"
+    "/load_pdf - Загрузить PDF файл из перечня доступных моделей автомобилей\n"
+    "/search_all <вопрос> - Поиск по всем руководствам сразу\n"
+    "/status - Статус системы\n"
+    "/stats - Время обработки по этапам (для администраторов)\n"
+    "/help - Эта справка\n\n"
+    "Как пользоваться:\n"
+    "1. Нажмите /load_pdf\n"
+    "2. Выберите файл из списка\n"
+    "3. Задавайте вопросы"
+)
+
+STARTING_TEXT = "⏳ Бот запускается и загружает модели, повторите запрос через несколько секунд. Готовность - в /status"
+STARTUP_FAILED_TEXT = "❌ Бот не смог загрузить модели, обратитесь к администратору. Подробности - в /status"
+
+def format_status_text(status: Dict) -> str:
+    """Текст ответа на /status"""
+    cache = status.get("answer_cache")
+    cache_text = (f"{cache['hits'] + cache['semantic_hits']} попаданий / {cache['misses']} промахов"
+                  if cache else "выключен")
+    generation = status.get("generation")
+    generation_text = (f"промпт {generation['avg_prompt_tokens']:.0f} ток. за {generation['avg_prefill_ms']:.0f} мс, "
+                       f"{generation['eval_tokens_per_second']:.1f} ток/с"
+                       if generation and generation["requests"] else "нет данных")
+    startup = status.get("startup")
+    startup_text = format_startup_text(startup) if startup else "—"
+    return f"""
+            Статус системы:
+            
+            • PDF загружен: {'✅' if status['pdf_loaded'] else '❌'}
+            • Руководство: {status['current_pdf'] or '—'}
+            • База данных: {status['vector_db_status']}
+            • Агенты: {status['agents_status']}
+            • Кэш ответов: {cache_text}
+            • Генерация: {generation_text}
+            • Запуск: {startup_text}
+            
+            Используйте /load_pdf для загрузки документов
+            """
+
+def format_stats_text(summary: Dict) -> str:
+    """Текст ответа на /stats: время этапов и счетчики"""
+    lines = ["📊 Статистика обработки", ""]
+    
+    requests = summary["requests"]
+    if requests:
+        lines.append(f"Запросы: {requests['count']}, p50 {requests['p50']:.2f} с, p95 {requests['p95']:.2f} с")
+    
+    lines.append("Этапы (собственное время): кол-во / среднее / p50 / p95, мс")
+    for stage, stats in sorted(summary["stages"].items()):
+        lines.append(f"• {stage}: {stats['count']} / {stats['avg'] * 1000:.0f} / "
+                     f"{stats['p50'] * 1000:.0f} / {stats['p95'] * 1000:.0f}")
+    
+    if summary.get("queues"):
+        lines.append("Ожидание в очередях: p50 / p95, мс")
+        for pool, stats in sorted(summary["queues"].items()):
+            lines.append(f"• {pool}: {stats['p50'] * 1000:.0f} / {stats['p95'] * 1000:.0f}")
+    
+    lines.append("")
+    for name, value in sorted(summary["counters"].items()):
+        lines.append(f"• {name.replace('autobot_', '')}: {value:g}")
+    return "\n".join(lines)
+
+def format_pdf_list_text(catalogue) -> str:
+    """Текст со списком PDF для /load_pdf (catalogue - записи {"name", "indexed"})"""
+    if not catalogue:
+        return "Нет доступных руководств. Поместите PDF-файлы в папку data/pdf_files/"
+    
+    files_text = "\n".join([f"• {item['name']}" + ("" if item["indexed"] else " (будет проиндексирован)")
+                            for item in catalogue])
+    
+    return f"""Выберите PDF файл для загрузки:
+
+{files_text}
+
+Просто отправьте название файла (например: {catalogue[0]['name']})"""
 
 class TelegramBotHandler:
     """Обработчик Telegram бота"""
     
-    def __init__(self):
-        self.bot = telebot.TeleBot(settings.TELEGRAM_BOT_TOKEN)
-        self.coordinator = CoordinatorAgent()
+    def __init__(self, bot: Optional[telebot.TeleBot] = None,
+                 coordinator=None):
+        """
+        bot и coordinator можно подменить (нагрузочный тест с имитацией Telegram).
+        Без coordinator агенты создаются в фоне (LAZY_STARTUP), а бот уже отвечает на команды.
+        """
+        self.bot = bot or telebot.TeleBot(settings.TELEGRAM_BOT_TOKEN)
+        self.startup = BackgroundCoordinator(coordinator=coordinator).start(background=settings.LAZY_STARTUP)
         self.user_sessions: Dict[int, Dict] = {}
         
         self.setup_handlers()
     
+    @property
+    def coordinator(self):
+        return self.startup.coordinator
+    
+    def reply_if_not_ready(self, message) -> bool:
+        """Ответ «бот запускается», пока агенты не загружены"""
+        if self.startup.ready:
+            return False
+        failed = self.startup.state == BackgroundCoordinator.FAILED
+        self.bot.reply_to(message, STARTUP_FAILED_TEXT if failed else STARTING_TEXT)
+        return True
+    
     def setup_handlers(self):
         """Настройка обработчиков команд"""
         
         @self.bot.message_handler(commands=['start', 'help'])
         def send_welcome(message):
-            welcome_text = (
-                "Добро пожаловать в AutoBot! Чат-бот предназначен для автовладельцев и может дать ответы на вопросы по эксплуатации Вашего автомобиля.\n\n"
-                "Доступные команды:\n"
-                "/load_pdf - Загрузить PDF файл из перечня доступных моделей автомобилей\n"
-                "/status - Статус системы\n"
-                "/help - Эта справка\n\n"
-                "Как пользоваться:\n"
-                "1. Нажмите /load_pdf\n"
-                "2. Выберите файл из списка\n"
-                "3. Задавайте вопросы"
-            )
-            self.bot.reply_to(message, welcome_text)
+            self.bot.reply_to(message, WELCOME_TEXT)
         
         @self.bot.message_handler(commands=['load_pdf'])
         def handle_load_pdf(message):
             """Показать список доступных PDF файлов"""
-            available_files = [
-                "Chery_Tiggo7ProMax.pdf",
-                "Geely_coolray.pdf", 
-                "Haval_Jolion.pdf",
-                "Lada_Granta.pdf",
-                "Lada_Vesta.pdf"
-            ]
+            if self.reply_if_not_ready(message):
+                return
+            self.bot.reply_to(message, format_pdf_list_text(self.coordinator.pdf_catalogue()))
             
-            files_text = "\n".join([f"• {file}" for file in available_files])
-            
-            response = f"""Выберите PDF файл для загрузки:
-
-{files_text}
-
-Просто отправьте название файла (например: Lada_Vesta.pdf)"""
+            self.user_sessions[message.chat.id] = {"waiting_for_pdf": True}
+        
+        @self.bot.message_handler(commands=['search_all'])
+        def handle_search_all(message):
+            """Поиск по всем руководствам с группировкой по моделям"""
+            question = message.text.partition(' ')[2].strip()
+            if not question:
+                self.bot.reply_to(message, "Укажите вопрос: /search_all в каких моделях есть вариатор")
+                return
+            if self.reply_if_not_ready(message):
+                return
             
+            processing_msg = self.bot.reply_to(message, "🔍 Ищу во всех руководствах...")
+            try:
+                response = self.coordinator.search_all_manuals(question)
+            except Exception as e:
+                response = f"Ошибка при поиске: {str(e)}"
+            self.bot.delete_message(message.chat.id, processing_msg.message_id)
             self.bot.reply_to(message, response)
-            
-            self.user_sessions[message.chat.id] = {"waiting_for_pdf": True}
         
         @self.bot.message_handler(commands=['status'])
         def handle_status(message):
-            status = self.coordinator.get_system_status()
-            status_text = f"""
-            Статус системы:
-            
-            • PDF загружен: {'✅' if status['pdf_loaded'] else '❌'}
-            • База данных: {status['vector_db_status']}
-            • Агенты: {status['agents_status']}
-            
-            Используйте /load_pdf для загрузки документов
-            """
-            self.bot.reply_to(message, status_text)
+            startup = self.startup.status()
+            if not self.startup.ready:
+                self.bot.reply_to(message, "Статус системы:\n\n" + format_startup_text(startup))
+                return
+            status = self.coordinator.get_system_status(message.chat.id)
+            status["startup"] = startup
+            self.bot.reply_to(message, format_status_text(status))
+        
+        @self.bot.message_handler(commands=['stats'])
+        def handle_stats(message):
+            if message.chat.id not in settings.ADMIN_CHAT_IDS:
+                self.bot.reply_to(message, "Команда доступна только администраторам")
+                return
+            self.bot.reply_to(message, format_stats_text(metrics.summary()))
         
         @self.bot.message_handler(func=lambda message: True)
         def handle_all_messages(message):
             """Обработка ВСЕХ сообщений"""
             user_id = message.chat.id
             
+            if not message.text.startswith('/') and self.reply_if_not_ready(message):
+                return
+            
             if user_id in self.user_sessions and self.user_sessions[user_id].get("waiting_for_pdf"):
                 pdf_filename = message.text.strip()
                 
-                allowed_files = [
-                    "Chery_Tiggo7ProMax.pdf",
-                    "Geely_coolray.pdf", 
-                    "Haval_Jolion.pdf",
-                    "Lada_Granta.pdf",
-                    "Lada_Vesta.pdf"
-                ]
-                
-                if pdf_filename not in allowed_files:
+                if pdf_filename not in self.coordinator.available_pdfs():
                     self.bot.reply_to(message, f"Файл '{pdf_filename}' не найден в списке доступных. Пожалуйста, выберите из списка выше.")
                     return
                 
                 processing_msg = self.bot.reply_to(message, f"Загружаю файл '{pdf_filename}'...")
                 
+                progress = StreamingMessageEditor(
+                    edit_func=lambda text: self.bot.edit_message_text(
+                        text, message.chat.id, processing_msg.message_id
+                    ),
+                    cursor=""
+                )
+                
                 try:
-                    response = self.coordinator.load_pdf(pdf_filename)
+                    response = self.coordinator.load_pdf(
+                        pdf_filename, user_id,
+                        progress_callback=lambda page, total, added: progress.update(
+                            format_load_progress(pdf_filename, page, total, added)
+                        )
+                    )
                     self.bot.delete_message(message.chat.id, processing_msg.message_id)
                     self.bot.reply_to(message, response)
                 except Exception as e:
+                    metrics.errors.inc(stage="load")
                     self.bot.delete_message(message.chat.id, processing_msg.message_id)
                     self.bot.reply_to(message, f"Ошибка при загрузке: {str(e)}")
                 
@@ -104,20 +208,46 @@ class TelegramBotHandler:
                 self.bot.reply_to(message, "Неизвестная команда. Используйте /help для списка команд")
                 
             else:
-                if not self.coordinator.pdf_loaded:
+                if not self.coordinator.has_pdf(user_id):
                     self.bot.reply_to(message, "Сначала загрузите PDF-файл командой /load_pdf")
                     return
 
                 question = message.text
+                started = time.perf_counter()
                 processing_msg = self.bot.reply_to(message, "🔍 Ищу информацию в документах...")
                 
                 try:
-                    response = self.coordinator.process_query(question)
+                    if settings.STREAM_RESPONSES:
+                        self.stream_answer(message, processing_msg, question)
+                    else:
+                        response = self.coordinator.process_query(question, user_id)
+                        with metrics.span("send"):
+                            self.bot.delete_message(message.chat.id, processing_msg.message_id)
+                            self.bot.reply_to(message, response)
+                except LLMError as e:
+                    print(f"⚠️ Ошибка генерации ({e.__class__.__name__}): {str(e)[:200]}")
+                    metrics.errors.inc(stage="generate", error=e.__class__.__name__)
                     self.bot.delete_message(message.chat.id, processing_msg.message_id)
-                    self.bot.reply_to(message, response)
+                    self.bot.reply_to(message, e.user_message)
                 except Exception as e:
+                    metrics.errors.inc(stage="query")
                     self.bot.delete_message(message.chat.id, processing_msg.message_id)
                     self.bot.reply_to(message, f"Ошибка при обработке вопроса: {str(e)}")
+                finally:
+                    metrics.request_seconds.observe(time.perf_counter() - started)
+    
+    def stream_answer(self, message, processing_msg, question: str):
+        """Ответ с постепенным обновлением сообщения «Ищу информацию...»"""
+        editor = StreamingMessageEditor(
+            edit_func=lambda text: self.bot.edit_message_text(
+                text, message.chat.id, processing_msg.message_id
+            ),
+            send_func=lambda text: self.bot.send_message(message.chat.id, text)
+        )
+        
+        prepared = self.coordinator.prepare_answer(question, message.chat.id)
+        response = self.coordinator.generate_answer(question, prepared, on_partial=editor.update)
+        editor.finish(response)
     
     def run(self):
         """Запуск бота"""
@@ -0,0 +1,85 @@
+import argparse
+import sys
+import time
+from agents.pdf_analyzer import PDFAnalyzerAgent
+from database.pdf_indexer import PDFIndexer, discover_pdfs
+from database.embedding_engine import embedding_engine
+from config.settings import settings
+
+def index_command(args) -> int:
+    """Предварительная индексация PDF из Settings.PDF_FOLDER"""
+    if args.workers:
+        settings.INGEST_WORKERS = args.workers
+
+    pdf_files = discover_pdfs(settings.PDF_FOLDER) if args.all else args.files
+    if not pdf_files:
+        print(f"❌ Нет PDF для индексации (папка {settings.PDF_FOLDER})")
+        return 1
+
+    print(f"📚 Файлов для индексации: {len(pdf_files)}, процессов извлечения: {settings.INGEST_WORKERS}")
+    embedding_engine.warm_up()
+
+    indexer = PDFIndexer(PDFAnalyzerAgent(settings.PDF_FOLDER))
+    totals = {"pages": 0, "chunks": 0, "added": 0, "seconds": 0.0}
+    failed = []
+
+    for pdf_filename in pdf_files:
+        pages = {"total": 0}
+
+        def report_progress(page: int, total: int, added: int):
+            pages["total"] = total
+            print(f"\r   {pdf_filename}: страница {page}/{total}, новых чанков {added}",
+                  end="", flush=True)
+
+        started = time.perf_counter()
+        try:
+            _, stats = indexer.index(pdf_filename, progress_callback=report_progress)
+        except Exception as e:
+            print(f"\n❌ {pdf_filename}: {str(e)}")
+            failed.append(pdf_filename)
+            continue
+        elapsed = time.perf_counter() - started
+
+        if stats["status"] == "up_to_date":
+            print(f"✅ {pdf_filename}: индекс актуален ({stats['chunks']} чанков), {elapsed:.2f} с")
+            continue
+
+        print(f"\r✅ {pdf_filename}: {pages['total']} стр., {stats['chunks']} чанков "
+              f"(+{stats['added']}/-{stats['removed']}), {elapsed:.1f} с, "
+              f"{pages['total'] / elapsed:.1f} стр/с, {stats['added'] / elapsed:.1f} чанков/с")
+
+        totals["pages"] += pages["total"]
+        totals["chunks"] += stats["chunks"]
+        totals["added"] += stats["added"]
+        totals["seconds"] += elapsed
+
+    if totals["seconds"]:
+        print(f"\n📊 Итого: {totals['pages']} стр., {totals['added']} новых чанков "
+              f"за {totals['seconds']:.1f} с "
+              f"({totals['pages'] / totals['seconds']:.1f} стр/с, "
+              f"{totals['added'] / totals['seconds']:.1f} чанков/с)")
+
+    if failed:
+        print(f"❌ Не удалось проиндексировать: {', '.join(failed)}")
+        return 1
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Служебные команды AutoBot")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="Проиндексировать PDF заранее")
+    index_parser.add_argument("files", nargs="*", help="Имена PDF в папке data/pdf_files/")
+    index_parser.add_argument("--all", action="store_true", help="Все PDF из папки")
+    index_parser.add_argument("--workers", type=int, default=0,
+                              help="Число процессов извлечения текста (по умолчанию - все ядра)")
+    index_parser.set_defaults(handler=index_command)
+
+    args = parser.parse_args(argv)
+    if args.command == "index" and not args.all and not args.files:
+        parser.error("укажите файлы или --all")
+
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
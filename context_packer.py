@@ -0,0 +1,78 @@
+from typing import Callable, Dict, List, Optional
+from utils.text_chunker import SENTENCE_END_RE, estimate_tokens
+
+class ContextPacker:
+    """
+    Сборка контекста для LLM под явный бюджет токенов:
+    фрагменты с наибольшей релевантностью, без дублей, текст собирается одним join.
+    """
+
+    # Заголовок фрагмента и перевод строки
+    PASSAGE_OVERHEAD_TOKENS = 8
+    # Обрезанный фрагмент короче этого не имеет смысла
+    MIN_PASSAGE_TOKENS = 48
+
+    def __init__(self, count_tokens: Optional[Callable[[str], int]] = None):
+        self.count_tokens = count_tokens or estimate_tokens
+
+    def select(self, results: List[Dict], budget_tokens: int) -> List[Dict]:
+        """Лучшие неповторяющиеся фрагменты, помещающиеся в бюджет"""
+        selected: List[Dict] = []
+        seen_texts: List[str] = []
+        used = 0
+
+        # Порядок после переранжирования (кросс-энкодер) или слияния RRF уже задан поиском:
+        # сортировка по score подняла бы косинусные фрагменты над точными лексическими совпадениями
+        if not any("rerank_score" in result or "rrf_score" in result for result in results):
+            results = sorted(results, key=lambda r: r["score"], reverse=True)
+
+        for result in results:
+            text = " ".join(result["text"].split())
+            normalized = text.lower()
+
+            # Дубли и фрагменты, целиком входящие в уже выбранные (перекрытие чанков)
+            if any(normalized in seen or seen in normalized for seen in seen_texts):
+                continue
+
+            tokens = self.count_tokens(text) + self.PASSAGE_OVERHEAD_TOKENS
+            remaining = budget_tokens - used
+
+            if tokens > remaining:
+                if remaining < self.MIN_PASSAGE_TOKENS:
+                    break
+                text = self._truncate(text, remaining - self.PASSAGE_OVERHEAD_TOKENS)
+                if not text:
+                    break
+                tokens = self.count_tokens(text) + self.PASSAGE_OVERHEAD_TOKENS
+
+            selected.append(dict(result, text=text))
+            seen_texts.append(normalized)
+            used += tokens
+
+        return selected
+
+    def _truncate(self, text: str, budget_tokens: int) -> str:
+        """Обрезка по границе предложения в пределах бюджета"""
+        kept = []
+        used = 0
+        for sentence in SENTENCE_END_RE.split(text):
+            tokens = self.count_tokens(sentence)
+            if used + tokens > budget_tokens:
+                break
+            kept.append(sentence)
+            used += tokens
+        return " ".join(kept)
+
+    def build_context(self, passages: List[Dict]) -> str:
+        """Текст контекста: короткий заголовок со страницей + текст фрагмента"""
+        parts = []
+        for i, passage in enumerate(passages, 1):
+            metadata = passage.get("metadata", {})
+            page = metadata.get("page", "?")
+            page_end = metadata.get("page_end", page)
+            pages = f"{page}-{page_end}" if page_end != page else f"{page}"
+            parts.append(f"[{i}] (стр. {pages}) {passage['text']}")
+        return "\n\n".join(parts)
+
+    def pack(self, results: List[Dict], budget_tokens: int) -> str:
+        return self.build_context(self.select(results, budget_tokens))
@@ -1,42 +1,94 @@
-from typing import Dict, Any, Optional
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import numpy as np
 from agents.pdf_analyzer import PDFAnalyzerAgent
-from agents.search_agent import SearchAgent
 from agents.response_formatter import ResponseFormatterAgent
+from database.pdf_indexer import PDFIndexer
 from database.vector_store import VectorDatabase
+from agents.session_manager import CollectionPool, SessionManager
+from database.answer_cache import AnswerCache
+from agents.reranker import RerankerAgent
 from config.settings import settings
+from utils.metrics import metrics
 
 class CoordinatorAgent:
     """Главный агент, координирующий работу всех агентов"""
     
     def __init__(self):
-        self.vector_db: Optional[VectorDatabase] = None
         self.pdf_analyzer = PDFAnalyzerAgent("data/pdf_files/")
-        self.search_agent = SearchAgent(None) 
+        self.pdf_indexer = PDFIndexer(self.pdf_analyzer)
         self.response_formatter = ResponseFormatterAgent(
             model_name=settings.OLLAMA_MODEL
         )
+        # Модель загружается в Ollama заранее и дальше удерживается keep_alive
+        self.llm_ready = self.response_formatter.warm_up()
         
-        self.pdf_loaded = False
-        self.current_pdf = None
+        # Коллекции общие для чатов с одним PDF, у каждого чата - своя сессия
+        self.collection_pool = CollectionPool(
+            loader=self.pdf_indexer.index,
+            max_handles=settings.MAX_OPEN_COLLECTIONS
+        )
+        self.sessions = SessionManager(self.collection_pool, ttl=settings.SESSION_TTL)
+        
+        self.reranker = None
+        if settings.RERANK_ENABLED:
+            self.reranker = RerankerAgent(
+                model_name=settings.RERANK_MODEL,
+                time_budget_ms=settings.RERANK_TIME_BUDGET_MS,
+                top_k=settings.RERANK_TOP_K,
+                batch_size=settings.RERANK_BATCH_SIZE
+            )
+            self.reranker.warm_up()
+        
+        # Весь каталог в общей коллекции - для поиска по всем руководствам
+        self.catalogue_db = VectorDatabase() if settings.SHARED_COLLECTION else None
+        # Без общей коллекции /search_all открывает коллекции только для поиска:
+        # последние из них держатся открытыми, PDF -> (версия индекса, коллекция)
+        self._search_dbs: "OrderedDict[str, Tuple[str, VectorDatabase]]" = OrderedDict()
+        self._search_dbs_lock = threading.Lock()
+        
+        self.answer_cache = None
+        if settings.ANSWER_CACHE_ENABLED:
+            self.answer_cache = AnswerCache(
+                max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+                ttl=settings.ANSWER_CACHE_TTL,
+                semantic_distance=settings.ANSWER_CACHE_SEMANTIC_DISTANCE,
+                persist_path=(os.path.join(settings.VECTOR_DB_PATH, "answer_cache.json")
+                              if settings.ANSWER_CACHE_PERSIST else None),
+                save_interval=settings.ANSWER_CACHE_SAVE_INTERVAL
+            )
+    
+    def available_pdfs(self) -> List[str]:
+        """Список руководств, доступных для загрузки"""
+        return [item["name"] for item in self.pdf_indexer.catalogue()]
+
+    def pdf_catalogue(self) -> List[Dict[str, Any]]:
+        """Руководства с отметкой, готов ли индекс (для /load_pdf)"""
+        return self.pdf_indexer.catalogue()
+    
+    def has_pdf(self, chat_id: int) -> bool:
+        """Загружен ли PDF в этом чате"""
+        return self.sessions.get(chat_id) is not None
     
-    def load_pdf(self, pdf_filename: str) -> str:
-        """Загрузка и индексация PDF-файла в отдельную коллекцию"""
+    def load_pdf(self, pdf_filename: str, chat_id: int,
+                 progress_callback: Optional[Callable[[int, int, int], None]] = None) -> str:
+        """
+        Загрузка и индексация PDF-файла в отдельную коллекцию для чата.
+        progress_callback(страница, всего страниц, добавлено чанков) - прогресс индексации.
+        """
         try:
-            print(f"Извлечение текста из '{pdf_filename}'...")
-            documents = self.pdf_analyzer.process_pdf(pdf_filename)
-            
-            print(f"Создание векторной базы '{pdf_filename}'...")
-            self.vector_db = VectorDatabase(pdf_name=pdf_filename)
-            
-            self.vector_db.add_documents(documents)
-            
-            self.search_agent = SearchAgent(self.vector_db)
+            print(f"Индексация '{pdf_filename}' для чата {chat_id}...")
+            # Индексатор подключается к актуальной коллекции или переэмбеддит только измененные страницы
+            handle, index_stats = self.sessions.attach(chat_id, pdf_filename, progress_callback)
             
-            self.pdf_loaded = True
-            self.current_pdf = pdf_filename
+            # Индекс изменился - ответы по старой версии руководства больше не годятся
+            if self.answer_cache and index_stats and index_stats["status"] == "updated":
+                self.answer_cache.invalidate(pdf_filename)
             
-            total_chars = sum(len(doc["text"]) for doc in documents)
-            collection_info = self.vector_db.get_collection_info()
+            if index_stats and index_stats["status"] == "up_to_date":
+                print(f"'{pdf_filename}' уже проиндексирован ({index_stats['chunks']} чанков)")
             
             return (f"PDF '{pdf_filename}' успешно загружен!\n\n"
                    f"Теперь можете задавать вопросы по этому руководству.")
@@ -46,47 +98,269 @@ class CoordinatorAgent:
         except Exception as e:
             return f"Ошибка при загрузке PDF: {str(e)}"
     
-    def process_query(self, user_query: str) -> str:
-        if not self.pdf_loaded or not self.vector_db:
-            return "Пожалуйста, сначала загрузите PDF-файл с помощью команды /load_pdf"
+    def embed_query(self, user_query: str, chat_id: int) -> Optional[np.ndarray]:
+        """Эмбеддинг вопроса (отдельный этап для асинхронного режима)"""
+        handle = self.sessions.get(chat_id)
+        if handle is None:
+            return None
+        return handle.vector_db.embed_query(user_query)
+    
+    def prepare_answer(self, user_query: str, chat_id: int,
+                       query_embedding: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        Поиск и подготовка контекста.
+        Возвращает {"response": ...}, если ответ готов без LLM,
+        иначе {"context": ..., "page": ...} для generate_answer.
+        """
+        handle = self.sessions.get(chat_id)
+        if handle is None:
+            return {"response": "Пожалуйста, сначала загрузите PDF-файл с помощью команды /load_pdf"}
         
         RELEVANCE_THRESHOLD = 0.7
+        metrics.queries.inc()
+        
+        # Вопросы по таблицам (объем масла, интервал ТО) - ответ без эмбеддингов и LLM
+        structured = None
+        if handle.structure_index is not None:
+            with metrics.span("lookup"):
+                structured = handle.structure_index.lookup(user_query, max_rows=settings.STRUCTURED_MAX_ROWS)
+            if structured:
+                metrics.structured_hits.inc(kind=structured["kind"])
+        if structured and structured["kind"] == "answer":
+            return {"response": f"{structured['text']}\n\n Страница: {structured['page']}"}
+        
+        if query_embedding is None:
+            query_embedding = handle.vector_db.embed_query(user_query)
+        
+        cache_info = {
+            "pdf_name": handle.pdf_name,
+            "index_version": handle.index_version,
+            "query_embedding": query_embedding
+        }
         
-        search_results = self.search_agent.search_relevant_info(user_query, n_results=10)
+        if self.answer_cache:
+            cached = self.answer_cache.get(
+                handle.pdf_name, user_query, handle.index_version, query_embedding
+            )
+            if cached is not None:
+                metrics.cache_hits.inc()
+                return {"response": cached, "cached": True}
         
-        if not search_results:
-            return "В руководстве не найдено информации по вашему вопросу."
+        # Таблица покрывает весь вопрос - небольшой точный контекст вместо поиска по фрагментам
+        if structured and structured["kind"] == "context" and structured["complete"]:
+            return {
+                "context": structured["text"],
+                "manual": handle.pdf_name,
+                "page": structured["page"],
+                "cache": cache_info
+            }
         
+        with metrics.span("retrieve"):
+            search_results = handle.search_agent.search_relevant_info(
+                user_query, n_results=10, query_embedding=query_embedding
+            )
+        
+        # Вопрос совпал с заголовком раздела - оставляем фрагменты с его страниц, если они нашлись
+        if structured and structured["kind"] == "section":
+            scoped = [
+                r for r in search_results
+                if r["metadata"].get("page", 0) <= structured["page_end"]
+                and r["metadata"].get("page_end", r["metadata"].get("page", 0)) >= structured["page"]
+            ]
+            search_results = scoped or search_results
+        
+        # Таблица, подходящая к вопросу частично ("Как заменить масло?" -> заправочные емкости),
+        # дополняет найденные фрагменты последним по очереди контекстом
+        table_passage = None
+        if structured and structured["kind"] == "context":
+            table_passage = {
+                "id": "structure-table",
+                "text": structured["text"],
+                "metadata": {"page": structured["page"]},
+                "score": 0.0
+            }
+        
+        if not search_results and table_passage is None:
+            metrics.empty_retrievals.inc()
+            return {"response": "В руководстве не найдено информации по вашему вопросу."}
+        
+        # Точное совпадение кода или редкого термина (BM25) проходит по своему порогу:
+        # нормированный BM25 редко достигает косинусных 0.7
         high_relevance_results = [
-            r for r in search_results if r["score"] >= RELEVANCE_THRESHOLD
+            r for r in search_results
+            if r["score"] >= RELEVANCE_THRESHOLD
+            or r.get("lexical_score", 0.0) >= settings.LEXICAL_RELEVANCE_THRESHOLD
         ]
         
-        if not high_relevance_results:
+        if not high_relevance_results and search_results:
             best_result = max(search_results, key=lambda x: x["score"])
-            if best_result["score"] < 0.5:
-                return "Не найдено достаточно точной информации в документе."
-            high_relevance_results = [best_result]
+            if best_result["score"] >= 0.5:
+                high_relevance_results = [best_result]
+        
+        if not high_relevance_results and table_passage is None:
+            metrics.empty_retrievals.inc()
+            return {"response": "Не найдено достаточно точной информации в документе."}
         
-        context = self.search_agent.format_search_results(high_relevance_results[:5])
-        response = self.response_formatter.format_response(user_query, context)
+        # Необязательное переранжирование кросс-энкодером: меньше, но точнее фрагменты
+        if self.reranker and high_relevance_results:
+            with metrics.span("rerank"):
+                high_relevance_results = self.reranker.rerank(user_query, high_relevance_results)
         
-        if high_relevance_results:
-            first_page = high_relevance_results[0]['metadata'].get('page', '?')
-            response += f"\n\n Страница: {first_page}"
+        if table_passage is not None:
+            high_relevance_results = high_relevance_results + [table_passage]
+        
+        # Фрагменты упаковываются в бюджет num_ctx за вычетом промпта и ответа
+        with metrics.span("format"):
+            context, passages = handle.search_agent.format_search_results(
+                high_relevance_results,
+                budget_tokens=self.response_formatter.context_budget(user_query, handle.pdf_name)
+            )
+        
+        # Ссылка на страницу - по первому фрагменту, действительно попавшему в контекст
+        cited = passages[0] if passages else high_relevance_results[0]
+        
+        return {
+            "context": context,
+            "manual": handle.pdf_name,
+            "page": self.format_pages(cited['metadata']),
+            "cache": cache_info
+        }
+    
+    @staticmethod
+    def format_pages(metadata: Dict) -> str:
+        """Страница фрагмента или диапазон, если фрагмент переходит через страницу"""
+        page = metadata.get('page', '?')
+        page_end = metadata.get('page_end', page)
+        return f"{page}-{page_end}" if page_end != page else f"{page}"
+    
+    def generate_answer(self, user_query: str, prepared: Dict[str, Any],
+                        on_partial: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Генерация ответа LLM по подготовленному контексту.
+        Если передан on_partial - ответ генерируется потоково,
+        и on_partial получает накопленный текст после каждого фрагмента.
+        Ошибки генерации пробрасываются как LLMError и не попадают в кэш.
+        """
+        if "response" in prepared:
+            return prepared["response"]
+        
+        # Правки сообщения при потоковой генерации пишутся в этап send и вычитаются отсюда
+        with metrics.span("generate"):
+            if on_partial is None:
+                response = self.response_formatter.format_response(
+                    user_query, prepared["context"], prepared.get("manual")
+                )
+            else:
+                response = ""
+                for token in self.response_formatter.stream_response(
+                    user_query, prepared["context"], prepared.get("manual")
+                ):
+                    response += token
+                    on_partial(response)
+                response = response.strip()
+        
+        response += f"\n\n Страница: {prepared['page']}"
+        
+        if self.answer_cache:
+            cache_info = prepared["cache"]
+            self.answer_cache.put(
+                cache_info["pdf_name"], user_query, response,
+                cache_info["index_version"], cache_info["query_embedding"]
+            )
         
         return response
     
-    def get_system_status(self) -> Dict[str, Any]:
-        """Получение статуса системы"""
+    def search_all_manuals(self, user_query: str, per_manual: int = 2,
+                           max_manuals: int = 10) -> str:
+        """
+        Поиск по всем руководствам с группировкой по моделям.
+        В режиме общей коллекции - один запрос к ней, иначе обход проиндексированных PDF.
+        """
+        RELEVANCE_THRESHOLD = 0.5
+        
+        if self.catalogue_db is not None:
+            grouped = self.catalogue_db.search_by_source(
+                user_query, n_results=per_manual * max_manuals * 2, per_source=per_manual
+            )
+        else:
+            grouped = {}
+            query_embedding = None
+            for pdf_filename in self.pdf_indexer.indexed_pdfs():
+                # Коллекция, уже открытая чатами, или открытая только для поиска:
+                # без проверки индекса индексатором и без вытеснения коллекций чатов из пула
+                handle = self.collection_pool.get(pdf_filename)
+                vector_db = handle.vector_db if handle is not None else self._search_only_db(pdf_filename)
+                if query_embedding is None:
+                    query_embedding = vector_db.embed_query(user_query)
+                grouped[pdf_filename] = vector_db.search(
+                    user_query, n_results=per_manual, query_embedding=query_embedding
+                )
+        
+        # Модели с самым релевантным фрагментом - первыми
+        ranked = sorted(
+            ((source, [r for r in results if r["score"] >= RELEVANCE_THRESHOLD])
+             for source, results in grouped.items()),
+            key=lambda item: max((r["score"] for r in item[1]), default=0.0),
+            reverse=True
+        )
+        ranked = [(source, results) for source, results in ranked if results][:max_manuals]
+        
+        if not ranked:
+            return "Ни в одном руководстве не найдено информации по вашему вопросу."
+        
+        parts = []
+        for source, results in ranked:
+            lines = [f"🚗 {source}"]
+            for result in results:
+                snippet = " ".join(result["text"].split())
+                if len(snippet) > 200:
+                    snippet = snippet[:200].rsplit(" ", 1)[0] + "…"
+                lines.append(f"  • стр. {self.format_pages(result['metadata'])}: {snippet}")
+            parts.append("\n".join(lines))
+        return "\n\n".join(parts)
+    
+    def _search_only_db(self, pdf_filename: str) -> VectorDatabase:
+        """
+        Коллекция PDF для /search_all без общей коллекции: повторно не открывается,
+        пока не сменилась версия индекса. Держится не больше MAX_OPEN_COLLECTIONS последних
+        (при большом каталоге быстрее включить SHARED_COLLECTION - один запрос вместо обхода).
+        """
+        version = self.pdf_indexer.indexed_version(pdf_filename)
+        with self._search_dbs_lock:
+            cached = self._search_dbs.get(pdf_filename)
+            if cached is not None and cached[0] == version:
+                self._search_dbs.move_to_end(pdf_filename)
+                return cached[1]
+        
+        vector_db = VectorDatabase(pdf_filename)
+        with self._search_dbs_lock:
+            self._search_dbs[pdf_filename] = (version, vector_db)
+            self._search_dbs.move_to_end(pdf_filename)
+            while len(self._search_dbs) > settings.MAX_OPEN_COLLECTIONS:
+                self._search_dbs.popitem(last=False)
+        return vector_db
+    
+    def process_query(self, user_query: str, chat_id: int) -> str:
+        prepared = self.prepare_answer(user_query, chat_id)
+        return self.generate_answer(user_query, prepared)
+    
+    def get_system_status(self, chat_id: Optional[int] = None) -> Dict[str, Any]:
+        """Получение статуса системы (для конкретного чата, если указан chat_id)"""
+        handle = self.sessions.get(chat_id) if chat_id is not None else None
+        pool_stats = self.collection_pool.stats()
         status = {
-            "pdf_loaded": self.pdf_loaded,
-            "current_pdf": self.current_pdf,
+            "pdf_loaded": handle is not None,
+            "current_pdf": handle.pdf_name if handle else None,
             "agents_status": "all_running",
-            "ollama_model": settings.OLLAMA_MODEL
+            "ollama_model": settings.OLLAMA_MODEL,
+            "active_chats": self.sessions.active_chats(),
+            "open_collections": pool_stats["open_collections"],
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else None,
+            "generation": self.response_formatter.generation_stats()
         }
         
-        if self.vector_db:
-            collection_info = self.vector_db.get_collection_info()
+        if handle:
+            collection_info = handle.vector_db.get_collection_info()
             status.update({
                 "vector_db_status": "active",
                 "collection_name": collection_info["name"],
@@ -0,0 +1,223 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, List, Optional
+import numpy as np
+from config.settings import settings
+from utils.metrics import metrics
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+def normalize_query_text(query: str) -> str:
+    """Ключ кэша эмбеддингов: регистр и пробелы не влияют на вектор по смыслу"""
+    return " ".join(query.lower().split())
+
+class QueryBatcher:
+    """
+    Микробатчинг вопросов: запросы, пришедшие в течение window_ms,
+    кодируются одним вызовом encode в фоновом потоке.
+    """
+
+    def __init__(self, engine: "EmbeddingEngine", window_ms: float, max_batch: int):
+        self.engine = engine
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Одинаковые вопросы в пакете кодируются один раз
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, self.engine.encode(texts, batch_size=len(texts))))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for text, future in batch:
+                future.set_result(vectors[text])
+
+class EmbeddingEngine:
+    """Общий для всего процесса движок эмбеддингов и клиент ChromaDB"""
+
+    def __init__(self, model_name: str, persist_directory: str):
+        """
+        Модель и клиент создаются лениво при первом обращении
+        и дальше переиспользуются всеми экземплярами VectorDatabase.
+        """
+        self.model_name = model_name
+        self.persist_directory = persist_directory
+
+        self._model: Optional["SentenceTransformer"] = None
+        self._client = None
+
+        # Отдельные блокировки: загрузка модели не должна ждать клиента и наоборот
+        self._model_lock = threading.Lock()
+        self._client_lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+
+        # LRU-кэш эмбеддингов вопросов и микробатчер (создается при первом вопросе)
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self._batcher: Optional[QueryBatcher] = None
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
+
+    @property
+    def model(self) -> "SentenceTransformer":
+        """Модель эмбеддингов (загружается один раз)"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    # Импорт torch/sentence_transformers занимает секунды - только при первом обращении
+                    from sentence_transformers import SentenceTransformer
+                    print(f"🧠 Загрузка модели эмбеддингов '{self.model_name}'...")
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @property
+    def client(self):
+        """Клиент векторного хранилища по Settings.VECTOR_BACKEND (создается один раз)"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    if settings.VECTOR_BACKEND == "numpy":
+                        from database.numpy_store import NumpyClient
+                        self._client = NumpyClient(
+                            persist_directory=self.persist_directory,
+                            dtype=settings.NUMPY_VECTOR_DTYPE,
+                            ivf_lists=settings.IVF_LISTS,
+                            ivf_nprobe=settings.IVF_NPROBE,
+                            rescore_factor=settings.NUMPY_RESCORE_FACTOR,
+                            compress_text=settings.NUMPY_COMPRESS_TEXT
+                        )
+                    else:
+                        import chromadb
+                        from chromadb.config import Settings as ChromaSettings
+                        self._client = chromadb.PersistentClient(
+                            path=self.persist_directory,
+                            settings=ChromaSettings(anonymized_telemetry=False)
+                        )
+        return self._client
+
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """
+        Потокобезопасное создание эмбеддингов (матрица float32 без перевода в списки).
+        Блокировка берется на каждый пакет, чтобы индексация большого PDF
+        не задерживала эмбеддинги вопросов пользователей.
+        """
+        model = self.model
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            with self._encode_lock, metrics.span("embed"):
+                embeddings.append(model.encode(
+                    texts[start:start + batch_size], batch_size=batch_size, convert_to_numpy=True
+                ))
+        if not embeddings:
+            return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.vstack(embeddings).astype(np.float32, copy=False)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Эмбеддинг вопроса: из LRU-кэша или через микробатчер"""
+        key = normalize_query_text(query)
+
+        with self._query_cache_lock:
+            vector = self._query_cache.get(key)
+            if vector is not None:
+                self._query_cache.move_to_end(key)
+                self.query_cache_hits += 1
+                return vector
+            self.query_cache_misses += 1
+
+        if settings.QUERY_BATCH_WINDOW_MS > 0:
+            vector = self._get_batcher().submit(key).result()
+        else:
+            vector = self.encode([key])[0]
+
+        with self._query_cache_lock:
+            self._query_cache[key] = vector
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > settings.QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+
+        return vector
+
+    def clear_query_cache(self):
+        """Сброс LRU-кэша эмбеддингов вопросов (счетчики попаданий сохраняются)"""
+        with self._query_cache_lock:
+            self._query_cache.clear()
+
+    def _get_batcher(self) -> QueryBatcher:
+        if self._batcher is None:
+            with self._model_lock:
+                if self._batcher is None:
+                    self._batcher = QueryBatcher(
+                        self, settings.QUERY_BATCH_WINDOW_MS, settings.QUERY_BATCH_MAX_SIZE
+                    )
+        return self._batcher
+
+    def count_tokens(self, text: str) -> int:
+        """Число токенов текста по токенизатору модели эмбеддингов"""
+        return len(self.model.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def max_tokens(self) -> int:
+        """
+        Сколько токенов модель учитывает (без служебных [CLS]/[SEP]).
+        Лимит запоминается в файле рядом с индексом: проверка актуальности индекса
+        при запуске не должна загружать модель ради одного числа.
+        """
+        limits_path = os.path.join(self.persist_directory, "model_limits.json")
+        limits = {}
+        if os.path.exists(limits_path):
+            try:
+                with open(limits_path, "r", encoding="utf-8") as f:
+                    limits = json.load(f)
+            except (OSError, ValueError):
+                limits = {}
+        if self.model_name in limits:
+            return limits[self.model_name]
+
+        limits[self.model_name] = self.model.max_seq_length - 2
+        try:
+            os.makedirs(self.persist_directory, exist_ok=True)
+            with open(limits_path, "w", encoding="utf-8") as f:
+                json.dump(limits, f)
+        except OSError:
+            print(f"⚠️ Не удалось сохранить лимит токенов модели в {limits_path}")
+        return limits[self.model_name]
+
+    def warm_up(self):
+        """Прогрев: загрузка модели, клиента и первый прогон encode"""
+        self.client
+        self.encode(["прогрев"])
+        print("✅ Модель эмбеддингов загружена")
+
+embedding_engine = EmbeddingEngine(
+    model_name=settings.EMBEDDING_MODEL,
+    persist_directory=settings.VECTOR_DB_PATH
+)
@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Хэш содержимого файла (читается блоками, без загрузки целиком в память)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def text_sha256(text: str) -> str:
+    """Хэш текста страницы"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class IndexManifest:
+    """Манифест проиндексированных PDF: размер, mtime, хэши и настройки чанкера"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # Поврежденный манифест - просто переиндексируем файлы
+            print(f"⚠️ Не удалось прочитать манифест '{self.path}', он будет пересоздан")
+            return {}
+
+    def get(self, pdf_name: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(pdf_name)
+            return dict(entry) if entry else None
+
+    def update(self, pdf_name: str, entry: Dict):
+        with self._lock:
+            self._entries[pdf_name] = entry
+            self._save()
+
+    def remove(self, pdf_name: str):
+        with self._lock:
+            if self._entries.pop(pdf_name, None) is not None:
+                self._save()
+
+    def names(self):
+        with self._lock:
+            return sorted(self._entries)
+
+    def _save(self):
+        """Атомарная запись манифеста"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
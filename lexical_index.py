@@ -0,0 +1,174 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import snowballstemmer
+    _stemmer = snowballstemmer.stemmer("russian")
+except ImportError:
+    _stemmer = None
+
+# Слова и коды: "5W-30", "F12", "2,2", "M10×1,25" остаются одним токеном
+TOKEN_RE = re.compile(r"[0-9a-zа-я]+(?:[-.,/×][0-9a-zа-я]+)*")
+CODE_SEPARATORS_RE = re.compile(r"[-.,/×]")
+
+RUSSIAN_STOPWORDS = frozenset("""
+а без более бы был была были было быть в вам вас весь во вот все всего всех вы где да даже для до
+его ее если есть еще же за здесь и из или им их к как какая какие какой когда кто ли либо мне может
+мы на над надо не него нее нет ни них но ну о об однако он она они оно от очень по под при про с
+так также такой там те тем то того тоже той только том ты у уже чем что чтобы эта эти это этот я
+""".split())
+
+# Запасной стеммер без зависимостей: самые частые окончания русских слов
+RUSSIAN_SUFFIXES = sorted("""
+иями ями ами ией ием иях ого его ому ему ыми ими ая яя ое ее ой ей ий ый ую юю ые ие ых их ом ем
+ам ям ах ях ов ев ию ия ью ья ть ти ся сь ит ет ут ют ат ят ил ыл ла ли ло а я о е и ы у ю ь й
+""".split(), key=len, reverse=True)
+
+def stem(word: str) -> str:
+    if any(ch.isdigit() for ch in word) or len(word) <= 3:
+        return word
+    if _stemmer is not None:
+        return _stemmer.stemWord(word)
+    for suffix in RUSSIAN_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+def tokenize(text: str) -> List[str]:
+    """Нормализация текста для лексического поиска"""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower().replace("ё", "е")):
+        if token in RUSSIAN_STOPWORDS:
+            continue
+        if CODE_SEPARATORS_RE.search(token) and any(ch.isdigit() for ch in token):
+            # Код с разделителем ищется и как есть, и в слитном написании: 5w-30 / 5w30
+            tokens.append(token)
+            tokens.append(CODE_SEPARATORS_RE.sub("", token))
+        else:
+            tokens.append(stem(token))
+    return tokens
+
+class LexicalIndex:
+    """Инвертированный индекс BM25 по чанкам одной коллекции"""
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+
+        self._doc_terms: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        # Предрассчитанные веса BM25 по терминам (сбрасываются при изменении индекса)
+        self._weights: Optional[Dict[str, List[Tuple[str, float]]]] = None
+        self._lock = threading.Lock()
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def add(self, doc_id: str, text: str):
+        terms = Counter(tokenize(text))
+        with self._lock:
+            self._remove(doc_id)
+            self._insert(doc_id, dict(terms))
+            self.dirty = True
+
+    def add_many(self, items: Iterable[Tuple[str, str]]):
+        for doc_id, text in items:
+            self.add(doc_id, text)
+
+    def remove(self, doc_ids: Iterable[str]):
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+            self.dirty = True
+
+    def _insert(self, doc_id: str, terms: Dict[str, int]):
+        self._weights = None
+        self._doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def _remove(self, doc_id: str):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._weights = None
+        self._total_length -= self._doc_lengths.pop(doc_id, 0)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, query: str, n_results: int = 20) -> List[Tuple[str, float]]:
+        """Лучшие чанки по BM25: [(id, score)]"""
+        query_terms = set(tokenize(query))
+        with self._lock:
+            total_docs = len(self._doc_terms)
+            if not total_docs or not query_terms:
+                return []
+            if self._weights is None:
+                self._build_weights()
+
+            scores: Dict[str, float] = {}
+            for term in query_terms:
+                weights = self._weights.get(term)
+                if not weights:
+                    continue
+                idf = math.log(1 + (total_docs - len(weights) + 0.5) / (len(weights) + 0.5))
+                for doc_id, weight in weights:
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * weight
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+    def _build_weights(self):
+        """Нормированный по длине документа вклад tf для каждого вхождения термина"""
+        avg_length = self._total_length / len(self._doc_terms)
+        norms = {
+            doc_id: self.k1 * (1 - self.b + self.b * length / avg_length)
+            for doc_id, length in self._doc_lengths.items()
+        }
+        self._weights = {
+            term: [(doc_id, tf * (self.k1 + 1) / (tf + norms[doc_id])) for doc_id, tf in postings.items()]
+            for term, postings in self._postings.items()
+        }
+
+    def load(self) -> bool:
+        """Загрузка с диска. False - индекса нет, его нужно построить"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                doc_terms = json.load(f)
+        except (OSError, ValueError):
+            print(f"⚠️ Не удалось прочитать лексический индекс '{self.path}'")
+            return False
+
+        with self._lock:
+            for doc_id, terms in doc_terms.items():
+                self._insert(doc_id, terms)
+            self.dirty = False
+        return True
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._doc_terms, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
@@ -0,0 +1,353 @@
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from config.settings import settings
+from utils.benchmark import (
+    add_offline_arguments, latency_summary, prepare_manual, start_offline_environment
+)
+
+# Промежуточные сообщения бота: ответ на запрос еще не готов
+PROGRESS_PREFIXES = ("🔍", "Загружаю")
+STREAM_CURSOR = "▌"
+OVERLOAD_MARKER = "перегружен"
+
+class FakeChat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+class FakeMessage:
+    def __init__(self, message_id: int, chat_id: int, text: str):
+        self.message_id = message_id
+        self.chat = FakeChat(chat_id)
+        self.from_user = self.chat
+        self.text = text
+
+class UpdateRecord:
+    """Одно входящее сообщение и его путь через бота"""
+
+    def __init__(self, chat_id: int, kind: str, text: str, done_event):
+        self.chat_id = chat_id
+        self.kind = kind
+        self.text = text
+        self.sent_at = time.perf_counter()
+        self.started_at: Optional[float] = None
+        self.first_response_at: Optional[float] = None
+        self.done_at: Optional[float] = None
+        self.rejected = False
+        self.done_event = done_event
+
+class FakeTelegram:
+    """
+    Имитация Telegram для нагрузочного теста: источник входящих сообщений и приемник
+    reply/send/edit/delete. Подставляется в обработчик вместо TeleBot / AsyncTeleBot.
+    Запрос считается выполненным, когда бот отправил в чат не промежуточное сообщение.
+    """
+
+    def __init__(self, scenario: "LoadScenario"):
+        self.scenario = scenario
+        self.handlers: List[Dict] = []
+        self.records: List[UpdateRecord] = []
+        self._current: Dict[int, UpdateRecord] = {}
+        self._message_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def message_handler(self, commands: Optional[List[str]] = None, func: Optional[Callable] = None, **kwargs):
+        def decorator(handler):
+            self.handlers.append({"commands": commands, "func": func, "handler": handler})
+            return handler
+        return decorator
+
+    def _match(self, message: FakeMessage) -> Optional[Callable]:
+        """Первый подходящий обработчик - как в pyTelegramBotAPI"""
+        command = None
+        if message.text.startswith("/"):
+            command = message.text.split()[0][1:].split("@")[0]
+        for entry in self.handlers:
+            if entry["commands"] is not None and command not in entry["commands"]:
+                continue
+            if entry["func"] is not None and not entry["func"](message):
+                continue
+            return entry["handler"]
+        return None
+
+    def _incoming(self, chat_id: int, kind: str, text: str, done_event) -> tuple:
+        record = UpdateRecord(chat_id, kind, text, done_event)
+        with self._lock:
+            self.records.append(record)
+            self._current[chat_id] = record
+        return FakeMessage(next(self._message_ids), chat_id, text), record
+
+    def _outgoing(self, chat_id: int, text: Optional[str], edit: bool = False) -> FakeMessage:
+        now = time.perf_counter()
+        with self._lock:
+            record = self._current.get(chat_id)
+        if record is not None and record.done_at is None and text is not None:
+            if record.first_response_at is None:
+                record.first_response_at = now
+            in_progress = text.startswith(PROGRESS_PREFIXES) or (edit and text.endswith(STREAM_CURSOR))
+            if not in_progress:
+                record.rejected = OVERLOAD_MARKER in text
+                record.done_at = now
+                record.done_event.set()
+        return FakeMessage(next(self._message_ids), chat_id, text or "")
+
+    def _started(self, chat_id: int):
+        with self._lock:
+            record = self._current.get(chat_id)
+        if record is not None and record.started_at is None:
+            record.started_at = time.perf_counter()
+
+class FakeTeleBot(FakeTelegram):
+    """Синхронный TeleBot: обработчики выполняются в пуле из num_threads потоков, как в pyTelegramBotAPI"""
+
+    def __init__(self, scenario: "LoadScenario", num_threads: int = 2):
+        super().__init__(scenario)
+        self.num_threads = num_threads
+
+    def reply_to(self, message, text: str, **kwargs) -> FakeMessage:
+        return self._outgoing(message.chat.id, text)
+
+    def send_message(self, chat_id: int, text: str, **kwargs) -> FakeMessage:
+        return self._outgoing(chat_id, text)
+
+    def edit_message_text(self, text: str, chat_id: int, message_id: int, **kwargs) -> FakeMessage:
+        return self._outgoing(chat_id, text, edit=True)
+
+    def delete_message(self, chat_id: int, message_id: int, **kwargs) -> bool:
+        return True
+
+    def infinity_polling(self, *args, **kwargs):
+        """Вместо опроса Telegram - прогон сценария, затем возврат из run() обработчика"""
+        pool = ThreadPoolExecutor(self.num_threads, thread_name_prefix="fake-telebot")
+
+        def dispatch(chat_id: int, message: FakeMessage):
+            self._started(chat_id)
+            handler = self._match(message)
+            if handler is not None:
+                handler(message)
+
+        def send(chat_id: int, kind: str, text: str) -> UpdateRecord:
+            message, record = self._incoming(chat_id, kind, text, threading.Event())
+            pool.submit(dispatch, chat_id, message)
+            record.done_event.wait(self.scenario.timeout)
+            return record
+
+        started = time.perf_counter()
+        chats = [
+            threading.Thread(target=self.scenario.run_chat_sync, args=(chat_id, delay, send), daemon=True)
+            for chat_id, delay in self.scenario.arrivals()
+        ]
+        for chat in chats:
+            chat.start()
+        for chat in chats:
+            chat.join()
+        self.scenario.wall_seconds = time.perf_counter() - started
+        pool.shutdown(wait=False, cancel_futures=True)
+
+class FakeAsyncTeleBot(FakeTelegram):
+    """AsyncTeleBot: каждый входящий апдейт обрабатывается отдельной задачей event loop"""
+
+    async def reply_to(self, message, text: str, **kwargs) -> FakeMessage:
+        return self._outgoing(message.chat.id, text)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> FakeMessage:
+        return self._outgoing(chat_id, text)
+
+    async def edit_message_text(self, text: str, chat_id: int, message_id: int, **kwargs) -> FakeMessage:
+        return self._outgoing(chat_id, text, edit=True)
+
+    async def delete_message(self, chat_id: int, message_id: int, **kwargs) -> bool:
+        return True
+
+    async def infinity_polling(self, *args, **kwargs):
+        tasks = set()
+
+        async def dispatch(chat_id: int, message: FakeMessage):
+            self._started(chat_id)
+            handler = self._match(message)
+            if handler is not None:
+                await handler(message)
+
+        async def send(chat_id: int, kind: str, text: str) -> UpdateRecord:
+            message, record = self._incoming(chat_id, kind, text, asyncio.Event())
+            task = asyncio.create_task(dispatch(chat_id, message))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            try:
+                await asyncio.wait_for(record.done_event.wait(), self.scenario.timeout)
+            except asyncio.TimeoutError:
+                pass
+            return record
+
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self.scenario.run_chat_async(chat_id, delay, send)
+            for chat_id, delay in self.scenario.arrivals()
+        ))
+        self.scenario.wall_seconds = time.perf_counter() - started
+        for task in tasks:
+            task.cancel()
+
+class LoadScenario:
+    """
+    Сценарий всплеска: чаты приходят с заданной частотой (пуассоновский поток),
+    каждый загружает PDF и задает вопросы, дожидаясь ответа и делая паузу между вопросами.
+    """
+
+    def __init__(self, chats: int, rate: float, pdf_filename: str, questions: List[str],
+                 questions_per_chat: int = 3, think_time: float = 1.0, timeout: float = 120,
+                 seed: int = 0):
+        self.chats = chats
+        self.rate = rate
+        self.pdf_filename = pdf_filename
+        self.questions = questions
+        self.questions_per_chat = questions_per_chat
+        self.think_time = think_time
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.wall_seconds = 0.0
+
+    def arrivals(self):
+        """(chat_id, задержка старта чата)"""
+        delay = 0.0
+        for chat_id in range(1, self.chats + 1):
+            yield chat_id, delay
+            delay += self.rng.expovariate(self.rate)
+
+    def script(self, chat_id: int) -> List[tuple]:
+        rng = random.Random(chat_id)
+        steps = [("command", "/load_pdf"), ("load", self.pdf_filename)]
+        steps += [("question", rng.choice(self.questions)) for _ in range(self.questions_per_chat)]
+        return steps
+
+    def run_chat_sync(self, chat_id: int, delay: float, send: Callable):
+        time.sleep(delay)
+        for kind, text in self.script(chat_id):
+            record = send(chat_id, kind, text)
+            if record.done_at is None or record.rejected:
+                return
+            time.sleep(self.think_time)
+
+    async def run_chat_async(self, chat_id: int, delay: float, send: Callable):
+        await asyncio.sleep(delay)
+        for kind, text in self.script(chat_id):
+            record = await send(chat_id, kind, text)
+            if record.done_at is None or record.rejected:
+                return
+            await asyncio.sleep(self.think_time)
+
+def build_report(records: List[UpdateRecord], wall_seconds: float) -> Dict:
+    report = {"wall_seconds": wall_seconds, "kinds": {}}
+    completed = [r for r in records if r.done_at is not None and not r.rejected]
+    report["throughput"] = len(completed) / wall_seconds if wall_seconds else 0.0
+
+    for kind in ("command", "load", "question"):
+        kind_records = [r for r in records if r.kind == kind]
+        done = [r for r in kind_records if r.done_at is not None and not r.rejected]
+        report["kinds"][kind] = {
+            "sent": len(kind_records),
+            "completed": len(done),
+            "rejected": sum(r.rejected for r in kind_records),
+            "timed_out": sum(r.done_at is None for r in kind_records),
+            "latency": latency_summary([r.done_at - r.sent_at for r in done]),
+            "first_response": latency_summary(
+                [r.first_response_at - r.sent_at for r in done if r.first_response_at]
+            ),
+            "dispatch_wait": latency_summary(
+                [r.started_at - r.sent_at for r in kind_records if r.started_at]
+            )
+        }
+    return report
+
+def print_report(report: Dict, summary: Dict):
+    print(f"\n📈 Нагрузочный тест: {report['wall_seconds']:.1f} с, "
+          f"пропускная способность {report['throughput']:.2f} запросов/с")
+    names = {"command": "/load_pdf", "load": "загрузка PDF", "question": "вопросы"}
+    for kind, stats in report["kinds"].items():
+        if not stats["sent"]:
+            continue
+        latency, first = stats["latency"], stats["first_response"]
+        print(f"• {names[kind]}: отправлено {stats['sent']}, выполнено {stats['completed']}, "
+              f"отклонено {stats['rejected']}, без ответа {stats['timed_out']}")
+        print(f"    ответ p50 {latency['p50_ms']:.0f} / p95 {latency['p95_ms']:.0f} / "
+              f"p99 {latency['p99_ms']:.0f} мс; первая реакция p95 {first['p95_ms']:.0f} мс; "
+              f"ожидание обработчика p95 {stats['dispatch_wait']['p95_ms']:.0f} мс")
+
+    if summary["queues"]:
+        print("⏳ Ожидание в очередях (p50 / p95, мс):")
+        for pool, stats in sorted(summary["queues"].items()):
+            print(f"    {pool}: {stats['p50'] * 1000:.0f} / {stats['p95'] * 1000:.0f} ({stats['count']})")
+    print("⏱️ Этапы (среднее / p95, мс):")
+    for stage, stats in sorted(summary["stages"].items()):
+        print(f"    {stage}: {stats['avg'] * 1000:.0f} / {stats['p95'] * 1000:.0f} ({stats['count']})")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчика бота с имитацией Telegram")
+    add_offline_arguments(parser)
+    parser.add_argument("--chats", type=int, default=50, help="Число чатов")
+    parser.add_argument("--rate", type=float, default=5, help="Новых чатов в секунду")
+    parser.add_argument("--questions-per-chat", type=int, default=3)
+    parser.add_argument("--think-time", type=float, default=1.0, help="Пауза пользователя между вопросами, с")
+    parser.add_argument("--timeout", type=float, default=120, help="Сколько ждать ответа, с")
+    parser.add_argument("--async", dest="async_mode", action="store_true",
+                        help="AsyncTelegramBotHandler вместо TelegramBotHandler")
+    parser.add_argument("--threads", type=int, default=2,
+                        help="Потоков обработки у синхронного TeleBot (в pyTelegramBotAPI по умолчанию 2)")
+    parser.add_argument("--stream", action="store_true", help="Потоковые ответы")
+    args = parser.parse_args(argv)
+
+    if args.pdf and not args.questions:
+        parser.error("с --pdf нужен --questions")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="autobot_load_")
+    pdf_folder, pdf_filename, questions = prepare_manual(args, workdir)
+    stub = start_offline_environment(args, workdir)
+    settings.STREAM_RESPONSES = args.stream
+
+    # Импорт после настройки окружения: синглтоны читают settings при создании
+    from agents.coordinator import CoordinatorAgent
+    from database.embedding_engine import embedding_engine
+    from utils.metrics import metrics
+
+    embedding_engine.warm_up()
+    coordinator = CoordinatorAgent()
+    coordinator.pdf_analyzer.pdf_folder = pdf_folder
+    # Индекс строится заранее: тест измеряет обслуживание чатов, а не первую индексацию
+    coordinator.pdf_indexer.index(pdf_filename)
+
+    scenario = LoadScenario(
+        chats=args.chats,
+        rate=args.rate,
+        pdf_filename=pdf_filename,
+        questions=[item["question"] for item in questions],
+        questions_per_chat=args.questions_per_chat,
+        think_time=args.think_time,
+        timeout=args.timeout,
+        seed=args.seed
+    )
+
+    if args.async_mode:
+        from telegram_bot.async_bot_handler import AsyncTelegramBotHandler
+        bot = FakeAsyncTeleBot(scenario)
+        AsyncTelegramBotHandler(bot=bot, coordinator=coordinator).run()
+    else:
+        from telegram_bot.bot_handler import TelegramBotHandler
+        bot = FakeTeleBot(scenario, num_threads=args.threads)
+        TelegramBotHandler(bot=bot, coordinator=coordinator).run()
+
+    stub.stop()
+    report = build_report(bot.records, scenario.wall_seconds)
+    print_report(report, metrics.summary())
+
+    failed = sum(stats["timed_out"] for stats in report["kinds"].values())
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
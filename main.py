@@ -1,7 +1,9 @@
 import os
 import sys
-from telegram_bot.bot_handler import TelegramBotHandler
+from utils.startup import startup_timer
+from config.settings import settings
 from utils.file_processor import create_folders, check_environment
+from utils.metrics import metrics, start_metrics_server
 
 def main():
     """Главная функция приложения"""
@@ -52,6 +54,10 @@ def main():
     print("   • Убедитесь, что в папке data/pdf_files есть PDF файлы")
     print("   • Убедитесь, что в .env файле указаны корректные ключи API")
     print("   • Для загрузки PDF используйте команду: /load_pdf имя_файла.pdf")
+    print("   • Для заранее подготовленных индексов: python -m cli index --all")
+    
+    if settings.METRICS_ENABLED and settings.METRICS_PORT:
+        start_metrics_server(metrics, settings.METRICS_HOST, settings.METRICS_PORT)
     
     print("\n" + "="*60)
     print("🤖 Запуск Telegram бота...")
@@ -59,8 +65,16 @@ def main():
     print("\nДля остановки нажмите Ctrl+C\n")
     
     try:
-        # Запуск Telegram бота
-        bot_handler = TelegramBotHandler()
+        # Запуск Telegram бота. Тяжелые модули (torch, chromadb, ollama) импортируются
+        # в фоне при создании агентов, опрос Telegram начинается сразу
+        with startup_timer.step("импорт обработчика Telegram"):
+            if settings.BOT_ASYNC_MODE:
+                from telegram_bot.async_bot_handler import AsyncTelegramBotHandler as BotHandler
+            else:
+                from telegram_bot.bot_handler import TelegramBotHandler as BotHandler
+        with startup_timer.step("создание бота"):
+            bot_handler = BotHandler()
+        print(f"⏱️ Опрос Telegram через {startup_timer.elapsed():.2f} с после запуска")
         bot_handler.run()
         
     except KeyboardInterrupt:
@@ -0,0 +1,255 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from config.settings import settings
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+class Counter:
+    """Счетчик с метками (монотонно растет)"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: наблюдение - O(log корзин), без хранения значений"""
+
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # Метки -> [счетчики по корзинам (+Inf последней), сумма, количество]
+        self._series: Dict[LabelKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict[LabelKey, Tuple[List[int], float, int]]:
+        with self._lock:
+            return {key: (list(series[0]), series[1], series[2]) for key, series in self._series.items()}
+
+    def quantile(self, counts: List[int], total: int, q: float) -> float:
+        """Оценка квантиля по корзинам (линейная интерполяция внутри корзины)"""
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total_sum, total) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total_sum:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {total}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Метрики процесса: время этапов (span), гистограммы и счетчики.
+    Время этапа - собственное, без вложенных этапов, поэтому этапы запроса в сумме дают его длительность.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.stage_seconds = self.histogram(
+            "autobot_stage_seconds", "Собственное время этапа обработки (без вложенных этапов)"
+        )
+        self.request_seconds = self.histogram(
+            "autobot_request_seconds", "Время ответа на сообщение от получения до отправки"
+        )
+        self.queue_seconds = self.histogram(
+            "autobot_queue_seconds", "Ожидание в очереди до начала обработки (по пулам и планировщику)"
+        )
+        self.queries = self.counter("autobot_queries_total", "Вопросы пользователей")
+        self.cache_hits = self.counter("autobot_answer_cache_hits_total", "Ответы из кэша")
+        self.empty_retrievals = self.counter(
+            "autobot_empty_retrievals_total", "Вопросы без достаточно релевантных фрагментов"
+        )
+        self.errors = self.counter("autobot_errors_total", "Ошибки обработки по этапам")
+        self.structured_hits = self.counter(
+            "autobot_structured_hits_total", "Вопросы, найденные в таблицах и разделах руководства"
+        )
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text)
+            return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str,
+                  buckets: Iterable[float] = Histogram.DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, buckets)
+            return self._metrics[name]
+
+    def _stack(self) -> List[List[float]]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, stage: str):
+        """Замер этапа; вложенные этапы вычитаются из времени внешнего"""
+        if not self.enabled:
+            yield
+            return
+
+        stack = self._stack()
+        frame = [0.0]
+        stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            self.stage_seconds.observe(max(0.0, elapsed - frame[0]), stage=stage)
+
+    def timed_iter(self, stage: str, iterable: Iterable) -> Iterator:
+        """Итератор, время ожидания каждого элемента которого записывается в этап stage"""
+        iterator = iter(iterable)
+        while True:
+            with self.span(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def observe_stage(self, stage: str, seconds: float):
+        """Запись этапа, замеренного вручную (например, в корутине, где span неприменим)"""
+        if self.enabled:
+            self.stage_seconds.observe(seconds, stage=stage)
+
+    def render(self) -> str:
+        """Текст в формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict:
+        """Сводка для /stats: квантили по этапам и значения счетчиков"""
+        stages = {}
+        for key, (counts, total_sum, total) in self.stage_seconds.snapshot().items():
+            stages[dict(key)["stage"]] = {
+                "count": total,
+                "avg": total_sum / total if total else 0.0,
+                "p50": self.stage_seconds.quantile(counts, total, 0.5),
+                "p95": self.stage_seconds.quantile(counts, total, 0.95)
+            }
+
+        queues = {}
+        for key, (counts, total_sum, total) in self.queue_seconds.snapshot().items():
+            queues[dict(key)["pool"]] = {
+                "count": total,
+                "p50": self.queue_seconds.quantile(counts, total, 0.5),
+                "p95": self.queue_seconds.quantile(counts, total, 0.95)
+            }
+
+        requests = {}
+        for counts, total_sum, total in self.request_seconds.snapshot().values():
+            requests = {
+                "count": total,
+                "p50": self.request_seconds.quantile(counts, total, 0.5),
+                "p95": self.request_seconds.quantile(counts, total, 0.95)
+            }
+
+        with self._lock:
+            counters = [metric for metric in self._metrics.values() if isinstance(metric, Counter)]
+        return {
+            "stages": stages,
+            "queues": queues,
+            "requests": requests,
+            "counters": {counter.name: sum(counter.values().values()) for counter in counters}
+        }
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(registry: MetricsRegistry, host: str, port: int) -> ThreadingHTTPServer:
+    """HTTP-эндпоинт /metrics в фоновом потоке"""
+    handler = type("MetricsRequestHandler", (_MetricsRequestHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📊 Метрики доступны на http://{host}:{port}/metrics")
+    return server
+
+metrics = MetricsRegistry(enabled=settings.METRICS_ENABLED)
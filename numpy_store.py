@@ -0,0 +1,594 @@
+import json
+import os
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Union
+import numpy as np
+
+class CompressedTextStore:
+    """
+    Тексты фрагментов на диске: каждый сжат zlib отдельно, файл читается через memmap.
+    В памяти только смещения, текст распаковывается лишь для итоговых фрагментов.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._data: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+
+    @property
+    def data_path(self) -> str:
+        return self.path + ".bin"
+
+    @property
+    def offsets_path(self) -> str:
+        return self.path + ".offsets.npy"
+
+    def exists(self) -> bool:
+        return os.path.exists(self.data_path) and os.path.exists(self.offsets_path)
+
+    def open(self):
+        self._offsets = np.load(self.offsets_path)
+        # memmap нельзя создать над пустым файлом
+        self._data = (np.memmap(self.data_path, dtype=np.uint8, mode="r")
+                      if self._offsets[-1] else np.empty(0, dtype=np.uint8))
+
+    def close(self):
+        self._data = None
+        self._offsets = None
+
+    def __len__(self) -> int:
+        return 0 if self._offsets is None else len(self._offsets) - 1
+
+    def raw(self, index: int) -> bytes:
+        return bytes(self._data[self._offsets[index]:self._offsets[index + 1]])
+
+    def text(self, index: int) -> str:
+        return zlib.decompress(self.raw(index)).decode("utf-8")
+
+    def write(self, blobs: Iterable[bytes]) -> List[str]:
+        """Запись во временные файлы; пути для os.replace возвращаются вызывающему"""
+        offsets = [0]
+        tmp_data = self.data_path + ".tmp"
+        with open(tmp_data, "wb") as f:
+            for blob in blobs:
+                f.write(blob)
+                offsets.append(offsets[-1] + len(blob))
+        tmp_offsets = self.offsets_path + ".tmp"
+        with open(tmp_offsets, "wb") as f:
+            np.save(f, np.asarray(offsets, dtype=np.int64))
+        return [tmp_data, tmp_offsets]
+
+def _concat(parts: List[Optional[np.ndarray]]) -> Optional[np.ndarray]:
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return None
+    return np.concatenate(parts) if len(parts) > 1 else np.array(parts[0])
+
+class NumpyCollection:
+    """
+    Легкая коллекция в памяти процесса: матрица эмбеддингов (memmap float32/float16/int8)
+    и компактная таблица метаданных по столбцам.
+    Повторяет ту часть API коллекции ChromaDB, которой пользуется VectorDatabase
+    (count/get/upsert/delete/query), поэтому бэкенд выбирается настройкой без изменения кода поиска.
+
+    Компактный режим: int8 (скалярное квантование с масштабом на строку) или float16 для перебора,
+    лучшие rescore_factor * n_results кандидатов пересчитываются по float32 из memmap-файла,
+    тексты - в сжатом хранилище (compress_text) вместо таблицы в памяти.
+    """
+
+    # Размер блока строк при переводе float16 в float32 для скалярных произведений
+    SCORE_BLOCK_ROWS = 8192
+    # IVF строится, только если на список в среднем приходится столько векторов
+    IVF_MIN_LIST_SIZE = 16
+    IVF_ITERATIONS = 8
+
+    def __init__(self, name: str, path: str, metadata: Optional[Dict] = None,
+                 dtype: str = "float32", ivf_lists: int = 0, ivf_nprobe: int = 4,
+                 rescore_factor: int = 4, compress_text: bool = False):
+        self.name = name
+        self.path = path
+        self.metadata = metadata or {}
+        self.dtype = np.dtype(dtype)
+        self.ivf_lists = ivf_lists
+        self.ivf_nprobe = ivf_nprobe
+        self.rescore_factor = rescore_factor
+        self.compress_text = compress_text
+
+        self._lock = threading.RLock()
+        # Векторы для перебора (в self.dtype), масштабы строк для int8 и float32 для пересчета
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._full: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        # Строка - текст в памяти, число - номер текста в сжатом хранилище
+        self._documents: List[Union[str, int]] = []
+        self._text_store = CompressedTextStore(os.path.join(path, "documents"))
+        self._columns: Dict[str, List] = {}
+        self._positions: Dict[str, int] = {}
+
+        # Изменения копятся и применяются одним проходом перед чтением
+        self._pending_vectors: List[tuple] = []
+        self._deleted_rows: set = set()
+        self._rows_by_source: Optional[Dict[str, np.ndarray]] = None
+        self._ivf: Optional[tuple] = None
+        self._dirty = False
+
+        self._load()
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.npy")
+
+    @property
+    def scales_path(self) -> str:
+        return os.path.join(self.path, "scales.npy")
+
+    @property
+    def full_vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors_full.npy")
+
+    @property
+    def table_path(self) -> str:
+        return os.path.join(self.path, "table.json")
+
+    def _pending_full_path(self, generation: int) -> str:
+        return os.path.join(self.path, f"vectors_full.pending{generation}.npy")
+
+    def _pending_full_file(self) -> Optional[str]:
+        """Файл несохраненной матрицы float32, если точные векторы сейчас читаются из него"""
+        filename = getattr(self._full, "filename", None)
+        if filename and os.path.basename(filename).startswith("vectors_full.pending"):
+            return filename
+        return None
+
+    @property
+    def keeps_full_precision(self) -> bool:
+        return self.dtype != np.float32 and self.rescore_factor > 0
+
+    def _load(self):
+        # Несохраненные матрицы прошлого процесса не нужны: на диске действует table.json
+        for generation in (0, 1):
+            if os.path.exists(self._pending_full_path(generation)):
+                os.remove(self._pending_full_path(generation))
+        if not os.path.exists(self.table_path) or not os.path.exists(self.vectors_path):
+            return
+        try:
+            with open(self.table_path, "r", encoding="utf-8") as f:
+                table = json.load(f)
+            vectors = np.load(self.vectors_path, mmap_mode="r")
+            scales = np.load(self.scales_path, mmap_mode="r") if vectors.dtype == np.int8 else None
+            full = (np.load(self.full_vectors_path, mmap_mode="r")
+                    if table.get("full_precision") else None)
+            if "documents" not in table:
+                self._text_store.open()
+        except (OSError, ValueError):
+            print(f"⚠️ Не удалось прочитать коллекцию '{self.name}', она будет создана заново")
+            return
+
+        rows = len(table["ids"])
+        documents = table["documents"] if "documents" in table else list(range(len(self._text_store)))
+        if any(len(part) != rows for part in (vectors, documents) + tuple(
+                part for part in (scales, full) if part is not None)):
+            print(f"⚠️ Коллекция '{self.name}' повреждена (векторов {vectors.shape[0]}, "
+                  f"записей {rows}), она будет создана заново")
+            self._text_store.close()
+            return
+
+        self.metadata = table.get("metadata", self.metadata)
+        self._ids = table["ids"]
+        self._documents = documents
+        self._columns = table["columns"]
+        self._positions = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        if rows:
+            self._vectors, self._scales, self._full = vectors, scales, full
+
+        # Формат на диске отличается от настроек - пересохраняем в нужном при следующем persist
+        if rows and (vectors.dtype != self.dtype or (full is not None) != self.keeps_full_precision):
+            dense = self._dense()
+            self._vectors, self._scales, self._full = self._encode(dense)
+            self._dirty = True
+        if ("documents" in table) == self.compress_text:
+            self._dirty = True
+
+    def _encode(self, vectors: np.ndarray) -> tuple:
+        """Нормированные float32 -> (векторы для перебора, масштабы int8, float32 для пересчета)"""
+        full = vectors if self.keeps_full_precision else None
+        if self.dtype == np.int8:
+            # Симметричное квантование: свой масштаб у каждой строки
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12).astype(np.float32) / 127
+            codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+            return codes, scales, full
+        return vectors.astype(self.dtype), None, full
+
+    def _dense(self, rows=None) -> np.ndarray:
+        """Векторы float32: точные, если хранятся, иначе восстановленные из квантованных"""
+        if self._vectors is None:
+            return np.empty((0, 0), dtype=np.float32)
+        if rows is None:
+            rows = slice(None)
+        if self._full is not None:
+            return np.asarray(self._full[rows], dtype=np.float32)
+        vectors = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._scales is not None:
+            vectors = vectors * np.asarray(self._scales[rows])[:, None]
+        return vectors
+
+    def count(self) -> int:
+        return len(self._positions)
+
+    def upsert(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict]):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        # Храним нормированные векторы: косинусная близость = скалярное произведение
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, 1e-12)
+        encoded = self._encode(vectors)
+
+        with self._lock:
+            row = len(self._ids)
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                # Прежняя строка id (в том числе из этого же пакета) удаляется - остается последняя
+                previous = self._positions.get(doc_id)
+                if previous is not None:
+                    self._deleted_rows.add(previous)
+                for key in metadata.keys() - self._columns.keys():
+                    self._columns[key] = [None] * row
+                for key, column in self._columns.items():
+                    column.append(metadata.get(key))
+                self._ids.append(doc_id)
+                self._documents.append(document)
+                self._positions[doc_id] = row
+                row += 1
+
+            self._pending_vectors.append(encoded)
+            self._dirty = True
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            for doc_id in ids:
+                row = self._positions.pop(doc_id, None)
+                if row is not None:
+                    self._deleted_rows.add(row)
+                    self._dirty = True
+
+    def _compact(self):
+        """Применение накопленных добавлений и удалений (один проход, O(n))"""
+        if not self._pending_vectors and not self._deleted_rows:
+            return
+
+        keep = ([row for row in range(len(self._ids)) if row not in self._deleted_rows]
+                if self._deleted_rows else None)
+        # float32 для пересчета читаются с диска - не поднимаем их в память ради добавления строк
+        full = (self._compact_full_on_disk(keep) if isinstance(self._full, np.memmap)
+                else _concat([self._full] + [block[2] for block in self._pending_vectors]))
+        vectors, scales = (
+            _concat([stored] + [block[part] for block in self._pending_vectors])
+            for part, stored in enumerate((self._vectors, self._scales))
+        )
+
+        if keep is not None:
+            vectors = vectors[keep]
+            scales = scales[keep] if scales is not None else None
+            if not isinstance(full, np.memmap):
+                full = full[keep] if full is not None else None
+            self._ids = [self._ids[row] for row in keep]
+            self._documents = [self._documents[row] for row in keep]
+            self._columns = {key: [column[row] for row in keep] for key, column in self._columns.items()}
+            self._positions = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+        self._vectors, self._scales, self._full = vectors, scales, full
+        self._pending_vectors = []
+        self._deleted_rows = set()
+        self._rows_by_source = None
+        self._ivf = None
+
+    def _compact_full_on_disk(self, keep: Optional[List[int]]) -> np.memmap:
+        """
+        Сохраненные и новые строки float32 переписываются блоками в файл vectors_full.pendingN.npy
+        (memmap), persist затем ставит его на место vectors_full.npy без повторной записи.
+        """
+        parts = [self._full] + [block[2] for block in self._pending_vectors]
+        keep_rows = None if keep is None else np.asarray(keep, dtype=np.int64)
+        rows = sum(len(part) for part in parts) if keep_rows is None else len(keep_rows)
+
+        previous = self._pending_full_file()
+        path = self._pending_full_path(1 if previous == self._pending_full_path(0) else 0)
+        full = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32,
+                                         shape=(rows, self._full.shape[1]))
+        written = offset = 0
+        for part in parts:
+            for start in range(0, len(part), self.SCORE_BLOCK_ROWS):
+                stop = min(start + self.SCORE_BLOCK_ROWS, len(part))
+                if keep_rows is None:
+                    block = part[start:stop]
+                else:
+                    first, last = np.searchsorted(keep_rows, [offset + start, offset + stop])
+                    block = part[keep_rows[first:last] - offset]
+                full[written:written + len(block)] = block
+                written += len(block)
+            offset += len(part)
+        full.flush()
+
+        self._full = parts = None
+        if previous is not None:
+            os.remove(previous)
+        return np.load(path, mmap_mode="r")
+
+    def _filter_rows(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Строки, подходящие под where (только равенство по одному полю); None - все строки"""
+        if not where:
+            return None
+        if len(where) != 1:
+            raise ValueError(f"Неподдерживаемый фильтр: {where}")
+        key, value = next(iter(where.items()))
+        if isinstance(value, dict):
+            value = value.get("$eq")
+
+        if key == "source":
+            # Фильтр по PDF - самый частый, строки по источникам кэшируются
+            if self._rows_by_source is None:
+                rows_by_source: Dict[str, List[int]] = {}
+                for row, source in enumerate(self._columns.get("source", [])):
+                    rows_by_source.setdefault(source, []).append(row)
+                self._rows_by_source = {
+                    source: np.asarray(rows, dtype=np.int64) for source, rows in rows_by_source.items()
+                }
+            return self._rows_by_source.get(value, np.empty(0, dtype=np.int64))
+
+        column = self._columns.get(key, [])
+        return np.asarray([row for row, item in enumerate(column) if item == value], dtype=np.int64)
+
+    def _document(self, row: int) -> str:
+        document = self._documents[row]
+        return document if isinstance(document, str) else self._text_store.text(document)
+
+    def _record(self, row: int, include: List[str]) -> Dict:
+        # Текст распаковывается, только если его запросили
+        record = {}
+        if "documents" in include:
+            record["documents"] = self._document(row)
+        if "metadatas" in include:
+            record["metadatas"] = {key: column[row] for key, column in self._columns.items()
+                                   if column[row] is not None}
+        return record
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            include: Optional[List[str]] = None) -> Dict:
+        include = ["documents", "metadatas"] if include is None else include
+        with self._lock:
+            self._compact()
+            if ids is not None:
+                rows = [self._positions[doc_id] for doc_id in ids if doc_id in self._positions]
+            else:
+                filtered = self._filter_rows(where)
+                rows = range(len(self._ids)) if filtered is None else filtered.tolist()
+
+            records = [self._record(row, include) for row in rows] if include else []
+            result = {"ids": [self._ids[row] for row in rows]}
+            for key in include:
+                if key == "embeddings":
+                    result[key] = self._dense(np.asarray(rows, dtype=np.int64))
+                else:
+                    result[key] = [record[key] for record in records]
+        return result
+
+    def _scores(self, rows: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        vectors = self._vectors if rows is None else self._vectors[rows]
+        if vectors.dtype == np.float32:
+            return vectors @ query
+        # float16/int8 умножаются блоками через float32: в numpy нет быстрого matmul для них
+        scores = np.concatenate([
+            vectors[start:start + self.SCORE_BLOCK_ROWS].astype(np.float32) @ query
+            for start in range(0, len(vectors), self.SCORE_BLOCK_ROWS)
+        ]) if len(vectors) else np.empty(0, dtype=np.float32)
+        if self._scales is not None:
+            scores *= self._scales if rows is None else self._scales[rows]
+        return scores
+
+    def _build_ivf(self):
+        """Разбиение на ivf_lists кластеров сферическим k-means"""
+        vectors = self._dense()
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(len(vectors), self.ivf_lists, replace=False)]
+
+        for _ in range(self.IVF_ITERATIONS):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            for list_id in range(self.ivf_lists):
+                members = vectors[assignment == list_id]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[list_id] = centroid / max(np.linalg.norm(centroid), 1e-12)
+
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        lists = [np.flatnonzero(assignment == list_id) for list_id in range(self.ivf_lists)]
+        self._ivf = (centroids, lists)
+
+    def _ivf_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        if not self.ivf_lists or len(self._ids) < self.ivf_lists * self.IVF_MIN_LIST_SIZE:
+            return None
+        if self._ivf is None:
+            self._build_ivf()
+        centroids, lists = self._ivf
+        probes = np.argsort(-(centroids @ query))[:self.ivf_nprobe]
+        return np.sort(np.concatenate([lists[list_id] for list_id in probes]))
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict] = None,
+              include: Optional[List[str]] = None) -> Dict:
+        include = ["documents", "metadatas", "distances"] if include is None else include
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries.reshape(-1, queries.shape[-1])
+        result = {"ids": []}
+        for key in include:
+            result[key] = []
+
+        with self._lock:
+            self._compact()
+            has_vectors = self._vectors is not None
+            filtered = self._filter_rows(where)
+
+            for query in queries:
+                query = query / max(np.linalg.norm(query), 1e-12)
+
+                rows = filtered
+                probed = self._ivf_rows(query) if has_vectors else None
+                if probed is not None:
+                    rows = probed if filtered is None else np.intersect1d(probed, filtered, assume_unique=True)
+                    # Мало кандидатов в ближайших кластерах - точный перебор
+                    if len(rows) < n_results:
+                        rows = filtered
+
+                if not has_vectors:
+                    top_rows, top_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+                else:
+                    scores = self._scores(rows, query)
+                    k = min(n_results, len(scores))
+                    # С точными векторами отбираем больше кандидатов и пересчитываем их в float32
+                    candidates = min(k * self.rescore_factor, len(scores)) if self._full is not None else k
+                    top = (np.argpartition(-scores, candidates - 1)[:candidates]
+                           if candidates else np.empty(0, dtype=np.int64))
+                    top_rows = top if rows is None else rows[top]
+                    top_scores = scores[top]
+                    if self._full is not None and len(top_rows):
+                        top_rows = np.sort(top_rows)  # чтение memmap по возрастанию строк
+                        top_scores = np.asarray(self._full[top_rows], dtype=np.float32) @ query
+                    order = np.argsort(-top_scores)[:k]
+                    top_rows, top_scores = top_rows[order], top_scores[order]
+
+                records = [self._record(row, include) for row in top_rows.tolist()]
+                result["ids"].append([self._ids[row] for row in top_rows.tolist()])
+                for key in include:
+                    if key == "distances":
+                        result[key].append((1 - top_scores).tolist())
+                    else:
+                        result[key].append([record[key] for record in records])
+        return result
+
+    def storage_info(self) -> Dict:
+        """Объем на диске и в памяти: перебираемые векторы и тексты, которые держит таблица"""
+        with self._lock:
+            self._compact()
+            disk = sum(
+                os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path)
+            ) if os.path.isdir(self.path) else 0
+            scan = sum(array.nbytes for array in (self._vectors, self._scales) if array is not None)
+            text_memory = sum(len(document.encode("utf-8")) for document in self._documents
+                              if isinstance(document, str))
+            return {
+                "rows": len(self._ids),
+                "dtype": self.dtype.name,
+                "full_precision": self._full is not None,
+                "compressed_text": self.compress_text,
+                "disk_bytes": disk,
+                "scan_bytes": scan,
+                "text_memory_bytes": text_memory
+            }
+
+    def persist(self):
+        """Атомарная запись матрицы и таблицы на диск, матрица дальше читается через memmap"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._compact()
+            os.makedirs(self.path, exist_ok=True)
+
+            empty = np.empty((0, 0), dtype=self.dtype)
+            arrays = {
+                self.vectors_path: self._vectors if self._vectors is not None else empty,
+                self.scales_path: self._scales,
+                self.full_vectors_path: self._full
+            }
+            replacements = []
+            # Матрица float32, уже собранная на диске при _compact, переносится переименованием
+            pending_full = self._pending_full_file()
+            for path, array in arrays.items():
+                if array is None or (path == self.full_vectors_path and pending_full):
+                    continue
+                with open(path + ".tmp", "wb") as f:
+                    np.save(f, np.asarray(array))
+                replacements.append(path)
+            array = None
+
+            table = {
+                "metadata": self.metadata,
+                "ids": self._ids,
+                "columns": self._columns,
+                "full_precision": self._full is not None
+            }
+            if self.compress_text:
+                # Уже сжатые тексты копируются как есть, без распаковки
+                blobs = (self._text_store.raw(document) if isinstance(document, int)
+                         else zlib.compress(document.encode("utf-8"))
+                         for document in self._documents)
+                tmp_paths = self._text_store.write(blobs)
+                replacements += [path[:-len(".tmp")] for path in tmp_paths]
+            else:
+                self._documents = [self._document(row) for row in range(len(self._ids))]
+                table["documents"] = self._documents
+
+            with open(self.table_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(table, f, ensure_ascii=False)
+            replacements.append(self.table_path)
+
+            # Старые memmap отпускаем до замены файлов (на Windows открытый файл не заменить)
+            written = {path: array is not None for path, array in arrays.items()}
+            arrays.clear()
+            self._text_store.close()
+            self._vectors = self._scales = self._full = None
+            for path in replacements:
+                os.replace(path + ".tmp", path)
+            if pending_full:
+                os.replace(pending_full, self.full_vectors_path)
+            # Файлы прежнего формата больше не нужны
+            stale = [path for path, exists in written.items() if not exists]
+            if not self.compress_text:
+                stale += [self._text_store.data_path, self._text_store.offsets_path]
+            for path in stale:
+                if os.path.exists(path):
+                    os.remove(path)
+
+            if len(self._ids):
+                self._vectors = np.load(self.vectors_path, mmap_mode="r")
+                if written[self.scales_path]:
+                    self._scales = np.load(self.scales_path, mmap_mode="r")
+                if written[self.full_vectors_path]:
+                    self._full = np.load(self.full_vectors_path, mmap_mode="r")
+            if self.compress_text:
+                self._text_store.open()
+                self._documents = list(range(len(self._ids)))
+            self._dirty = False
+
+class NumpyClient:
+    """
+    Замена PersistentClient ChromaDB для небольших каталогов:
+    без SQLite и HNSW, каждая коллекция - файлы в persist_directory/numpy/<имя>/.
+    """
+
+    def __init__(self, persist_directory: str, dtype: str = "float32",
+                 ivf_lists: int = 0, ivf_nprobe: int = 4,
+                 rescore_factor: int = 4, compress_text: bool = False):
+        self.persist_directory = persist_directory
+        self.dtype = dtype
+        self.ivf_lists = ivf_lists
+        self.ivf_nprobe = ivf_nprobe
+        self.rescore_factor = rescore_factor
+        self.compress_text = compress_text
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None) -> NumpyCollection:
+        """Один объект коллекции на процесс - все VectorDatabase видят одни и те же данные"""
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = NumpyCollection(
+                    name=name,
+                    path=os.path.join(self.persist_directory, "numpy", name),
+                    metadata=metadata,
+                    dtype=self.dtype,
+                    ivf_lists=self.ivf_lists,
+                    ivf_nprobe=self.ivf_nprobe,
+                    rescore_factor=self.rescore_factor,
+                    compress_text=self.compress_text
+                )
+                self._collections[name] = collection
+            return collection
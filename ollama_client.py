@@ -0,0 +1,234 @@
+import json
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Union
+
+class LLMError(Exception):
+    """Ошибка генерации ответа. user_message - текст для пользователя вместо технических деталей"""
+    user_message = "Не удалось сгенерировать ответ. Попробуйте повторить вопрос позже."
+
+class LLMUnavailableError(LLMError):
+    """Сервер Ollama недоступен"""
+    user_message = "Языковая модель сейчас недоступна. Попробуйте повторить вопрос через минуту."
+
+class LLMTimeoutError(LLMError):
+    """Ollama не ответила за отведенное время"""
+    user_message = "Модель отвечает слишком долго. Попробуйте повторить вопрос позже."
+
+class LLMBusyError(LLMError):
+    """Все слоты генерации заняты дольше допустимого"""
+    user_message = "Бот сейчас перегружен, повторите вопрос через минуту."
+
+class LLMResponseError(LLMError):
+    """Ollama вернула ошибку или ответ неожиданного формата"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class GenerationStats:
+    """
+    Счетчики Ollama по ответам: сколько токенов промпта пересчитано (prefill) и за какое время.
+    При переиспользовании KV-кэша prompt_eval_count меньше полного промпта.
+    """
+
+    FIELDS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "load_duration")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.totals = {field: 0 for field in self.FIELDS}
+        self.last: Dict[str, int] = {}
+
+    def record(self, response) -> Dict[str, int]:
+        values = {field: getattr(response, field, None) or 0 for field in self.FIELDS}
+        with self._lock:
+            self.requests += 1
+            for field, value in values.items():
+                self.totals[field] += value
+            self.last = values
+        print(f"📈 Ollama: промпт {values['prompt_eval_count']} ток. за "
+              f"{values['prompt_eval_duration'] / 1e6:.0f} мс, ответ {values['eval_count']} ток. за "
+              f"{values['eval_duration'] / 1e6:.0f} мс")
+        return values
+
+    def summary(self) -> Dict:
+        """Средние по запросам (длительности Ollama отдает в наносекундах)"""
+        with self._lock:
+            requests = max(self.requests, 1)
+            totals = dict(self.totals)
+        return {
+            "requests": self.requests,
+            "avg_prompt_tokens": totals["prompt_eval_count"] / requests,
+            "avg_prefill_ms": totals["prompt_eval_duration"] / requests / 1e6,
+            "avg_eval_ms": totals["eval_duration"] / requests / 1e6,
+            "avg_load_ms": totals["load_duration"] / requests / 1e6,
+            "eval_tokens_per_second": (totals["eval_count"] / (totals["eval_duration"] / 1e9)
+                                       if totals["eval_duration"] else 0.0)
+        }
+
+class _Flight:
+    """Запрос chat в работе: ожидающие одинаковые запросы получают его результат"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[str] = None
+        self.error: Optional[Exception] = None
+
+class OllamaClient:
+    """
+    Клиент генерации для Ollama:
+    один ollama.Client (пул HTTP-соединений httpx) на процесс, keep_alive держит модель
+    загруженной, ограничение параллелизма совпадает с OLLAMA_NUM_PARALLEL сервера,
+    сетевые сбои повторяются ограниченное число раз, ошибки - типизированные.
+
+    Пакетной генерации в API Ollama нет: запросы в параллельных слотах сервер сам
+    объединяет в батч. Клиент объединяет одинаковые запросы chat, пришедшие одновременно
+    (тот же вопрос с тем же контекстом от разных чатов), - генерация выполняется один раз.
+    """
+
+    def __init__(self, base_url: str, model: str, timeout: float = 120,
+                 keep_alive: Union[str, int] = "30m", max_parallel: int = 1,
+                 max_retries: int = 2, retry_backoff: float = 0.5):
+        self.base_url = base_url
+        self.model = model
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        # ollama (httpx, pydantic) импортируется здесь: обработчики бота используют
+        # исключения этого модуля и не должны ждать этот импорт при запуске
+        import ollama
+        self.client = ollama.Client(host=base_url, timeout=timeout)
+        self.stats = GenerationStats()
+        # Запросы сверх OLLAMA_NUM_PARALLEL сервер все равно ставит в очередь - ждем здесь
+        self._slots = threading.BoundedSemaphore(max(1, max_parallel))
+        # Ключ запроса -> запрос в работе
+        self._flights: Dict[str, _Flight] = {}
+        self._flights_lock = threading.Lock()
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise LLMBusyError(f"Нет свободного слота генерации за {self.timeout} с")
+
+    @staticmethod
+    def _convert_error(error: Exception) -> LLMError:
+        import httpx
+        import ollama
+        if isinstance(error, LLMError):
+            return error
+        if isinstance(error, httpx.TimeoutException):
+            return LLMTimeoutError(str(error))
+        if isinstance(error, (httpx.TransportError, ConnectionError)):
+            return LLMUnavailableError(str(error))
+        if isinstance(error, ollama.ResponseError):
+            return LLMResponseError(error.error, status_code=error.status_code)
+        return LLMError(str(error))
+
+    @staticmethod
+    def _is_retryable(error: LLMError) -> bool:
+        # Модель не найдена / неверный запрос повторять бессмысленно
+        if isinstance(error, LLMResponseError):
+            return error.status_code is not None and error.status_code >= 500
+        return isinstance(error, (LLMUnavailableError, LLMTimeoutError))
+
+    def _wait_before_retry(self, attempt: int, error: LLMError):
+        delay = self.retry_backoff * 2 ** attempt
+        print(f"⚠️ Ollama: {error.__class__.__name__}: {str(error)[:100]}, повтор через {delay:.1f} с")
+        time.sleep(delay)
+
+    def chat(self, messages: List[Dict], options: Optional[Dict] = None) -> str:
+        """Ответ модели целиком; одинаковый запрос, уже выполняющийся, не отправляется повторно"""
+        key = json.dumps([messages, options], sort_keys=True, ensure_ascii=False)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if not flight.done.wait(self.timeout * (self.max_retries + 1)):
+                raise LLMTimeoutError("Одинаковый запрос не завершился за отведенное время")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._chat(messages, options)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _chat(self, messages: List[Dict], options: Optional[Dict] = None) -> str:
+        self._acquire_slot()
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = self.client.chat(
+                        model=self.model,
+                        messages=messages,
+                        options=options,
+                        keep_alive=self.keep_alive,
+                        stream=False
+                    )
+                    content = response.message.content if response.message else None
+                    if content is None:
+                        raise LLMResponseError("Неверный формат ответа")
+                    self.stats.record(response)
+                    return content.strip()
+                except Exception as e:
+                    error = self._convert_error(e)
+                    if attempt == self.max_retries or not self._is_retryable(error):
+                        raise error from e
+                    self._wait_before_retry(attempt, error)
+        finally:
+            self._slots.release()
+
+    def stream_chat(self, messages: List[Dict], options: Optional[Dict] = None) -> Iterator[str]:
+        """
+        Фрагменты ответа по мере генерации.
+        Повтор возможен, только пока пользователю еще ничего не отдано.
+        """
+        self._acquire_slot()
+        try:
+            for attempt in range(self.max_retries + 1):
+                started = False
+                try:
+                    for chunk in self.client.chat(
+                        model=self.model,
+                        messages=messages,
+                        options=options,
+                        keep_alive=self.keep_alive,
+                        stream=True
+                    ):
+                        if chunk.message and chunk.message.content:
+                            started = True
+                            yield chunk.message.content
+                        # Счетчики приходят в последнем фрагменте
+                        if chunk.done:
+                            self.stats.record(chunk)
+                    return
+                except Exception as e:
+                    error = self._convert_error(e)
+                    if started or attempt == self.max_retries or not self._is_retryable(error):
+                        raise error from e
+                    self._wait_before_retry(attempt, error)
+        finally:
+            self._slots.release()
+
+    def warm_up(self) -> bool:
+        """Загрузка модели в память Ollama заранее (пустой промпт только загружает модель)"""
+        try:
+            self.client.generate(model=self.model, prompt="", keep_alive=self.keep_alive)
+            print(f"✅ Модель '{self.model}' загружена в Ollama (keep_alive={self.keep_alive})")
+            return True
+        except Exception as e:
+            error = self._convert_error(e)
+            print(f"⚠️ Не удалось прогреть модель '{self.model}': {str(error)[:100]}")
+            return False
@@ -1,33 +1,151 @@
 import fitz
 import os
-from typing import List, Dict
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Iterable, Iterator
+
+# Заголовок - строка, набранная крупнее основного шрифта страницы во столько раз
+HEADING_SIZE_RATIO = 1.2
+# Меньше линий и прямоугольников на странице - таблицы с разлиновкой быть не может
+MIN_TABLE_RULES = 4
+
+def _clean_cell(cell) -> str:
+    return " ".join(str(cell).split()) if cell is not None else ""
+
+def has_table_rules(page) -> bool:
+    """
+    Есть ли на странице разлиновка, по которой find_tables (стратегия lines) ищет таблицы.
+    Векторная графика читается в разы быстрее, чем работает find_tables, а в руководствах
+    таблицы есть на немногих страницах.
+    """
+    drawings = page.get_cdrawings() if hasattr(page, "get_cdrawings") else page.get_drawings()
+    rules = 0
+    for path in drawings:
+        rules += sum(1 for item in path["items"] if item[0] in ("l", "re", "qu"))
+        if rules >= MIN_TABLE_RULES:
+            return True
+    return False
+
+def extract_page_structure(page, tables: bool = True) -> Dict:
+    """
+    Заголовки (строки крупнее основного текста) и таблицы страницы.
+    Таблицы ищутся только на страницах с разлиновкой; tables=False - без таблиц.
+    """
+    lines = []
+    chars_by_size: Dict[float, int] = {}
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            text = " ".join("".join(span["text"] for span in line["spans"]).split())
+            if not text:
+                continue
+            size = round(max(span["size"] for span in line["spans"]), 1)
+            chars_by_size[size] = chars_by_size.get(size, 0) + len(text)
+            lines.append((text, size))
+    
+    body_size = max(chars_by_size, key=chars_by_size.get) if chars_by_size else 0
+    headings = [
+        {"title": text, "size": size} for text, size in lines
+        if body_size and size >= body_size * HEADING_SIZE_RATIO and 3 <= len(text) <= 80
+    ]
+    
+    found = []
+    # find_tables есть в PyMuPDF начиная с 1.23
+    if tables and hasattr(page, "find_tables") and has_table_rules(page):
+        for table in page.find_tables().tables:
+            header = [_clean_cell(name) for name in table.header.names]
+            rows = [[_clean_cell(cell) for cell in row] for row in table.extract()]
+            if rows and rows[0] == header:
+                rows = rows[1:]
+            rows = [row for row in rows if any(row)]
+            if rows:
+                found.append({"header": header, "rows": rows})
+    
+    return {"headings": headings, "tables": found}
+
+def extract_page_range(pdf_path: str, start: int, end: int, structured: bool = False,
+                       tables: bool = True) -> List[Dict]:
+    """
+    Извлечение текста страниц [start, end) - выполняется в отдельном процессе.
+    structured=True добавляет к странице заголовки и таблицы (extract_page_structure).
+    """
+    doc = fitz.open(pdf_path)
+    documents = []
+    
+    for page_num in range(start, min(end, len(doc))):
+        page = doc[page_num]
+        text = page.get_text()
+        
+        if text.strip():
+            document = {
+                "text": text.strip(),
+                "page": page_num + 1,
+                "source": os.path.basename(pdf_path)
+            }
+            if structured:
+                document.update(extract_page_structure(page, tables))
+            documents.append(document)
+    
+    doc.close()
+    return documents
 
 class PDFAnalyzerAgent:
     def __init__(self, pdf_folder: str):
         self.pdf_folder = pdf_folder
     
+    def page_count(self, pdf_path: str) -> int:
+        with fitz.open(pdf_path) as doc:
+            return len(doc)
+    
+    def table_of_contents(self, pdf_path: str) -> List[Dict]:
+        """Оглавление PDF (закладки): уровень, заголовок и страница начала раздела"""
+        with fitz.open(pdf_path) as doc:
+            return [
+                {"level": level, "title": title.strip(), "page": page}
+                for level, title, page in doc.get_toc(simple=True) if page > 0 and title.strip()
+            ]
+    
     def extract_text_from_pdf(self, pdf_path: str) -> List[Dict]:
-        doc = fitz.open(pdf_path)
-        documents = []
+        return extract_page_range(pdf_path, 0, self.page_count(pdf_path))
+    
+    def iter_pages(self, pdf_path: str, workers: int = 1, pages_per_task: int = 16,
+                   structured: bool = False, tables: bool = True) -> Iterator[Dict]:
+        """
+        Потоковое извлечение страниц по порядку.
+        При workers > 1 диапазоны страниц разбираются в пуле процессов,
+        а в работе одновременно держится не больше 2 * workers диапазонов.
+        structured=True - с заголовками и таблицами страниц (tables=False - без таблиц).
+        """
+        total = self.page_count(pdf_path)
+        ranges = [(start, start + pages_per_task) for start in range(0, total, pages_per_task)]
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text = page.get_text()
-            
-            if text.strip():
-                documents.append({
-                    "text": text.strip(),
-                    "page": page_num + 1,
-                    "source": os.path.basename(pdf_path)
-                })
+        if workers <= 1 or len(ranges) < 2:
+            for start, end in ranges:
+                yield from extract_page_range(pdf_path, start, end, structured, tables)
+            return
         
-        doc.close()
-        return documents
+        # spawn: безопаснее fork в процессе с потоками torch и бота
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=context) as pool:
+            pending = deque()
+            remaining = iter(ranges)
+            
+            for start, end in remaining:
+                pending.append(pool.submit(extract_page_range, pdf_path, start, end, structured, tables))
+                if len(pending) >= 2 * workers:
+                    break
+            
+            while pending:
+                documents = pending.popleft().result()
+                next_range = next(remaining, None)
+                if next_range is not None:
+                    pending.append(pool.submit(extract_page_range, pdf_path, *next_range,
+                                               structured, tables))
+                yield from documents
     
-    def chunk_documents(self, documents: List[Dict], chunk_size: int = 1000, 
-                        chunk_overlap: int = 200) -> List[Dict]:
-        chunks = []
-        
+    def iter_chunks(self, documents: Iterable[Dict], chunk_size: int = 1000,
+                    chunk_overlap: int = 200) -> Iterator[Dict]:
+        """Генератор чанков: страницы не нужно держать в памяти целиком"""
         for doc in documents:
             text = doc["text"]
             words = text.split()
@@ -36,13 +154,17 @@ class PDFAnalyzerAgent:
                 chunk_words = words[i:i + chunk_size]
                 chunk_text = ' '.join(chunk_words)
                 
-                chunks.append({
+                yield {
                     "text": chunk_text,
                     "page": doc["page"],
-                    "source": doc["source"]
-                })
-        
-        return chunks
+                    "source": doc["source"],
+                    "offset": i,
+                    "page_hash": doc.get("page_hash", "")
+                }
+    
+    def chunk_documents(self, documents: List[Dict], chunk_size: int = 1000, 
+                        chunk_overlap: int = 200) -> List[Dict]:
+        return list(self.iter_chunks(documents, chunk_size, chunk_overlap))
     
     def process_pdf(self, pdf_filename: str) -> List[Dict]:
         pdf_path = os.path.join(self.pdf_folder, pdf_filename)
@@ -53,4 +175,4 @@ class PDFAnalyzerAgent:
         documents = self.extract_text_from_pdf(pdf_path)
         chunks = self.chunk_documents(documents)
         
-        return chunks
\ No newline at end of file
+        return chunks
@@ -0,0 +1,257 @@
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+from agents.pdf_analyzer import PDFAnalyzerAgent
+from database.vector_store import VectorDatabase
+from database.index_manifest import IndexManifest, file_sha256, text_sha256
+from database.structure_index import StructureIndex, structure_path
+from database.embedding_engine import embedding_engine
+from utils.text_chunker import SentenceChunker, default_max_tokens, estimate_tokens
+from config.settings import settings
+from utils.metrics import metrics
+
+MANIFEST_FILENAME = "index_manifest.json"
+
+def discover_pdfs(pdf_folder: str) -> List[str]:
+    """Все PDF-файлы в папке"""
+    if not os.path.isdir(pdf_folder):
+        return []
+    return sorted(name for name in os.listdir(pdf_folder) if name.lower().endswith(".pdf"))
+
+class PDFIndexer:
+    """Инкрементальная индексация PDF: переэмбеддинг только измененных страниц"""
+
+    def __init__(self, pdf_analyzer: PDFAnalyzerAgent,
+                 manifest: Optional[IndexManifest] = None):
+        self.pdf_analyzer = pdf_analyzer
+        self.manifest = manifest or IndexManifest(
+            os.path.join(settings.VECTOR_DB_PATH, MANIFEST_FILENAME)
+        )
+        self._sentence_chunker: Optional[SentenceChunker] = None
+
+    def catalogue(self) -> List[Dict]:
+        """
+        Каталог руководств для бота: все PDF из папки с отметкой, проиндексирован ли файл
+        (непроиндексированные индексируются при выборе).
+        """
+        indexed = set(self.manifest.names())
+        return [{"name": name, "indexed": name in indexed}
+                for name in discover_pdfs(self.pdf_analyzer.pdf_folder)]
+
+    def indexed_pdfs(self) -> List[str]:
+        """Проиндексированные файлы, которые есть на диске"""
+        available = discover_pdfs(self.pdf_analyzer.pdf_folder)
+        return [name for name in self.manifest.names() if name in available]
+
+    def sentence_chunker(self) -> SentenceChunker:
+        """Чанкер по предложениям с размером под лимиты моделей (создается один раз)"""
+        if self._sentence_chunker is None:
+            if settings.CHUNK_TOKENIZER == "embedding":
+                count_tokens = embedding_engine.count_tokens
+                embedding_limit = embedding_engine.max_tokens()
+            else:
+                count_tokens = estimate_tokens
+                embedding_limit = settings.EMBEDDING_MAX_TOKENS
+
+            self._sentence_chunker = SentenceChunker(
+                max_tokens=settings.CHUNK_MAX_TOKENS or default_max_tokens(embedding_limit),
+                overlap_tokens=settings.CHUNK_OVERLAP_TOKENS,
+                count_tokens=count_tokens
+            )
+        return self._sentence_chunker
+
+    def chunker_settings(self) -> Dict:
+        """Настройки чанкера, при смене которых индекс нужно перестроить"""
+        if settings.CHUNKER == "sentence":
+            return dict(self.sentence_chunker().settings(), tokenizer=settings.CHUNK_TOKENIZER)
+        return {
+            "chunk_size": settings.CHUNK_SIZE,
+            "chunk_overlap": settings.CHUNK_OVERLAP
+        }
+
+    def iter_chunks(self, pages):
+        """Чанки выбранным чанкером"""
+        if settings.CHUNKER == "sentence":
+            return self.sentence_chunker().iter_chunks(pages)
+        return self.pdf_analyzer.iter_chunks(
+            pages, chunk_size=settings.CHUNK_SIZE, chunk_overlap=settings.CHUNK_OVERLAP
+        )
+
+    def indexed_version(self, pdf_filename: str) -> Optional[str]:
+        """Версия индекса по манифесту (None - файл не индексировался)"""
+        entry = self.manifest.get(pdf_filename)
+        if not entry:
+            return None
+        return self.index_version(entry["file_hash"], entry["chunker"])
+
+    @staticmethod
+    def index_version(file_hash: str, chunker: Dict) -> str:
+        """Версия индекса: меняется при изменении файла или настроек чанкера"""
+        return text_sha256(file_hash + json.dumps(chunker, sort_keys=True))[:16]
+
+    @staticmethod
+    def chunk_id(chunk: Dict) -> str:
+        """Детерминированный id чанка: хэш текста + номер страницы + смещение"""
+        return f"{text_sha256(chunk['text'])[:16]}-p{chunk['page']}-o{chunk['offset']}"
+
+    def _is_up_to_date(self, entry: Optional[Dict], size: int, mtime: float,
+                       file_hash: Optional[str], vector_db: VectorDatabase) -> bool:
+        if not entry or entry.get("chunker") != self.chunker_settings():
+            return False
+        if entry.get("chunks") != vector_db.count():
+            return False
+        if file_hash is None:
+            return entry.get("size") == size and entry.get("mtime") == mtime
+        return entry.get("file_hash") == file_hash
+
+    def index(self, pdf_filename: str,
+              progress_callback: Optional[Callable[[int, int, int], None]] = None
+              ) -> Tuple[VectorDatabase, Dict]:
+        """
+        Индексация PDF. Возвращает коллекцию и статистику индексации.
+        progress_callback(страница, всего страниц, добавлено чанков) вызывается по ходу загрузки.
+        """
+        pdf_path = os.path.join(self.pdf_analyzer.pdf_folder, pdf_filename)
+
+        if not os.path.exists(pdf_path):
+            raise FileNotFoundError(f"PDF файл не найден: {pdf_path}")
+
+        stat = os.stat(pdf_path)
+        vector_db = VectorDatabase(pdf_name=pdf_filename)
+        entry = self.manifest.get(pdf_filename)
+
+        # Быстрая проверка по размеру и mtime - без чтения файла
+        if self._is_up_to_date(entry, stat.st_size, stat.st_mtime, None, vector_db):
+            self.ensure_structure(pdf_filename)
+            return vector_db, {
+                "status": "up_to_date",
+                "chunks": entry["chunks"],
+                "index_version": self.index_version(entry["file_hash"], entry["chunker"])
+            }
+
+        file_hash = file_sha256(pdf_path)
+
+        # Файл "тронут", но содержимое то же - обновляем только mtime
+        if self._is_up_to_date(entry, stat.st_size, stat.st_mtime, file_hash, vector_db):
+            entry.update({"size": stat.st_size, "mtime": stat.st_mtime})
+            self.manifest.update(pdf_filename, entry)
+            self.ensure_structure(pdf_filename)
+            return vector_db, {
+                "status": "up_to_date",
+                "chunks": entry["chunks"],
+                "index_version": self.index_version(file_hash, entry["chunker"])
+            }
+
+        chunker = self.chunker_settings()
+        existing_ids = set(vector_db.get_ids())
+        total_pages = self.pdf_analyzer.page_count(pdf_path)
+
+        # В памяти держим только id и хэши страниц - сами страницы и чанки идут потоком
+        pages: Dict[str, str] = {}
+        # Заголовки и таблицы страниц - для индекса структуры
+        structure_pages: List[Dict] = []
+        new_ids = set()
+        batch: List[Dict] = []
+        added = 0
+
+        def hashed_pages():
+            for doc in metrics.timed_iter("extract", self.pdf_analyzer.iter_pages(
+                pdf_path,
+                workers=settings.INGEST_WORKERS,
+                pages_per_task=settings.INGEST_PAGES_PER_TASK,
+                structured=settings.STRUCTURED_LOOKUP,
+                tables=settings.STRUCTURED_TABLES
+            )):
+                if doc.get("headings") or doc.get("tables"):
+                    structure_pages.append({
+                        "page": doc["page"], "headings": doc.pop("headings"), "tables": doc.pop("tables")
+                    })
+                doc["page_hash"] = text_sha256(doc["text"])
+                pages[str(doc["page"])] = doc["page_hash"]
+                if progress_callback:
+                    progress_callback(doc["page"], total_pages, added)
+                yield doc
+
+        # Ожидание страниц вычитается из этапа chunk и пишется в extract
+        for chunk in metrics.timed_iter("chunk", self.iter_chunks(hashed_pages())):
+            chunk["id"] = self.chunk_id(chunk)
+            new_ids.add(chunk["id"])
+            if chunk["id"] in existing_ids:
+                continue
+
+            batch.append(chunk)
+            if len(batch) >= settings.INDEX_WRITE_BATCH_SIZE:
+                vector_db.add_documents(batch)
+                added += len(batch)
+                batch = []
+
+        if batch:
+            vector_db.add_documents(batch)
+            added += len(batch)
+
+        stale_ids = [chunk_id for chunk_id in existing_ids if chunk_id not in new_ids]
+        vector_db.delete_ids(stale_ids)
+        vector_db.flush()
+
+        if settings.STRUCTURED_LOOKUP:
+            self.save_structure(pdf_filename, structure_pages, total_pages)
+
+        if progress_callback:
+            progress_callback(total_pages, total_pages, added)
+
+        old_pages = (entry or {}).get("pages", {})
+        changed_pages = sorted(
+            int(page) for page, page_hash in pages.items() if old_pages.get(page) != page_hash
+        )
+
+        self.manifest.update(pdf_filename, {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "file_hash": file_hash,
+            "chunker": chunker,
+            "collection": vector_db.collection.name,
+            "chunks": len(new_ids),
+            "pages": pages
+        })
+
+        print(f"🔄 '{pdf_filename}': изменено страниц {len(changed_pages)}, "
+              f"добавлено чанков {added}, удалено {len(stale_ids)}")
+
+        return vector_db, {
+            "status": "updated",
+            "chunks": len(new_ids),
+            "added": added,
+            "removed": len(stale_ids),
+            "changed_pages": changed_pages,
+            "index_version": self.index_version(file_hash, chunker)
+        }
+
+    def save_structure(self, pdf_filename: str, pages: List[Dict], total_pages: int) -> StructureIndex:
+        """Индекс разделов и таблиц по оглавлению PDF и страницам с заголовками/таблицами"""
+        pdf_path = os.path.join(self.pdf_analyzer.pdf_folder, pdf_filename)
+        with metrics.span("structure"):
+            structure = StructureIndex.build(
+                self.pdf_analyzer.table_of_contents(pdf_path), pages, total_pages,
+                path=structure_path(pdf_filename)
+            )
+            structure.save()
+        print(f"📑 '{pdf_filename}': разделов {len(structure.sections)}, таблиц {len(structure.tables)}")
+        return structure
+
+    def ensure_structure(self, pdf_filename: str):
+        """Структура для индекса, построенного до ее появления: отдельный проход без эмбеддингов"""
+        if not settings.STRUCTURED_LOOKUP or os.path.exists(structure_path(pdf_filename)):
+            return
+        pdf_path = os.path.join(self.pdf_analyzer.pdf_folder, pdf_filename)
+        pages = [
+            {"page": doc["page"], "headings": doc["headings"], "tables": doc["tables"]}
+            for doc in self.pdf_analyzer.iter_pages(
+                pdf_path,
+                workers=settings.INGEST_WORKERS,
+                pages_per_task=settings.INGEST_PAGES_PER_TASK,
+                structured=True,
+                tables=settings.STRUCTURED_TABLES
+            )
+            if doc["headings"] or doc["tables"]
+        ]
+        self.save_structure(pdf_filename, pages, self.pdf_analyzer.page_count(pdf_path))
@@ -0,0 +1,113 @@
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
+
+class RerankerAgent:
+    """
+    Агент переранжирования: кросс-энкодер оценивает пары (вопрос, фрагмент).
+    Укладывается в бюджет времени: по замеренной скорости берет столько кандидатов,
+    сколько успеет оценить, а если не успевает и двух - пропускает этап.
+    """
+
+    # Пока этап пропускается, оценка скорости уменьшается на каждом вопросе,
+    # чтобы после разовой задержки переранжирование снова было опробовано
+    SKIP_DECAY = 0.9
+
+    def __init__(self, model_name: str, time_budget_ms: float = 300,
+                 top_k: int = 3, batch_size: int = 16):
+        self.model_name = model_name
+        self.time_budget_ms = time_budget_ms
+        self.top_k = top_k
+        self.batch_size = batch_size
+
+        self._model: Optional["CrossEncoder"] = None
+        self._lock = threading.Lock()
+        # Скользящее среднее времени на одну пару, мс
+        self._ms_per_pair: Optional[float] = None
+        self.skipped = 0
+
+    @property
+    def model(self) -> "CrossEncoder":
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import CrossEncoder
+                    print(f"🧠 Загрузка кросс-энкодера '{self.model_name}'...")
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def warm_up(self):
+        """Загрузка модели и первый прогон; холодный запуск torch не попадает в оценку скорости"""
+        model = self.model
+        with self._lock:
+            self._predict(model, "прогрев", [{"text": "прогрев"}, {"text": "прогрев"}])
+
+    def affordable_candidates(self, count: int, budget_ms: Optional[float] = None) -> int:
+        """Сколько кандидатов можно оценить в рамках бюджета (по умолчанию - всего бюджета)"""
+        if self._ms_per_pair is None:
+            return count
+        if budget_ms is None:
+            budget_ms = self.time_budget_ms
+        return min(count, int(budget_ms / self._ms_per_pair))
+
+    def rerank(self, query: str, results: List[Dict]) -> List[Dict]:
+        """Результаты, упорядоченные кросс-энкодером (не больше top_k)"""
+        # Бюджет отсчитывается от входа: ожидание чужого predict тоже задерживает ответ
+        started = time.perf_counter()
+        if len(results) < 2:
+            return results[:self.top_k]
+
+        candidates = self.affordable_candidates(len(results))
+        if candidates < 2:
+            self.skipped += 1
+            self._ms_per_pair *= self.SKIP_DECAY
+            return results[:self.top_k]
+
+        model = self.model
+        remaining_ms = self.time_budget_ms - (time.perf_counter() - started) * 1000
+        # Кросс-энкодер занят другим вопросом дольше бюджета - отвечаем без переранжирования.
+        # Оценка скорости не меняется: задержка вызвана очередью, а не моделью
+        if not self._lock.acquire(timeout=max(remaining_ms, 0) / 1000):
+            self.skipped += 1
+            return results[:self.top_k]
+
+        try:
+            remaining_ms = self.time_budget_ms - (time.perf_counter() - started) * 1000
+            candidates = self.affordable_candidates(len(results), remaining_ms)
+            if candidates < 2:
+                self.skipped += 1
+                return results[:self.top_k]
+
+            head, tail = results[:candidates], results[candidates:]
+            scores, elapsed_ms = self._predict(model, query, head)
+        finally:
+            self._lock.release()
+
+        per_pair = elapsed_ms / len(head)
+        self._ms_per_pair = (per_pair if self._ms_per_pair is None
+                             else 0.8 * self._ms_per_pair + 0.2 * per_pair)
+
+        reranked = sorted(
+            (dict(result, rerank_score=float(score)) for result, score in zip(head, scores)),
+            key=lambda result: result["rerank_score"],
+            reverse=True
+        )
+        return (reranked + tail)[:self.top_k]
+
+    def _predict(self, model: "CrossEncoder", query: str,
+                 results: List[Dict]) -> Tuple[List[float], float]:
+        """
+        Оценки кросс-энкодера и время самого predict в мс - по нему оценивается скорость модели.
+        Вызывается под self._lock.
+        """
+        started = time.perf_counter()
+        scores = model.predict(
+            [(query, result["text"]) for result in results],
+            batch_size=self.batch_size,
+            show_progress_bar=False
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return scores, elapsed_ms
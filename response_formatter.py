@@ -1,72 +1,104 @@
-import ollama 
-import requests
-import json
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional
 from config.settings import settings
+from agents.ollama_client import OllamaClient
+from utils.text_chunker import estimate_tokens
+
+# Системный промпт не меняется от запроса к запросу
+SYSTEM_PROMPT = """Ты - автомобильный ассистент. Твоя задача - отвечать на на вопросы автовладельцев.
+
+ТЕХНИЧЕСКИЕ ТРЕБОВАНИЯ:
+1. Отвечай ТОЛЬКО на РУССКОМ ЯЗЫКЕ
+2. Используй ТОЛЬКО информацию из предоставленного контекста
+3. Если информации недостаточно, скажи: "В предоставленном руководстве нет информации по этому вопросу"
+4. Будь точным и технически корректным
+5. Форматируй ответ четко и структурированно"""
+
+# Общая для всех вопросов по одному руководству часть промпта:
+# вместе с SYSTEM_PROMPT образует неизменный префикс, KV-кэш которого Ollama переиспользует
+MANUAL_PROMPT_TEMPLATE = """Руководство по эксплуатации: {manual}
+Ссылайся на страницы этого руководства, указанные в контексте."""
+
+# Все, что меняется от вопроса к вопросу, - только в конце промпта
+USER_MESSAGE_TEMPLATE = """Контекст из руководства по эксплуатации:
+{context}
+
+Вопрос: {query}
+
+Сформулируй полный и точный ответ на русском языке, используя ТОЛЬКО предоставленную информацию."""
 
 class ResponseFormatterAgent:
     """Агент для формирования ответа с использованием Ollama"""
     
-    def __init__(self, model_name: str = None):
+    def __init__(self, model_name: str = None, client: Optional[OllamaClient] = None):
         if model_name is None:
             model_name = "qwen2.5:7b" 
         self.model_name = model_name
+        self.client = client or OllamaClient(
+            base_url=settings.OLLAMA_BASE_URL,
+            model=model_name,
+            timeout=settings.OLLAMA_TIMEOUT,
+            keep_alive=settings.OLLAMA_KEEP_ALIVE,
+            max_parallel=settings.OLLAMA_NUM_PARALLEL,
+            max_retries=settings.OLLAMA_MAX_RETRIES,
+            retry_backoff=settings.OLLAMA_RETRY_BACKOFF
+        )
+        self.options = {
+            "temperature": 0.1,  
+            "num_predict": settings.OLLAMA_NUM_PREDICT, 
+            "top_k": 20,    
+            "top_p": 0.9,
+            "repeat_penalty": 1.1,
+            "num_ctx": settings.OLLAMA_NUM_CTX
+        }
 
+    def warm_up(self) -> bool:
+        """Загрузка модели в Ollama до первого вопроса"""
+        return self.client.warm_up()
+    
     def call_ollama(self, messages: List[Dict]) -> str:
-        try:
-            response = ollama.chat(
-                model=self.model_name,
-                messages=messages,
-                options={
-                    "temperature": 0.1,  
-                    "num_predict": 500, 
-                    "top_k": 20,    
-                    "top_p": 0.9,
-                    "repeat_penalty": 1.1,
-                    "num_ctx": 2048
-                },
-                stream=False
-            )
-            
-            if hasattr(response, 'message') and hasattr(response.message, 'content'):
-                return response.message.content.strip()
-            
-            return "Неверный формат ответа"
-            
-        except Exception as e:
-            return f"Ошибка: {str(e)[:100]}"
+        """Ответ модели. Ошибки генерации - исключения LLMError"""
+        return self.client.chat(messages, self.options)
+    
+    def stream_ollama(self, messages: List[Dict]) -> Iterator[str]:
+        """Потоковая генерация: фрагменты ответа по мере их появления"""
+        return self.client.stream_chat(messages, self.options)
     
-    def format_response(self, query: str, context: str) -> str:
+    def format_response(self, query: str, context: str, manual: Optional[str] = None) -> str:
         """Формирование окончательного ответа"""
-        
-        # УСИЛЕННЫЙ русскоязычный системный промпт
-        system_prompt = """Ты - автомобильный ассистент. Твоя задача - отвечать на на вопросы автовладельцев.
-        
-        ТЕХНИЧЕСКИЕ ТРЕБОВАНИЯ:
-        1. Отвечай ТОЛЬКО на РУССКОМ ЯЗЫКЕ
-        2. Используй ТОЛЬКО информацию из предоставленного контекста
-        3. Если информации недостаточно, скажи: "В предоставленном руководстве нет информации по этому вопросу"
-        4. Будь точным и технически корректным
-        5. Форматируй ответ четко и структурированно
-        
-        КОНТЕКСТ ИЗ РУКОВОДСТВА:
-        {context}
-        
-        ВОПРОС ПОЛЬЗОВАТЕЛЯ:
-        {query}
-        
-        ОТВЕТ (на русском языке):"""
-        
-        user_message = f"""Вопрос: {query}
-
-    Контекст из руководства по эксплуатации:
-    {context}
-
-    Сформулируй полный и точный ответ на русском языке, используя ТОЛЬКО предоставленную информацию."""
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message}
+        return self.call_ollama(self.build_messages(query, context, manual))
+    
+    def stream_response(self, query: str, context: str,
+                        manual: Optional[str] = None) -> Iterator[str]:
+        """Потоковое формирование ответа"""
+        return self.stream_ollama(self.build_messages(query, context, manual))
+    
+    def prefix_messages(self, manual: Optional[str] = None) -> List[Dict]:
+        """
+        Неизменный префикс промпта: побайтно одинаковый системный промпт
+        и (в режиме PROMPT_MANUAL_PREFIX) сведения о руководстве.
+        """
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        if manual and settings.PROMPT_MANUAL_PREFIX:
+            messages.append({"role": "system", "content": MANUAL_PROMPT_TEMPLATE.format(manual=manual)})
+        return messages
+    
+    def build_messages(self, query: str, context: str, manual: Optional[str] = None) -> List[Dict]:
+        """Сообщения для LLM: префикс кэшируется, контекст и вопрос - в последнем сообщении"""
+        return self.prefix_messages(manual) + [
+            {"role": "user", "content": USER_MESSAGE_TEMPLATE.format(context=context, query=query)}
         ]
-        
-        return self.call_ollama(messages)
+    
+    def generation_stats(self) -> Dict:
+        return self.client.stats.summary()
+    
+    def context_budget(self, query: str, manual: Optional[str] = None) -> int:
+        """
+        Сколько токенов контекста помещается в num_ctx
+        после префикса промпта, шаблона с вопросом и места под ответ.
+        """
+        prompt_tokens = sum(
+            estimate_tokens(message["content"]) for message in self.prefix_messages(manual)
+        ) + estimate_tokens(USER_MESSAGE_TEMPLATE.format(context="", query=query))
+        available = settings.OLLAMA_NUM_CTX - settings.OLLAMA_NUM_PREDICT - prompt_tokens
+        # Оценка токенов приблизительная - оставляем запас 10%
+        return max(0, int(available * 0.9))
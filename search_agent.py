@@ -1,40 +1,32 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from agents.context_packer import ContextPacker
 
 class SearchAgent:
     """Агент для поиска релевантной информации в базе знаний"""
     
     def __init__(self, vector_db):
         self.vector_db = vector_db
+        self.context_packer = ContextPacker()
     
-    def search_relevant_info(self, query: str, n_results: int = 5) -> List[Dict]:
+    def search_relevant_info(self, query: str, n_results: int = 5,
+                             query_embedding: Optional[np.ndarray] = None) -> List[Dict]:
         """Поиск релевантной информации по запросу"""
         if not self.vector_db:
             return []
         
-        search_results = self.vector_db.search(query, n_results)
+        # Порог релевантности применяет CoordinatorAgent: у лексических совпадений свое правило допуска
+        search_results = self.vector_db.search(query, n_results, query_embedding=query_embedding)
         
-        # Простая фильтрация по релевантности
-        filtered_results = [
-            result for result in search_results 
-            if result["score"] > 0.7
-        ]
-        
-        return filtered_results[:n_results]
+        return search_results[:n_results]
     
-    def format_search_results(self, results: List[Dict]) -> str:
-        """Форматирование результатов поиска для LLM"""
+    def format_search_results(self, results: List[Dict], budget_tokens: int) -> Tuple[str, List[Dict]]:
+        """
+        Форматирование результатов поиска для LLM в пределах бюджета токенов.
+        Возвращает текст контекста и фрагменты, вошедшие в него (по порядку).
+        """
         if not results:
-            return "Релевантная информация не найдена в документе."
-        
-        formatted = "ИНФОРМАЦИЯ ИЗ РУКОВОДСТВА ПО ЭКСПЛУАТАЦИИ:\n\n"
-        
-        for i, result in enumerate(results, 1):
-            formatted += f"БЛОК {i}:\n"
-            formatted += f"Страница: {result['metadata'].get('page', 'не указана')}\n"
-            formatted += f"Релевантность: {result['score']:.2f}\n"
-            formatted += f"Текст: {result['text']}\n"
-            formatted += "-" * 50 + "\n"
-        
-        formatted += "\nВАЖНО: Используй ТОЛЬКО эту информацию для ответа."
+            return "Релевантная информация не найдена в документе.", []
         
-        return formatted
\ No newline at end of file
+        passages = self.context_packer.select(results, budget_tokens)
+        return self.context_packer.build_context(passages), passages
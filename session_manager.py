@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+from agents.search_agent import SearchAgent
+from database.vector_store import VectorDatabase
+from database.structure_index import StructureIndex, structure_path
+from config.settings import settings
+
+class CollectionHandle:
+    """Открытая коллекция PDF, общая для всех чатов с этим руководством"""
+
+    def __init__(self, pdf_name: str, vector_db: VectorDatabase, index_version: str = ""):
+        self.pdf_name = pdf_name
+        self.vector_db = vector_db
+        self.index_version = index_version
+        self.search_agent = SearchAgent(vector_db)
+        # Разделы и таблицы руководства (None - выключено или не построено)
+        self.structure_index = (StructureIndex.load(structure_path(pdf_name))
+                                if settings.STRUCTURED_LOOKUP else None)
+        self.refcount = 0
+        self.last_used = time.monotonic()
+
+class CollectionPool:
+    """Пул коллекций со счетчиком ссылок и LRU-вытеснением неиспользуемых"""
+
+    def __init__(self, loader: Callable[..., Tuple[VectorDatabase, Dict]],
+                 max_handles: int = 8):
+        self.loader = loader
+        self.max_handles = max_handles
+        self._handles: "OrderedDict[str, CollectionHandle]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Отдельная блокировка на каждый PDF, чтобы загрузка одного не блокировала остальные
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def acquire(self, pdf_name: str,
+                progress_callback: Optional[Callable] = None) -> Tuple[CollectionHandle, Optional[Dict]]:
+        """
+        Получение коллекции с увеличением счетчика ссылок.
+        Возвращает handle и статистику индексации (None, если коллекция уже была открыта).
+        """
+        with self._lock:
+            load_lock = self._load_locks.setdefault(pdf_name, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                handle = self._handles.get(pdf_name)
+                if handle is not None:
+                    self._touch(handle)
+                    handle.refcount += 1
+                    return handle, None
+
+            vector_db, index_stats = self.loader(pdf_name, progress_callback)
+            handle = CollectionHandle(pdf_name, vector_db, index_stats.get("index_version", ""))
+
+            with self._lock:
+                self._handles[pdf_name] = handle
+                self._touch(handle)
+                handle.refcount += 1
+                self._evict_idle()
+
+            return handle, index_stats
+
+    def get(self, pdf_name: str) -> Optional[CollectionHandle]:
+        """Открытая коллекция без изменения счетчика ссылок"""
+        with self._lock:
+            handle = self._handles.get(pdf_name)
+            if handle is not None:
+                self._touch(handle)
+            return handle
+
+    def release(self, pdf_name: str):
+        """Освобождение ссылки на коллекцию"""
+        with self._lock:
+            handle = self._handles.get(pdf_name)
+            if handle is None:
+                return
+            handle.refcount = max(0, handle.refcount - 1)
+            self._evict_idle()
+
+    def _touch(self, handle: CollectionHandle):
+        handle.last_used = time.monotonic()
+        self._handles.move_to_end(handle.pdf_name)
+
+    def _evict_idle(self):
+        """Вытеснение давно не используемых коллекций без ссылок сверх лимита"""
+        overflow = len(self._handles) - self.max_handles
+        if overflow <= 0:
+            return
+        for pdf_name in [name for name, h in self._handles.items() if h.refcount == 0][:overflow]:
+            del self._handles[pdf_name]
+            print(f"♻️ Коллекция '{pdf_name}' выгружена из пула")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "open_collections": len(self._handles),
+                "max_collections": self.max_handles,
+                "refcounts": {name: h.refcount for name, h in self._handles.items()}
+            }
+
+class SessionManager:
+    """
+    Сессии чатов: каждый chat_id привязан к своему руководству.
+    Сессии без обращений дольше ttl закрываются и освобождают коллекцию,
+    иначе счетчики ссылок в пуле не обнуляются и вытеснять нечего.
+    """
+
+    # Простаивающие сессии ищутся не чаще раза в столько секунд
+    EXPIRY_CHECK_INTERVAL = 60
+
+    def __init__(self, pool: CollectionPool, ttl: float = 0):
+        self.pool = pool
+        self.ttl = ttl
+        # chat_id -> (PDF, время последнего обращения)
+        self._sessions: Dict[int, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._next_expiry_check = 0.0
+
+    def attach(self, chat_id: int, pdf_name: str,
+               progress_callback: Optional[Callable] = None) -> Tuple[CollectionHandle, Optional[Dict]]:
+        """Привязка чата к PDF. Старое руководство освобождается после загрузки нового"""
+        self._expire_if_due()
+        handle, index_stats = self.pool.acquire(pdf_name, progress_callback)
+
+        with self._lock:
+            previous = self._sessions.get(chat_id)
+            self._sessions[chat_id] = (pdf_name, time.monotonic())
+
+        if previous is not None:
+            self.pool.release(previous[0])
+
+        return handle, index_stats
+
+    def detach(self, chat_id: int):
+        with self._lock:
+            previous = self._sessions.pop(chat_id, None)
+        if previous is not None:
+            self.pool.release(previous[0])
+
+    def expire_idle(self, now: Optional[float] = None) -> int:
+        """Закрытие сессий, к которым не обращались дольше ttl; число закрытых"""
+        if not self.ttl:
+            return 0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [(chat_id, pdf_name) for chat_id, (pdf_name, last_used) in self._sessions.items()
+                       if now - last_used > self.ttl]
+            for chat_id, _ in expired:
+                del self._sessions[chat_id]
+
+        for _, pdf_name in expired:
+            self.pool.release(pdf_name)
+        if expired:
+            print(f"⌛ Закрыто сессий без активности: {len(expired)}")
+        return len(expired)
+
+    def _expire_if_due(self):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_expiry_check:
+                return
+            self._next_expiry_check = now + self.EXPIRY_CHECK_INTERVAL
+        self.expire_idle(now)
+
+    def get(self, chat_id: int) -> Optional[CollectionHandle]:
+        """Коллекция, с которой работает чат (или None); обращение продлевает сессию"""
+        self._expire_if_due()
+        with self._lock:
+            session = self._sessions.get(chat_id)
+            if session is None:
+                return None
+            self._sessions[chat_id] = (session[0], time.monotonic())
+
+        return self.pool.get(session[0])
+
+    def current_pdf(self, chat_id: int) -> Optional[str]:
+        with self._lock:
+            session = self._sessions.get(chat_id)
+        return session[0] if session else None
+
+    def active_chats(self) -> int:
+        with self._lock:
+            return len(self._sessions)
@@ -8,15 +8,147 @@ class Settings:
     
     OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5:7b")
+    OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "2048"))
+    OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "500"))
+    # Клиент Ollama: таймаут запроса, сколько держать модель в памяти ("-1" - всегда),
+    # число одновременных запросов (как OLLAMA_NUM_PARALLEL на сервере) и повторы при сбоях
+    OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+    OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    if OLLAMA_KEEP_ALIVE.lstrip("-").isdigit():
+        OLLAMA_KEEP_ALIVE = int(OLLAMA_KEEP_ALIVE)
+    OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+    OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "2"))
+    OLLAMA_RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5"))
+    # Сведения о руководстве - в неизменном префиксе промпта (KV-кэш Ollama общий для вопросов по PDF)
+    PROMPT_MANUAL_PREFIX = os.getenv("PROMPT_MANUAL_PREFIX", "true").lower() in ("1", "true", "yes")
     
    
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+    # Чаты администраторов, которым доступна команда /stats (через запятую)
+    ADMIN_CHAT_IDS = [int(chat_id) for chat_id in os.getenv("ADMIN_CHAT_IDS", "").split(",") if chat_id.strip()]
+    
+    
+    # Метрики: время этапов, счетчики и HTTP-эндпоинт /metrics (METRICS_PORT=0 - без эндпоинта)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+    
+    
+    # Асинхронный режим бота и ограничения параллелизма
+    BOT_ASYNC_MODE = os.getenv("BOT_ASYNC_MODE", "false").lower() in ("1", "true", "yes")
+    # Быстрый запуск: опрос Telegram начинается сразу, модели и агенты загружаются в фоне
+    LAZY_STARTUP = os.getenv("LAZY_STARTUP", "true").lower() in ("1", "true", "yes")
+    # Повторы инициализации агентов: попыток (0 - без ограничения), первая пауза в секундах
+    # и выход с кодом 1 после последней неудачи, чтобы процесс перезапустил супервизор
+    STARTUP_MAX_ATTEMPTS = int(os.getenv("STARTUP_MAX_ATTEMPTS", "5"))
+    STARTUP_RETRY_DELAY = float(os.getenv("STARTUP_RETRY_DELAY", "5"))
+    STARTUP_EXIT_ON_FAILURE = os.getenv("STARTUP_EXIT_ON_FAILURE", "true").lower() in ("1", "true", "yes")
+    MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", str(os.cpu_count() or 4)))
+    MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "64"))
+    MAX_PENDING_PER_CHAT = int(os.getenv("MAX_PENDING_PER_CHAT", "3"))
+    EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "2"))
+    RETRIEVAL_WORKERS = int(os.getenv("RETRIEVAL_WORKERS", "4"))
+    LLM_WORKERS = int(os.getenv("LLM_WORKERS", str(OLLAMA_NUM_PARALLEL)))
+    INDEXING_WORKERS = int(os.getenv("INDEXING_WORKERS", "1"))
+    
+    
+    # Потоковые ответы: частота правок сообщения в Telegram
+    STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes")
+    STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+    STREAM_EDIT_TOKENS = int(os.getenv("STREAM_EDIT_TOKENS", "30"))
+    STREAM_MIN_EDIT_INTERVAL = float(os.getenv("STREAM_MIN_EDIT_INTERVAL", "0.5"))
     
     
     PDF_FOLDER = "data/pdf_files/"
     VECTOR_DB_PATH = "data/vector_db/"
     
     
+    EMBEDDING_MODEL = os.getenv(
+        "EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    )
+    EMBEDDING_MAX_TOKENS = int(os.getenv("EMBEDDING_MAX_TOKENS", "126"))
+    # Кэш эмбеддингов вопросов и окно микробатчинга одновременных вопросов
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+    QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+    QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+    
+    
+    MAX_OPEN_COLLECTIONS = int(os.getenv("MAX_OPEN_COLLECTIONS", "8"))
+    # Сессия чата без вопросов дольше стольких секунд закрывается (0 - бессрочно)
+    SESSION_TTL = float(os.getenv("SESSION_TTL", str(6 * 3600)))
+    
+    
+    # Векторное хранилище: "chroma" (SQLite + HNSW) или "numpy" (матрица в памяти, для небольших каталогов)
+    VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+    # Компактное хранение: float16 или int8 для перебора, лучшие NUMPY_RESCORE_FACTOR * k кандидатов
+    # пересчитываются по float32 с диска (0 - без пересчета и без float32-копии), тексты - сжатые
+    NUMPY_VECTOR_DTYPE = os.getenv("NUMPY_VECTOR_DTYPE", "float32")  # float32 | float16 | int8
+    NUMPY_RESCORE_FACTOR = int(os.getenv("NUMPY_RESCORE_FACTOR", "4"))
+    NUMPY_COMPRESS_TEXT = os.getenv("NUMPY_COMPRESS_TEXT", "false").lower() in ("1", "true", "yes")
+    # IVF-разбиение для бэкенда numpy: 0 - точный перебор
+    IVF_LISTS = int(os.getenv("IVF_LISTS", "0"))
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", "4"))
+    
+    # Все PDF в одной коллекции с фильтром по source (поиск по всему каталогу)
+    SHARED_COLLECTION = os.getenv("SHARED_COLLECTION", "false").lower() in ("1", "true", "yes")
+    SHARED_COLLECTION_NAME = os.getenv("SHARED_COLLECTION_NAME", "pdf_catalogue")
+    
+    
+    # Гибридный поиск: BM25 + векторы, объединение через reciprocal rank fusion
+    HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+    BM25_B = float(os.getenv("BM25_B", "0.75"))
+    # BM25, при котором нормированная лексическая оценка равна 0.5
+    BM25_HALF_SCORE = float(os.getenv("BM25_HALF_SCORE", "4.0"))
+    # Фрагмент с нормированным BM25 не ниже порога попадает в контекст даже при низком косинусе
+    # (0.5 - BM25 = BM25_HALF_SCORE, например точный код детали "F12")
+    LEXICAL_RELEVANCE_THRESHOLD = float(os.getenv("LEXICAL_RELEVANCE_THRESHOLD", "0.5"))
+    
+    
+    # Переранжирование кросс-энкодером с ограничением по времени
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+    RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    RERANK_TIME_BUDGET_MS = float(os.getenv("RERANK_TIME_BUDGET_MS", "300"))
+    RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "3"))
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    
+    
+    # Кэш ответов: точный и семантический (по косинусному расстоянию вопросов)
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+    ANSWER_CACHE_SEMANTIC_DISTANCE = float(os.getenv("ANSWER_CACHE_SEMANTIC_DISTANCE", "0.08"))
+    ANSWER_CACHE_PERSIST = os.getenv("ANSWER_CACHE_PERSIST", "true").lower() in ("1", "true", "yes")
+    # Как часто переписывать файл кэша (секунды); при выходе он сохраняется всегда
+    ANSWER_CACHE_SAVE_INTERVAL = float(os.getenv("ANSWER_CACHE_SAVE_INTERVAL", "60"))
+    
+    
+    # Конвейер загрузки PDF: процессы извлечения, пакеты эмбеддингов и записи в Chroma
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+    INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "16"))
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    INDEX_WRITE_BATCH_SIZE = int(os.getenv("INDEX_WRITE_BATCH_SIZE", "512"))
+    
+    
+    # Чанкер: "sentence" - по предложениям с размером в токенах, "words" - старый по словам
+    CHUNKER = os.getenv("CHUNKER", "sentence")
+    CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "embedding")  # embedding | estimate
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "0"))  # 0 - по лимитам моделей
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "24"))
+    # Запас под системный промпт и вопрос и число фрагментов контекста в ответе
+    PROMPT_RESERVE_TOKENS = int(os.getenv("PROMPT_RESERVE_TOKENS", "300"))
+    CONTEXT_PASSAGES = int(os.getenv("CONTEXT_PASSAGES", "5"))
+    
+    
+    # Индекс разделов и таблиц руководства: прямые ответы на частые вопросы без поиска и LLM
+    STRUCTURED_LOOKUP = os.getenv("STRUCTURED_LOOKUP", "true").lower() in ("1", "true", "yes")
+    # Поиск таблиц (find_tables) на страницах с разлиновкой; false - индекс только из разделов
+    STRUCTURED_TABLES = os.getenv("STRUCTURED_TABLES", "true").lower() in ("1", "true", "yes")
+    # Больше подходящих строк таблиц - таблица уходит в LLM как контекст, а не ответом
+    STRUCTURED_MAX_ROWS = int(os.getenv("STRUCTURED_MAX_ROWS", "3"))
+    
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
 
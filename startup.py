@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from config.settings import settings
+
+class StartupTimer:
+    """Замеры шагов запуска (импорты и инициализация подсистем) от старта процесса"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.steps.append((name, elapsed))
+            print(f"⏱️ {name}: {elapsed:.2f} с")
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def reset_steps(self):
+        """Новая попытка инициализации: шаги прошлой попытки не попадают в разбивку"""
+        with self._lock:
+            self.steps = []
+
+    def breakdown(self) -> List[Tuple[str, float]]:
+        with self._lock:
+            return list(self.steps)
+
+class BackgroundCoordinator:
+    """
+    CoordinatorAgent, создаваемый в фоновом потоке: бот начинает опрос Telegram сразу,
+    а импорт torch/chromadb/ollama, загрузка моделей и прогрев идут параллельно.
+    Состояния: starting -> ready | failed.
+    Ошибка инициализации (например, Ollama еще не поднялась) повторяется с растущей паузой;
+    после max_attempts неудач - failed и, если exit_on_failure, выход с кодом 1,
+    чтобы процесс перезапустил супервизор.
+    """
+
+    STARTING = "starting"
+    READY = "ready"
+    FAILED = "failed"
+
+    # Пауза перед повтором удваивается до этого предела, секунды
+    MAX_RETRY_DELAY = 300
+
+    def __init__(self, timer: Optional[StartupTimer] = None, coordinator=None,
+                 max_attempts: Optional[int] = None, retry_delay: Optional[float] = None,
+                 exit_on_failure: Optional[bool] = None):
+        """Готовый coordinator (тесты, нагрузочный прогон) сразу переводит в состояние ready"""
+        self.timer = timer or startup_timer
+        self._coordinator = coordinator
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.error: Optional[str] = None
+        self.ready_after: Optional[float] = None
+        self.attempts = 0
+        # Координатор, созданный при неудачной попытке (Ollama не ответила на прогрев)
+        self._pending = None
+        self.max_attempts = settings.STARTUP_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.retry_delay = settings.STARTUP_RETRY_DELAY if retry_delay is None else retry_delay
+        self.exit_on_failure = (settings.STARTUP_EXIT_ON_FAILURE if exit_on_failure is None
+                                else exit_on_failure)
+
+        if coordinator is not None:
+            self.state = self.READY
+            self.ready_after = self.timer.elapsed()
+            self._done.set()
+        else:
+            self.state = self.STARTING
+
+    def start(self, background: bool = True) -> "BackgroundCoordinator":
+        """Запуск инициализации (повторный вызов ничего не делает)"""
+        if self._done.is_set() or self._thread is not None:
+            return self
+        if background:
+            self._thread = threading.Thread(target=self._initialize, name="startup", daemon=True)
+            self._thread.start()
+        else:
+            self._initialize()
+        return self
+
+    def _initialize(self):
+        delay = self.retry_delay
+        while True:
+            self.attempts += 1
+            if self.attempts > 1:
+                self.timer.reset_steps()
+            try:
+                self._coordinator = self._create_coordinator()
+                self.error = None
+                self.ready_after = self.timer.elapsed()
+                self.state = self.READY
+                print(f"✅ Бот готов отвечать на вопросы через {self.ready_after:.1f} с после запуска")
+                self._done.set()
+                return
+            except Exception as e:
+                self.error = str(e)
+                print(f"❌ Ошибка инициализации (попытка {self.attempts}): {str(e)}")
+
+            if self.max_attempts and self.attempts >= self.max_attempts:
+                break
+            print(f"🔁 Повторная инициализация через {delay:.0f} с")
+            time.sleep(delay)
+            delay = min(delay * 2, self.MAX_RETRY_DELAY)
+
+        self.state = self.FAILED
+        self._done.set()
+        if self.exit_on_failure:
+            print("❌ Бот не смог запуститься, процесс завершается для перезапуска")
+            # Опрос Telegram идет в главном потоке - из фонового завершаем весь процесс
+            os._exit(1)
+
+    def _create_coordinator(self):
+        with self.timer.step("импорт sentence_transformers"):
+            import sentence_transformers
+        if settings.VECTOR_BACKEND != "numpy":
+            with self.timer.step("импорт chromadb"):
+                import chromadb
+        with self.timer.step("импорт агентов"):
+            from agents.coordinator import CoordinatorAgent
+            from database.embedding_engine import embedding_engine
+        with self.timer.step("модель эмбеддингов и хранилище"):
+            embedding_engine.warm_up()
+        return self._warmed_coordinator(CoordinatorAgent)
+
+    def _warmed_coordinator(self, factory):
+        """
+        Координатор с загруженной в Ollama моделью. Если прогрев не удался, попытка считается
+        неудачной; при повторе созданный координатор переиспользуется и повторяется только прогрев.
+        """
+        if self._pending is None:
+            with self.timer.step("агенты и прогрев Ollama"):
+                self._pending = factory()
+            warmed = self._pending.llm_ready
+        else:
+            with self.timer.step("прогрев Ollama"):
+                warmed = self._pending.response_formatter.warm_up()
+
+        if not warmed:
+            raise RuntimeError(f"Ollama ({settings.OLLAMA_BASE_URL}) не ответила на прогрев модели")
+        coordinator, self._pending = self._pending, None
+        return coordinator
+
+    @property
+    def ready(self) -> bool:
+        return self.state == self.READY
+
+    @property
+    def coordinator(self):
+        """Координатор или None, пока идет загрузка"""
+        return self._coordinator
+
+    def wait(self, timeout: Optional[float] = None):
+        """Ожидание окончания инициализации; координатор или None"""
+        self._done.wait(timeout)
+        return self._coordinator
+
+    def status(self) -> Dict:
+        """Готовность и время шагов запуска для /status"""
+        return {
+            "state": self.state,
+            "error": self.error,
+            "elapsed": self.timer.elapsed(),
+            "ready_after": self.ready_after,
+            "steps": self.timer.breakdown()
+        }
+
+def format_startup_text(status: Dict) -> str:
+    """Готовность и разбивка времени запуска по шагам"""
+    if status["state"] == BackgroundCoordinator.READY:
+        header = f"✅ Готов (запуск {status['ready_after']:.1f} с)"
+    elif status["state"] == BackgroundCoordinator.FAILED:
+        header = f"❌ Ошибка запуска: {status['error']}"
+    elif status["error"]:
+        header = f"⏳ Повторная загрузка после ошибки ({status['elapsed']:.0f} с): {status['error']}"
+    else:
+        header = f"⏳ Загрузка моделей ({status['elapsed']:.0f} с)"
+
+    lines = [header]
+    for name, seconds in status["steps"]:
+        lines.append(f"  – {name}: {seconds:.2f} с")
+    return "\n".join(lines)
+
+startup_timer = StartupTimer()
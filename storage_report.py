@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config.settings import settings
+from database.numpy_store import NumpyCollection
+from utils.benchmark import hit_rank, latency_summary, prepare_manual
+
+# Варианты хранения: текущий (float32 + тексты в таблице) и компактные
+LAYOUTS = [
+    ("float32 (текущий)", {"dtype": "float32", "rescore": False, "compress_text": False}),
+    ("float16", {"dtype": "float16", "rescore": False, "compress_text": False}),
+    ("float16 + пересчет", {"dtype": "float16", "rescore": True, "compress_text": True}),
+    ("int8", {"dtype": "int8", "rescore": False, "compress_text": True}),
+    ("int8 + пересчет", {"dtype": "int8", "rescore": True, "compress_text": True})
+]
+
+def synthetic_index(rows: int, dim: int, queries: int, seed: int) -> Tuple[Dict, np.ndarray]:
+    """Кластеризованные векторы и тексты без модели эмбеддингов: для оценки памяти и recall"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(rows // 50, 1), dim))
+    vectors = centers[rng.integers(0, len(centers), rows)] + 0.6 * rng.normal(size=(rows, dim))
+    words = "масло фильтр давление шины тормоз пробег замена уровень двигатель салон".split()
+    data = {
+        "ids": [str(i) for i in range(rows)],
+        "embeddings": vectors.astype(np.float32),
+        "documents": [" ".join(rng.choice(words, 120)) for _ in range(rows)],
+        "metadatas": [{"source": "synthetic.pdf", "page": i // 4 + 1} for i in range(rows)]
+    }
+    query_vectors = vectors[rng.integers(0, rows, queries)] + 0.5 * rng.normal(size=(queries, dim))
+    return data, query_vectors.astype(np.float32)
+
+def manual_index(args, workdir: str) -> Tuple[Dict, np.ndarray, List[Dict]]:
+    """Фрагменты руководства, проиндексированного обычным конвейером, и эмбеддинги вопросов"""
+    pdf_folder, pdf_filename, questions = prepare_manual(args, workdir)
+    settings.VECTOR_DB_PATH = os.path.join(workdir, "vector_db")
+    if args.backend:
+        settings.VECTOR_BACKEND = args.backend
+
+    # Импорт после настройки: синглтоны читают settings при создании
+    from agents.pdf_analyzer import PDFAnalyzerAgent
+    from database.embedding_engine import embedding_engine
+    from database.pdf_indexer import PDFIndexer
+
+    vector_db, _ = PDFIndexer(PDFAnalyzerAgent(pdf_folder)).index(pdf_filename)
+    data = vector_db.collection.get(where=vector_db.where, include=["embeddings", "documents", "metadatas"])
+    data["embeddings"] = np.asarray(data["embeddings"], dtype=np.float32)
+    query_vectors = embedding_engine.encode([item["question"] for item in questions])
+    return data, query_vectors, questions
+
+def exact_neighbours(embeddings: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    """Точные k ближайших по косинусу в float32 - эталон для recall"""
+    vectors = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    result = []
+    for query in queries:
+        scores = vectors @ (query / max(np.linalg.norm(query), 1e-12))
+        result.append(set(np.argsort(-scores)[:k].tolist()))
+    return result
+
+def measure_layout(name: str, layout: Dict, data: Dict, queries: np.ndarray, exact: List[set],
+                   questions: Optional[List[Dict]], args, workdir: str) -> Dict:
+    path = os.path.join(workdir, "layouts", name.split()[0] + ("_rescore" if layout["rescore"] else ""))
+    shutil.rmtree(path, ignore_errors=True)
+    options = dict(
+        dtype=layout["dtype"],
+        rescore_factor=args.rescore_factor if layout["rescore"] else 0,
+        compress_text=layout["compress_text"]
+    )
+
+    collection = NumpyCollection("report", path, **options)
+    batch = settings.INDEX_WRITE_BATCH_SIZE
+    for start in range(0, len(data["ids"]), batch):
+        end = start + batch
+        collection.upsert(data["ids"][start:end], data["embeddings"][start:end],
+                          data["documents"][start:end], data["metadatas"][start:end])
+    collection.persist()
+    # Замер на коллекции, открытой с диска, как после перезапуска бота
+    collection = NumpyCollection("report", path, **options)
+
+    positions = {doc_id: row for row, doc_id in enumerate(data["ids"])}
+    seconds, overlap, hits = [], 0.0, 0
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        found = collection.query([query], n_results=args.k)
+        seconds.append(time.perf_counter() - started)
+
+        overlap += len({positions[doc_id] for doc_id in found["ids"][0]} & exact[i]) / args.k
+        if questions:
+            results = [{"metadata": metadata} for metadata in found["metadatas"][0]]
+            hits += hit_rank(results, questions[i]["pages"]) is not None
+
+    info = collection.storage_info()
+    return {
+        "layout": name,
+        "options": options,
+        "recall_vs_float32": overlap / max(len(queries), 1),
+        "answer_recall": hits / len(questions) if questions else None,
+        "disk_mb": info["disk_bytes"] / 1e6,
+        "memory_mb": (info["scan_bytes"] + info["text_memory_bytes"]) / 1e6,
+        "scan_mb": info["scan_bytes"] / 1e6,
+        "text_memory_mb": info["text_memory_bytes"] / 1e6,
+        "query": latency_summary(seconds)
+    }
+
+def directory_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1e6
+
+def run_report(args) -> Dict:
+    workdir = args.workdir or tempfile.mkdtemp(prefix="autobot_storage_")
+    questions = None
+    if args.synthetic:
+        data, queries = synthetic_index(args.synthetic, args.dim, args.queries, args.seed)
+    else:
+        data, queries, questions = manual_index(args, workdir)
+    exact = exact_neighbours(data["embeddings"], queries, args.k)
+
+    results = {
+        "config": {
+            "rows": len(data["ids"]),
+            "dim": int(data["embeddings"].shape[1]),
+            "queries": len(queries),
+            "k": args.k,
+            "rescore_factor": args.rescore_factor,
+            "source": "synthetic" if args.synthetic else "manual"
+        },
+        "layouts": [
+            measure_layout(name, layout, data, queries, exact, questions, args, workdir)
+            for name, layout in LAYOUTS
+        ]
+    }
+    # Индекс, построенный настоящим конвейером (например, Chroma с HNSW), - для сравнения размера на диске
+    if not args.synthetic:
+        results["indexed_backend"] = {
+            "backend": settings.VECTOR_BACKEND,
+            "disk_mb": directory_mb(settings.VECTOR_DB_PATH)
+        }
+    return results
+
+def print_report(results: Dict):
+    config = results["config"]
+    print(f"\n🗄️ Хранение {config['rows']} фрагментов (размерность {config['dim']}), "
+          f"{config['queries']} запросов, k={config['k']}, пересчет x{config['rescore_factor']}")
+    print(f"{'вариант':<22}{'recall':>8}{'ответы':>8}{'диск, МБ':>10}{'память, МБ':>12}{'p50, мс':>9}")
+    for row in results["layouts"]:
+        answers = f"{row['answer_recall']:.3f}" if row["answer_recall"] is not None else "—"
+        print(f"{row['layout']:<22}{row['recall_vs_float32']:>8.3f}{answers:>8}{row['disk_mb']:>10.2f}"
+              f"{row['memory_mb']:>12.2f}{row['query']['p50_ms']:>9.2f}")
+    print("recall - доля общих с точным float32-поиском фрагментов, память - перебираемые векторы "
+          "и тексты в таблице (float32 для пересчета и сжатые тексты читаются с диска через memmap)")
+    indexed = results.get("indexed_backend")
+    if indexed:
+        print(f"Индекс конвейера ({indexed['backend']}): {indexed['disk_mb']:.2f} МБ на диске")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Сравнение recall и объема вариантов хранения эмбеддингов")
+    parser.add_argument("--pdf", help="PDF для замера (по умолчанию - сгенерированное руководство)")
+    parser.add_argument("--questions", help="JSONL с вопросами и страницами ответов (обязателен с --pdf)")
+    parser.add_argument("--pages", type=int, default=40, help="Число страниц сгенерированного PDF")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], help="Хранилище, которым индексируется PDF")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Вместо PDF - столько случайных векторов (без модели эмбеддингов)")
+    parser.add_argument("--dim", type=int, default=384, help="Размерность синтетических векторов")
+    parser.add_argument("--queries", type=int, default=200, help="Число синтетических запросов")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rescore-factor", type=int, default=settings.NUMPY_RESCORE_FACTOR or 4)
+    parser.add_argument("--workdir", help="Рабочая папка (по умолчанию - временная)")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    if args.pdf and not args.questions:
+        parser.error("с --pdf нужен --questions")
+
+    results = run_report(args)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import time
+from typing import Callable, Optional
+from config.settings import settings
+from utils.metrics import metrics
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+def format_load_progress(pdf_filename: str, page: int, total_pages: int, added: int) -> str:
+    """Текст сообщения о ходе загрузки PDF"""
+    percent = int(page * 100 / total_pages) if total_pages else 100
+    return (f"Загружаю файл '{pdf_filename}'... {percent}%\n"
+            f"Страница {page} из {total_pages}, новых фрагментов: {added}")
+
+class StreamingMessageEditor:
+    """
+    Постепенное обновление сообщения Telegram по мере генерации ответа.
+    Правки отправляются не чаще раза в STREAM_EDIT_INTERVAL секунд
+    (или раньше, если накопилось STREAM_EDIT_TOKENS токенов),
+    но никогда не чаще STREAM_MIN_EDIT_INTERVAL - ограничения Telegram на правки.
+    """
+
+    def __init__(self, edit_func: Callable[[str], None],
+                 send_func: Optional[Callable[[str], None]] = None,
+                 interval: float = None, min_tokens: int = None,
+                 min_interval: float = None, cursor: str = " ▌"):
+        self.edit_func = edit_func
+        self.send_func = send_func
+        self.interval = interval if interval is not None else settings.STREAM_EDIT_INTERVAL
+        self.min_tokens = min_tokens if min_tokens is not None else settings.STREAM_EDIT_TOKENS
+        self.min_interval = (min_interval if min_interval is not None
+                             else settings.STREAM_MIN_EDIT_INTERVAL)
+        self.cursor = cursor
+
+        self._last_edit = 0.0
+        self._last_text = ""
+        self._pending_tokens = 0
+        self._blocked_until = 0.0
+
+    def update(self, text: str):
+        """Новый фрагмент ответа (вызывается на каждый токен)"""
+        self._pending_tokens += 1
+        now = time.monotonic()
+        elapsed = now - self._last_edit
+
+        if now < self._blocked_until or elapsed < self.min_interval:
+            return
+        if elapsed < self.interval and self._pending_tokens < self.min_tokens:
+            return
+
+        with metrics.span("send"):
+            self._edit(self._fit(text + self.cursor), now)
+
+    def finish(self, text: str):
+        """Финальная правка: полный ответ, длинный хвост отправляется отдельными сообщениями"""
+        with metrics.span("send"):
+            self._finish(text)
+
+    def _finish(self, text: str):
+        parts = [text[i:i + TELEGRAM_MESSAGE_LIMIT]
+                 for i in range(0, len(text), TELEGRAM_MESSAGE_LIMIT)] or [text]
+
+        # Финальную правку нельзя пропускать из-за ограничения частоты
+        wait = max(self._blocked_until, self._last_edit + self.min_interval) - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+
+        if not self._edit(parts[0], time.monotonic()):
+            # Одна повторная попытка после паузы, которую попросил Telegram
+            time.sleep(max(0.0, self._blocked_until - time.monotonic()))
+            self._edit(parts[0], time.monotonic(), final=True)
+
+        for part in parts[1:]:
+            if self.send_func:
+                self.send_func(part)
+
+    def _fit(self, text: str) -> str:
+        if len(text) <= TELEGRAM_MESSAGE_LIMIT:
+            return text
+        return text[:TELEGRAM_MESSAGE_LIMIT - 1] + "…"
+
+    def _edit(self, text: str, now: float, final: bool = False) -> bool:
+        if not text.strip() or text == self._last_text:
+            return True
+
+        try:
+            self.edit_func(text)
+            self._last_text = text
+            return True
+        except Exception as e:
+            retry_after = getattr(e, "result_json", None) or {}
+            retry_after = retry_after.get("parameters", {}).get("retry_after")
+            # Слишком частые правки (429) - ждем столько, сколько просит Telegram
+            self._blocked_until = now + (retry_after or self.interval * 2)
+            if final:
+                raise
+            print(f"⚠️ Не удалось обновить сообщение: {str(e)[:100]}")
+            return False
+        finally:
+            self._last_edit = now
+            self._pending_tokens = 0
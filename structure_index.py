@@ -0,0 +1,229 @@
+import json
+import os
+import re
+from typing import Dict, List, Optional, Set
+from config.settings import settings
+
+WORD_RE = re.compile(r"[0-9a-zа-яё]+")
+
+# Окончания, отбрасываемые при сравнении слов (грубый стемминг: "масла" и "масло" -> "масл")
+ENDINGS = sorted((
+    "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ах", "ях", "ов", "ев", "ей", "ой", "ый",
+    "ий", "ая", "яя", "ое", "ее", "ые", "ие", "ом", "ем", "ам", "ям", "ую", "юю", "а", "я", "о", "е",
+    "ы", "и", "у", "ю", "ь"
+), key=len, reverse=True)
+
+STOP_WORDS = {
+    "как", "какой", "какая", "какое", "какие", "каков", "какова", "сколько", "где", "когда", "что",
+    "чем", "нужно", "надо", "можно", "ли", "в", "во", "на", "по", "для", "у", "и", "или", "из", "с",
+    "со", "о", "об", "при", "мой", "моей", "моего", "мне", "это", "есть", "автомобиль", "автомобиля",
+    "машина", "машины", "машине"
+}
+
+def stem(word: str) -> str:
+    """
+    Окончания отбрасываются, пока находятся (не короче 3 букв), затем основа обрезается до 6 букв:
+    так у "обогрев" и "обогрева", "объем" и "объема" получается одна основа.
+    """
+    word = word.lower().replace("ё", "е")
+    stripped = True
+    while stripped:
+        stripped = False
+        for ending in ENDINGS:
+            if word.endswith(ending) and len(word) - len(ending) >= 3:
+                word = word[:-len(ending)]
+                stripped = True
+                break
+    return word[:6]
+
+# Группы равнозначных слов: вопрос "объем масла" находит таблицу "Заправочные емкости"
+SYNONYM_GROUPS = [
+    {stem(word) for word in group} for group in (
+        ("объем", "емкость", "вместимость", "заправочный", "литр", "количество"),
+        ("то", "техобслуживание", "обслуживание", "регламент", "периодичность", "интервал", "сервис"),
+        ("замена", "смена", "менять"),
+        ("предохранитель", "плавкая")
+    )
+]
+
+def terms(text: str) -> Set[str]:
+    return {stem(word) for word in WORD_RE.findall(text.lower()) if word not in STOP_WORDS}
+
+def equivalents(term: str) -> Set[str]:
+    for group in SYNONYM_GROUPS:
+        if term in group:
+            return group
+    return {term}
+
+def structure_path(pdf_name: str) -> str:
+    """Файл структуры руководства рядом с векторной базой"""
+    safe_name = pdf_name.replace('.pdf', '').replace(' ', '_').replace('-', '_').lower()
+    return os.path.join(settings.VECTOR_DB_PATH, "structure", f"{safe_name}.json")
+
+class StructureIndex:
+    """
+    Структура руководства: разделы (оглавление PDF или крупные заголовки) и таблицы по страницам.
+    Частые вопросы (объем масла, интервал ТО, предохранители) отвечаются строками таблиц
+    без поиска по эмбеддингам и генерации или сводятся к небольшому точному контексту.
+    """
+
+    # Строк таблицы в контексте для LLM, если прямой ответ не получился
+    CONTEXT_ROWS = 30
+    # Прямой ответ строкой таблицы - только на вопрос хотя бы из стольких значимых слов
+    # ("масло" или "10" слишком общие)
+    MIN_ANSWER_TERMS = 2
+
+    def __init__(self, sections: List[Dict], tables: List[Dict], path: Optional[str] = None):
+        self.sections = sections
+        self.tables = tables
+        self.path = path
+
+        # Основы слов для поиска считаются при загрузке, в файл не пишутся
+        self._section_terms = [terms(section["title"]) for section in sections]
+        self._table_terms = [terms(" ".join(table["header"] + [table["section"]])) for table in tables]
+        self._row_terms = [[terms(" ".join(row)) for row in table["rows"]] for table in tables]
+
+    @classmethod
+    def build(cls, toc: List[Dict], pages: List[Dict], total_pages: int,
+              path: Optional[str] = None) -> "StructureIndex":
+        """
+        toc - оглавление PDF ({"level", "title", "page"}),
+        pages - страницы с заголовками и таблицами из PDFAnalyzerAgent (structured=True).
+        """
+        entries = [dict(entry) for entry in toc]
+        if not entries:
+            # Оглавления нет - разделы по крупным заголовкам, уровень по размеру шрифта
+            sizes = sorted({heading["size"] for page in pages for heading in page.get("headings", [])},
+                           reverse=True)
+            entries = [
+                {"level": sizes.index(heading["size"]) + 1, "title": heading["title"], "page": page["page"]}
+                for page in pages for heading in page.get("headings", [])
+            ]
+
+        # Раздел длится до начала следующего раздела того же или более высокого уровня
+        for i, entry in enumerate(entries):
+            following = next((other["page"] for other in entries[i + 1:] if other["level"] <= entry["level"]),
+                             total_pages + 1)
+            entry["page_end"] = max(entry["page"], following - 1)
+
+        index = cls(entries, [], path)
+        tables = [
+            {
+                "page": page["page"],
+                "section": index.section_title(page["page"]),
+                "header": table["header"],
+                "rows": table["rows"]
+            }
+            for page in pages for table in page.get("tables", [])
+        ]
+        return cls(entries, tables, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["StructureIndex"]:
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            print(f"⚠️ Не удалось прочитать структуру руководства {path}")
+            return None
+        return cls(data["sections"], data["tables"], path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"sections": self.sections, "tables": self.tables}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def section_title(self, page: int) -> str:
+        """Самый вложенный раздел, в который попадает страница"""
+        containing = [section for section in self.sections if section["page"] <= page <= section["page_end"]]
+        return max(containing, key=lambda section: section["level"])["title"] if containing else ""
+
+    @staticmethod
+    def format_row(row: List[str]) -> str:
+        cells = [cell for cell in row if cell]
+        return f"{cells[0]}: {' / '.join(cells[1:])}" if len(cells) > 1 else cells[0]
+
+    def format_table(self, table: Dict) -> str:
+        lines = [f"Таблица «{table['section'] or 'без названия'}» (стр. {table['page']})"]
+        if any(table["header"]):
+            lines.append(" | ".join(table["header"]))
+        lines.extend(" | ".join(row) for row in table["rows"][:self.CONTEXT_ROWS])
+        return "\n".join(lines)
+
+    def lookup(self, query: str, max_rows: int = 3) -> Optional[Dict]:
+        """
+        Поиск по таблицам и разделам:
+        {"kind": "answer"} - все слова вопроса нашлись в строках таблиц с числовым значением,
+        {"kind": "context"} - текст подходящих таблиц для LLM; "complete" - таблица покрывает
+            все слова вопроса и заменяет поиск, иначе она дополняет найденные фрагменты,
+        {"kind": "section"} - подходит заголовок раздела, поиск сужается до его страниц.
+        """
+        query_terms = terms(query)
+        if not query_terms:
+            return None
+        expanded = {term: equivalents(term) for term in query_terms}
+
+        def matched(candidates: Set[str]) -> Set[str]:
+            return {term for term, group in expanded.items() if group & candidates}
+
+        candidates = []
+        # Таблицы для контекста: по умолчанию те, чьи заголовок и раздел покрывают вопрос целиком
+        # ("интервал ТО" -> "Регламент ТО")
+        context_tables = []
+        for table_id, table_terms in enumerate(self._table_terms):
+            context_matched = matched(table_terms)
+            if len(context_matched) == len(query_terms):
+                context_tables.append(table_id)
+            for row_id, row_terms in enumerate(self._row_terms[table_id]):
+                row_matched = matched(row_terms)
+                # Строка должна сама относиться к вопросу, а не только заголовок таблицы
+                if not row_matched:
+                    continue
+                coverage = len(row_matched | context_matched) / len(query_terms)
+                candidates.append((coverage, len(row_matched), table_id, row_id))
+
+        enough_terms = len(query_terms) >= self.MIN_ANSWER_TERMS
+        complete = bool(context_tables) and enough_terms
+        if candidates:
+            candidates.sort(key=lambda item: (item[0], item[1]), reverse=True)
+            full = [item for item in candidates if item[0] == 1.0 and
+                    any(char.isdigit() for char in " ".join(self.tables[item[2]]["rows"][item[3]]))]
+
+            if full and len(full) <= max_rows and enough_terms:
+                lines, pages = [], []
+                for _, _, table_id, row_id in full:
+                    table = self.tables[table_id]
+                    title = f"{table['section']} (стр. {table['page']})" if table["section"] else f"стр. {table['page']}"
+                    if title not in lines:
+                        lines.append(title)
+                        pages.append(str(table["page"]))
+                    lines.append(f"• {self.format_row(table['rows'][row_id])}")
+                return {"kind": "answer", "text": "\n".join(lines), "page": ", ".join(pages)}
+
+            # Строки подходят частично - в контекст таблицы с лучшими строками
+            if candidates[0][0] >= 0.5:
+                context_tables = list(dict.fromkeys(item[2] for item in candidates))
+                complete = candidates[0][0] == 1.0 and enough_terms
+
+        if context_tables:
+            table_ids = context_tables[:2]
+            return {
+                "kind": "context",
+                "text": "\n\n".join(self.format_table(self.tables[table_id]) for table_id in table_ids),
+                "page": str(self.tables[table_ids[0]]["page"]),
+                "complete": complete
+            }
+
+        scored = [(len(matched(section_terms)) / len(query_terms), section)
+                  for section, section_terms in zip(self.sections, self._section_terms)]
+        scored = [item for item in scored if item[0] >= 0.5]
+        if not scored:
+            return None
+        # Из равных по совпадению - самый узкий раздел
+        _, section = max(scored, key=lambda item: (item[0], item[1]["page"] - item[1]["page_end"]))
+        return {"kind": "section", "title": section["title"],
+                "page": section["page"], "page_end": section["page_end"]}
@@ -0,0 +1,126 @@
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+class StubOllamaServer:
+    """
+    Локальная замена Ollama для бенчмарков и CI: отвечает на /api/chat и /api/generate
+    фиксированным текстом с заданной задержкой на токен, без модели и GPU.
+    Счетчики prompt_eval_count / eval_count заполняются так же, как у настоящей Ollama.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token_latency_ms: float = 20,
+                 prefill_ms: float = 50, answer_tokens: int = 40):
+        self.token_latency_ms = token_latency_ms
+        self.prefill_ms = prefill_ms
+        self.answer_tokens = answer_tokens
+        self.requests = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/api/chat":
+                    stub.handle_generation(self, payload, chat=True)
+                elif self.path == "/api/generate":
+                    stub.handle_generation(self, payload, chat=False)
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-ollama", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubOllamaServer":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _prompt_tokens(self, payload: Dict, chat: bool) -> int:
+        if chat:
+            text = "".join(message.get("content", "") for message in payload.get("messages", []))
+        else:
+            text = payload.get("prompt", "")
+        return len(text) // 4
+
+    def _message(self, payload: Dict, content: str, chat: bool, done: bool, **stats) -> bytes:
+        message = {
+            "model": payload.get("model", "stub"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": done
+        }
+        if chat:
+            message["message"] = {"role": "assistant", "content": content}
+        else:
+            message["response"] = content
+        if done:
+            message.update(done_reason="stop", **stats)
+        return json.dumps(message, ensure_ascii=False).encode("utf-8")
+
+    def handle_generation(self, handler: BaseHTTPRequestHandler, payload: Dict, chat: bool):
+        self.requests += 1
+        prompt_tokens = self._prompt_tokens(payload, chat)
+        # Пустой промпт /api/generate - только загрузка модели (прогрев)
+        answer_tokens = 0 if not chat and not payload.get("prompt") else self.answer_tokens
+        stream = payload.get("stream", True)
+
+        started = time.perf_counter()
+        time.sleep(self.prefill_ms / 1000)
+        prefill_ns = int((time.perf_counter() - started) * 1e9)
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson" if stream else "application/json")
+        if stream:
+            handler.send_header("Transfer-Encoding", "chunked")
+        else:
+            time.sleep(answer_tokens * self.token_latency_ms / 1000)
+
+        def stats() -> Dict:
+            return {
+                "total_duration": int((time.perf_counter() - started) * 1e9),
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": prefill_ns,
+                "eval_count": answer_tokens,
+                "eval_duration": int((time.perf_counter() - started) * 1e9) - prefill_ns
+            }
+
+        words = [f"слово{i} " for i in range(answer_tokens)]
+
+        if not stream:
+            body = self._message(payload, "".join(words).strip(), chat, True, **stats())
+            handler.send_header("Content-Length", str(len(body)))
+            handler.end_headers()
+            handler.wfile.write(body)
+            return
+
+        handler.end_headers()
+
+        def write_chunk(data: bytes):
+            data += b"\n"
+            handler.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            handler.wfile.flush()
+
+        for word in words:
+            time.sleep(self.token_latency_ms / 1000)
+            write_chunk(self._message(payload, word, chat, False))
+        write_chunk(self._message(payload, "", chat, True, **stats()))
+        handler.wfile.write(b"0\r\n\r\n")
@@ -0,0 +1,51 @@
+"""
+Модули лежат в корне репозитория, а импортируются как пакеты
+(config.settings, database.numpy_store, utils.text_chunker ...).
+Для тестов имена пакетов отображаются на файлы в корне.
+"""
+import importlib.abc
+import importlib.util
+import os
+import sys
+import types
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGES = ("config", "agents", "database", "telegram_bot", "utils")
+
+class FlatLayoutFinder(importlib.abc.MetaPathFinder):
+    """config.settings -> settings.py, database.numpy_store -> numpy_store.py"""
+
+    def find_spec(self, fullname, path, target=None):
+        package, _, name = fullname.partition(".")
+        if package not in PACKAGES or not name or "." in name:
+            return None
+        location = os.path.join(ROOT, name + ".py")
+        if not os.path.exists(location):
+            return None
+        return importlib.util.spec_from_file_location(fullname, location)
+
+for package in PACKAGES:
+    if package not in sys.modules:
+        module = types.ModuleType(package)
+        module.__path__ = []
+        sys.modules[package] = module
+
+sys.meta_path.insert(0, FlatLayoutFinder())
+
+@pytest.fixture
+def numpy_engine(tmp_path, monkeypatch):
+    """
+    Движок эмбеддингов с хранилищем numpy во временной папке и настройками гибридного поиска
+    по умолчанию; модель не загружается - векторы в тестах задаются вручную.
+    """
+    from config.settings import settings
+    from database.embedding_engine import EmbeddingEngine
+
+    for name, value in {
+        "VECTOR_BACKEND": "numpy", "NUMPY_VECTOR_DTYPE": "float32", "NUMPY_RESCORE_FACTOR": 0,
+        "NUMPY_COMPRESS_TEXT": False, "IVF_LISTS": 0, "HYBRID_SEARCH": True,
+        "HYBRID_CANDIDATES": 20, "RRF_K": 60, "BM25_K1": 1.2, "BM25_B": 0.75, "BM25_HALF_SCORE": 4.0
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    return EmbeddingEngine("unused", str(tmp_path / "vector_db"))
@@ -0,0 +1,135 @@
+import json
+import numpy as np
+import pytest
+import database.answer_cache as answer_cache_module
+from database.answer_cache import AnswerCache, normalize_query
+
+OIL = np.array([1.0, 0.0, 0.0])
+# Косинусное расстояние до OIL около 0.005 - тот же вопрос другими словами
+OIL_REPHRASED = np.array([1.0, 0.1, 0.0])
+TYRES = np.array([0.0, 1.0, 0.0])
+
+@pytest.fixture
+def clock(monkeypatch):
+    state = {"now": 1_000_000.0}
+    monkeypatch.setattr(answer_cache_module.time, "time", lambda: state["now"])
+    return state
+
+def test_normalize_query():
+    assert normalize_query("  Какой ОБЪЁМ масла?! ") == "какой объем масла"
+
+def test_exact_hit_ignores_case_and_punctuation(clock):
+    cache = AnswerCache()
+    cache.put("a.pdf", "Какой объем масла?", "4,5 л", "v1")
+
+    assert cache.get("a.pdf", "какой объем  МАСЛА", "v1") == "4,5 л"
+    assert cache.get("b.pdf", "какой объем масла", "v1") is None
+    assert cache.stats() == {"hits": 1, "semantic_hits": 0, "misses": 1, "size": 1}
+
+def test_semantic_hit_by_embedding_distance(clock):
+    cache = AnswerCache(semantic_distance=0.08)
+    cache.put("a.pdf", "Какой объем масла?", "4,5 л", "v1", OIL)
+
+    assert cache.get("a.pdf", "Сколько масла заливать?", "v1", OIL_REPHRASED) == "4,5 л"
+    assert cache.get("a.pdf", "Давление в шинах?", "v1", TYRES) is None
+    # Семантический поиск только внутри своего руководства
+    assert cache.get("b.pdf", "Сколько масла заливать?", "v1", OIL_REPHRASED) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+def test_semantic_search_disabled(clock):
+    cache = AnswerCache(semantic_distance=0)
+    cache.put("a.pdf", "Какой объем масла?", "4,5 л", "v1", OIL)
+
+    assert cache.get("a.pdf", "Сколько масла заливать?", "v1", OIL_REPHRASED) is None
+
+def test_stale_index_version_is_never_served(clock):
+    cache = AnswerCache()
+    cache.put("a.pdf", "Какой объем масла?", "4,5 л (старое руководство)", "v1", OIL)
+
+    # После переиндексации ни точное совпадение, ни похожий вопрос не отдают старый ответ
+    assert cache.get("a.pdf", "Какой объем масла?", "v2", OIL) is None
+    assert cache.get("a.pdf", "Сколько масла заливать?", "v2", OIL_REPHRASED) is None
+
+    cache.put("a.pdf", "Какой объем масла?", "5 л", "v2", OIL)
+    assert cache.get("a.pdf", "Какой объем масла?", "v2") == "5 л"
+    assert cache.get("a.pdf", "Сколько масла заливать?", "v2", OIL_REPHRASED) == "5 л"
+
+def test_ttl_expires_entries(clock):
+    cache = AnswerCache(ttl=60)
+    cache.put("a.pdf", "Какой объем масла?", "4,5 л", "v1", OIL)
+
+    clock["now"] += 59
+    assert cache.get("a.pdf", "Какой объем масла?", "v1") == "4,5 л"
+    clock["now"] += 2
+    assert cache.get("a.pdf", "Какой объем масла?", "v1") is None
+    assert cache.get("a.pdf", "Сколько масла заливать?", "v1", OIL_REPHRASED) is None
+
+def test_lru_evicts_least_recently_used(clock):
+    cache = AnswerCache(max_entries=2)
+    cache.put("a.pdf", "первый", "1", "v1")
+    cache.put("a.pdf", "второй", "2", "v1")
+    cache.get("a.pdf", "первый", "v1")
+    cache.put("a.pdf", "третий", "3", "v1")
+
+    assert cache.get("a.pdf", "второй", "v1") is None
+    assert cache.get("a.pdf", "первый", "v1") == "1"
+    assert cache.get("a.pdf", "третий", "v1") == "3"
+    assert cache.stats()["size"] == 2
+
+def test_evicted_entry_is_not_found_semantically(clock):
+    cache = AnswerCache(max_entries=1)
+    cache.put("a.pdf", "Какой объем масла?", "4,5 л", "v1", OIL)
+    cache.get("a.pdf", "Сколько масла заливать?", "v1", OIL_REPHRASED)
+    cache.put("a.pdf", "Давление в шинах?", "2,2 бар", "v1", TYRES)
+
+    assert cache.get("a.pdf", "Сколько масла заливать?", "v1", OIL_REPHRASED) is None
+
+def test_invalidate_drops_only_that_manual(clock):
+    cache = AnswerCache()
+    cache.put("a.pdf", "вопрос", "A", "v1", OIL)
+    cache.put("b.pdf", "вопрос", "B", "v1", OIL)
+    cache.invalidate("a.pdf")
+
+    assert cache.get("a.pdf", "вопрос", "v1") is None
+    assert cache.get("a.pdf", "похожий вопрос", "v1", OIL) is None
+    assert cache.get("b.pdf", "вопрос", "v1") == "B"
+
+def test_persist_is_periodic_and_flushed_at_exit(clock, tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(answer_cache_module.atexit, "register", registered.append)
+    path = tmp_path / "answer_cache.json"
+
+    cache = AnswerCache(persist_path=str(path), save_interval=3600)
+    assert registered == [cache.flush]
+
+    cache.put("a.pdf", "Какой объем масла?", "4,5 л", "v1", OIL)
+    # Интервал не прошел - файл не переписывается на каждый ответ
+    assert not path.exists()
+
+    registered[0]()
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert [(item["manual"], item["query"], item["answer"]) for item in saved] == [
+        ("a.pdf", "какой объем масла", "4,5 л")
+    ]
+
+    reloaded = AnswerCache(persist_path=str(path))
+    assert reloaded.get("a.pdf", "Какой объем масла?", "v1") == "4,5 л"
+    assert reloaded.get("a.pdf", "Сколько масла заливать?", "v1", OIL_REPHRASED) == "4,5 л"
+    assert reloaded.get("a.pdf", "Какой объем масла?", "v2") is None
+
+def test_save_interval_zero_writes_on_put(clock, tmp_path, monkeypatch):
+    monkeypatch.setattr(answer_cache_module.atexit, "register", lambda func: None)
+    path = tmp_path / "answer_cache.json"
+    cache = AnswerCache(persist_path=str(path), save_interval=0)
+
+    cache.put("a.pdf", "вопрос", "ответ", "v1")
+    assert path.exists()
+    cache.invalidate("a.pdf")
+    assert json.loads(path.read_text(encoding="utf-8")) == []
+
+def test_corrupted_file_starts_empty(tmp_path, monkeypatch):
+    monkeypatch.setattr(answer_cache_module.atexit, "register", lambda func: None)
+    path = tmp_path / "answer_cache.json"
+    path.write_text("{не json", encoding="utf-8")
+
+    assert AnswerCache(persist_path=str(path)).stats()["size"] == 0
@@ -0,0 +1,34 @@
+from agents.context_packer import ContextPacker
+
+def passage(id_: str, score: float, page: int, **extra) -> dict:
+    return dict({"id": id_, "text": f"Фрагмент {id_} со страницы {page}.", "score": score,
+                 "metadata": {"page": page}}, **extra)
+
+def test_without_fusion_passages_sorted_by_score():
+    results = [passage("a", 0.6, 1), passage("b", 0.9, 2)]
+
+    selected = ContextPacker().select(results, budget_tokens=500)
+    assert [p["id"] for p in selected] == ["b", "a"]
+
+def test_rrf_order_kept():
+    # Точное лексическое совпадение первым по RRF, хотя его косинус ниже
+    results = [
+        passage("code", 0.55, 7, rrf_score=0.033, lexical_score=0.55),
+        passage("dense", 0.9, 3, rrf_score=0.016)
+    ]
+
+    selected = ContextPacker().select(results, budget_tokens=500)
+    assert [p["id"] for p in selected] == ["code", "dense"]
+
+def test_rerank_order_kept():
+    results = [passage("a", 0.6, 1, rerank_score=2.0), passage("b", 0.9, 2, rerank_score=-1.0)]
+
+    selected = ContextPacker().select(results, budget_tokens=500)
+    assert [p["id"] for p in selected] == ["a", "b"]
+
+def test_duplicates_skipped_and_budget_respected():
+    packer = ContextPacker(count_tokens=lambda text: 100)
+    results = [passage("a", 0.9, 1), passage("a", 0.8, 1), passage("b", 0.7, 2), passage("c", 0.6, 3)]
+
+    selected = packer.select(results, budget_tokens=2 * (100 + ContextPacker.PASSAGE_OVERHEAD_TOKENS))
+    assert [p["id"] for p in selected] == ["a", "b"]
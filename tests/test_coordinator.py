@@ -0,0 +1,125 @@
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from agents.coordinator import CoordinatorAgent
+from agents.search_agent import SearchAgent
+from config.settings import settings
+from database.vector_store import VectorDatabase
+
+FILLER = "Регулярно проверяйте состояние кузова и салона автомобиля перед поездкой номер {}."
+PART_CODE = "Предохранитель F12 защищает цепь прикуривателя, номинал 15 А."
+
+def unit(cosine: float, side: int) -> list:
+    """Вектор с заданным косинусом к запросу [1, 0, 0]"""
+    vector = [cosine, 0.0, 0.0]
+    vector[side] = float(np.sqrt(1 - cosine * cosine))
+    return vector
+
+@pytest.fixture
+def coordinator(numpy_engine, monkeypatch):
+    """CoordinatorAgent без моделей и Ollama: одна коллекция numpy, векторы заданы вручную"""
+    monkeypatch.setattr(settings, "LEXICAL_RELEVANCE_THRESHOLD", 0.5)
+    db = VectorDatabase("manual.pdf", engine=numpy_engine, shared=False)
+
+    # Общие фрагменты близки к запросу по смыслу, фрагмент с кодом - только по словам
+    ids = [f"filler{i}" for i in range(40)] + ["fuse"]
+    db.collection.upsert(
+        ids=ids,
+        embeddings=[unit(0.9 - i * 0.002, 1) for i in range(40)] + [unit(0.1, 2)],
+        documents=[FILLER.format(i) for i in range(40)] + [PART_CODE],
+        metadatas=[{"page": i + 1} for i in range(40)] + [{"page": 77}]
+    )
+
+    handle = SimpleNamespace(
+        pdf_name="manual.pdf", index_version="v1", structure_index=None,
+        vector_db=db, search_agent=SearchAgent(db)
+    )
+    agent = CoordinatorAgent.__new__(CoordinatorAgent)
+    agent.sessions = SimpleNamespace(get=lambda chat_id: handle)
+    agent.answer_cache = None
+    agent.reranker = None
+    agent.response_formatter = SimpleNamespace(context_budget=lambda query, manual: 2000)
+    return agent
+
+def test_part_code_query_reaches_context(coordinator):
+    query = "предохранитель F12"
+    results = coordinator.sessions.get(1).search_agent.search_relevant_info(
+        query, n_results=10, query_embedding=np.array([1.0, 0.0, 0.0])
+    )
+    fuse = next(result for result in results if result["id"] == "fuse")
+    # Ниже косинусного порога 0.7, но выше порога точного лексического совпадения
+    assert settings.LEXICAL_RELEVANCE_THRESHOLD <= fuse["score"] < 0.7
+
+    prepared = coordinator.prepare_answer(query, chat_id=1, query_embedding=np.array([1.0, 0.0, 0.0]))
+    assert PART_CODE in prepared["context"]
+
+def test_weak_lexical_match_stays_out_of_context(coordinator, monkeypatch):
+    monkeypatch.setattr(settings, "LEXICAL_RELEVANCE_THRESHOLD", 0.9)
+
+    prepared = coordinator.prepare_answer("предохранитель F12", chat_id=1,
+                                          query_embedding=np.array([1.0, 0.0, 0.0]))
+    assert PART_CODE not in prepared["context"]
+    assert "поездкой" in prepared["context"]
+
+def test_page_cited_from_first_packed_passage(coordinator):
+    prepared = coordinator.prepare_answer("предохранитель F12", chat_id=1,
+                                          query_embedding=np.array([1.0, 0.0, 0.0]))
+
+    first_header = prepared["context"].split(")", 1)[0]
+    assert first_header == f"[1] (стр. {prepared['page']}"
+
+class FakeSearchDb:
+    """Коллекция только для /search_all: считает открытия"""
+    opened = []
+
+    def __init__(self, pdf_name: str):
+        self.pdf_name = pdf_name
+        FakeSearchDb.opened.append(pdf_name)
+
+    def embed_query(self, query):
+        return np.array([1.0, 0.0, 0.0])
+
+    def search(self, query, n_results, query_embedding=None):
+        return [{"id": "1", "text": f"Ответ из {self.pdf_name}", "score": 0.9, "metadata": {"page": 1}}]
+
+@pytest.fixture
+def catalogue_coordinator(monkeypatch):
+    """Координатор без общей коллекции: обход проиндексированных PDF"""
+    import agents.coordinator as coordinator_module
+    FakeSearchDb.opened = []
+    monkeypatch.setattr(coordinator_module, "VectorDatabase", FakeSearchDb)
+    monkeypatch.setattr(settings, "MAX_OPEN_COLLECTIONS", 2)
+
+    versions = {"a.pdf": "v1", "b.pdf": "v1", "c.pdf": "v1"}
+    agent = CoordinatorAgent.__new__(CoordinatorAgent)
+    agent.catalogue_db = None
+    agent.collection_pool = SimpleNamespace(get=lambda pdf_name: None)
+    agent.pdf_indexer = SimpleNamespace(
+        indexed_pdfs=lambda: ["a.pdf", "b.pdf"], indexed_version=versions.get, versions=versions
+    )
+    agent._search_dbs = OrderedDict()
+    agent._search_dbs_lock = threading.Lock()
+    return agent
+
+def test_search_all_reuses_search_only_collections(catalogue_coordinator):
+    first = catalogue_coordinator.search_all_manuals("масло")
+    second = catalogue_coordinator.search_all_manuals("масло")
+
+    assert first == second
+    assert "Ответ из a.pdf" in first and "Ответ из b.pdf" in first
+    assert FakeSearchDb.opened == ["a.pdf", "b.pdf"]
+
+def test_search_all_reopens_collection_after_reindex(catalogue_coordinator):
+    catalogue_coordinator.search_all_manuals("масло")
+    catalogue_coordinator.pdf_indexer.versions["a.pdf"] = "v2"
+
+    catalogue_coordinator.search_all_manuals("масло")
+    assert FakeSearchDb.opened == ["a.pdf", "b.pdf", "a.pdf"]
+
+def test_search_only_collections_bounded_by_lru(catalogue_coordinator):
+    catalogue_coordinator.pdf_indexer.indexed_pdfs = lambda: ["a.pdf", "b.pdf", "c.pdf"]
+
+    catalogue_coordinator.search_all_manuals("масло")
+    assert list(catalogue_coordinator._search_dbs) == ["b.pdf", "c.pdf"]
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from database.lexical_index import LexicalIndex, tokenize
+from database.vector_store import VectorDatabase
+
+def test_tokenize_keeps_codes_in_both_spellings():
+    tokens = tokenize("Масло 5W-30 и предохранитель F12")
+
+    assert "5w-30" in tokens and "5w30" in tokens
+    assert "f12" in tokens
+    assert "и" not in tokens
+
+def test_bm25_prefers_rare_terms_and_frequent_matches():
+    index = LexicalIndex()
+    index.add_many([
+        ("oil", "Моторное масло 5W-30. Масло менять каждые 15000 км."),
+        ("filter", "Масляный фильтр меняется вместе с маслом."),
+        ("tyres", "Давление в шинах 2,2 бар."),
+        ("lights", "Замена ламп фар.")
+    ])
+
+    ranked = [doc_id for doc_id, _ in index.search("масло 5w30")]
+    assert ranked[0] == "oil"
+    assert "tyres" not in ranked
+    assert index.search("давление шин")[0][0] == "tyres"
+    assert index.search("тормоза") == []
+
+def test_bm25_normalizes_by_document_length():
+    index = LexicalIndex()
+    index.add("short", "антифриз")
+    index.add("long", "антифриз " + " ".join(f"слово{i}" for i in range(40)))
+    # Второй документ со словом нужен, чтобы idf не обнулялся
+    index.add("other", "тормозная жидкость")
+
+    scores = dict(index.search("антифриз"))
+    assert scores["short"] > scores["long"] > 0
+
+def test_remove_and_reload(tmp_path):
+    index = LexicalIndex(path=str(tmp_path / "lexical.json"))
+    index.add_many([("a", "масло"), ("b", "фильтр")])
+    index.remove(["a"])
+    index.save()
+
+    loaded = LexicalIndex(path=index.path)
+    assert loaded.load()
+    assert len(loaded) == 1
+    assert loaded.search("масло") == []
+    assert loaded.search("фильтр")[0][0] == "b"
+
+@pytest.fixture
+def vector_db(numpy_engine):
+    """Коллекция numpy с векторами, заданными вручную (без модели эмбеддингов)"""
+    db = VectorDatabase("manual.pdf", engine=numpy_engine, shared=False)
+    # Косинус с запросом [1, 0]: 0.9, 0.6, 0.2
+    cosines = {"dense": 0.9, "mixed": 0.6, "lexical": 0.2}
+    db.collection.upsert(
+        ids=list(cosines),
+        embeddings=[[c, np.sqrt(1 - c * c)] for c in cosines.values()],
+        documents=["Проверка уровня жидкости.", "Объем масла 4,5 л.", "Масло 5W-30, масло 5W-40."],
+        metadatas=[{"page": i + 1} for i in range(len(cosines))]
+    )
+    return db
+
+def search(db, lexical_results):
+    db.lexical_index.search = lambda query, n_results: lexical_results
+    return db.search("масло", n_results=5, query_embedding=np.array([1.0, 0.0]))
+
+def test_rrf_ranks_documents_found_by_both_retrievers_first(vector_db):
+    results = search(vector_db, [("mixed", 3.0), ("lexical", 2.0)])
+    rank = lambda i: 1 / (60 + i + 1)
+
+    # Первое место по векторам проигрывает документам, найденным обоими способами
+    assert [result["id"] for result in results] == ["mixed", "lexical", "dense"]
+    assert results[0]["rrf_score"] == pytest.approx(rank(1) + rank(0))
+    assert results[1]["rrf_score"] == pytest.approx(rank(2) + rank(1))
+    assert results[2]["rrf_score"] == pytest.approx(rank(0))
+
+def test_score_is_max_of_cosine_and_normalized_bm25(vector_db):
+    results = {result["id"]: result for result in search(vector_db, [("lexical", 4.0), ("dense", 1.0)])}
+
+    # BM25 = BM25_HALF_SCORE дает 0.5; косинус 0.9 не снижается слабым лексическим совпадением
+    assert results["lexical"]["score"] == pytest.approx(0.5)
+    assert results["dense"]["score"] == pytest.approx(0.9, abs=1e-5)
+    assert results["mixed"]["score"] == pytest.approx(0.6, abs=1e-5)
+    assert results["mixed"]["lexical_score"] == 0.0
+
+def test_lexical_only_results_are_loaded_from_collection(vector_db):
+    results = search(vector_db, [("lexical", 1.0), ("missing", 50.0)])
+
+    ids = [result["id"] for result in results]
+    assert "missing" not in ids
+    lexical = next(result for result in results if result["id"] == "lexical")
+    assert lexical["text"] == "Масло 5W-30, масло 5W-40."
+    assert lexical["metadata"] == {"page": 3}
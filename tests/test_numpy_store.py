@@ -0,0 +1,212 @@
+import os
+import numpy as np
+import pytest
+from database.numpy_store import NumpyCollection
+
+DIM = 8
+
+def vectors(count: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+
+def fill(collection: NumpyCollection, count: int, seed: int = 0) -> np.ndarray:
+    embeddings = vectors(count, seed)
+    collection.upsert(
+        ids=[f"id{i}" for i in range(count)],
+        embeddings=embeddings,
+        documents=[f"Текст {i}" for i in range(count)],
+        metadatas=[{"source": "a.pdf" if i % 2 == 0 else "b.pdf", "page": i} for i in range(count)]
+    )
+    return embeddings
+
+def top_id(collection: NumpyCollection, query: np.ndarray, **kwargs) -> str:
+    return collection.query([query], n_results=1, **kwargs)["ids"][0][0]
+
+def test_upsert_and_query_returns_nearest_with_cosine_distance(tmp_path):
+    collection = NumpyCollection("c", str(tmp_path))
+    embeddings = fill(collection, 10)
+
+    result = collection.query([embeddings[3] * 5], n_results=2)
+    assert result["ids"][0][0] == "id3"
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-5)
+    assert result["documents"][0][0] == "Текст 3"
+    assert result["metadatas"][0][0] == {"source": "b.pdf", "page": 3}
+
+def test_upsert_replaces_existing_ids(tmp_path):
+    collection = NumpyCollection("c", str(tmp_path))
+    embeddings = fill(collection, 4)
+    collection.upsert(["id1"], [embeddings[2]], ["Новый текст"], [{"page": 99}])
+
+    assert collection.count() == 4
+    assert collection.get(ids=["id1"])["documents"] == ["Новый текст"]
+    result = collection.query([embeddings[2]], n_results=4)
+    assert sorted(result["ids"][0]) == ["id0", "id1", "id2", "id3"]
+
+def test_duplicate_ids_in_one_batch_keep_last(tmp_path):
+    collection = NumpyCollection("c", str(tmp_path))
+    first, last = vectors(2)
+    collection.upsert(["a", "a"], [first, last], ["первый", "последний"], [{"page": 1}, {"page": 2}])
+
+    assert collection.count() == 1
+    result = collection.query([first], n_results=5)
+    assert result["ids"][0] == ["a"]
+    assert result["documents"][0] == ["последний"]
+    assert collection.get()["metadatas"] == [{"page": 2}]
+
+def test_delete_removes_rows(tmp_path):
+    collection = NumpyCollection("c", str(tmp_path))
+    embeddings = fill(collection, 6)
+    collection.delete(["id2", "id4", "missing"])
+
+    assert collection.count() == 4
+    assert "id2" not in collection.query([embeddings[2]], n_results=6)["ids"][0]
+    assert collection.get(ids=["id2", "id3"])["ids"] == ["id3"]
+
+def test_persist_and_reload(tmp_path):
+    collection = NumpyCollection("c", str(tmp_path))
+    embeddings = fill(collection, 12)
+    collection.delete(["id0"])
+    collection.persist()
+
+    reloaded = NumpyCollection("c", str(tmp_path))
+    assert reloaded.count() == 11
+    assert top_id(reloaded, embeddings[5]) == "id5"
+    assert reloaded.get(ids=["id7"])["metadatas"] == [{"source": "b.pdf", "page": 7}]
+
+    # Изменения после перезагрузки тоже сохраняются
+    reloaded.upsert(["extra"], [embeddings[0]], ["Добавлен"], [{"page": 0}])
+    reloaded.persist()
+    again = NumpyCollection("c", str(tmp_path))
+    assert again.count() == 12
+    assert top_id(again, embeddings[0]) == "extra"
+
+def test_where_filters_by_metadata(tmp_path):
+    collection = NumpyCollection("c", str(tmp_path))
+    embeddings = fill(collection, 10)
+
+    assert top_id(collection, embeddings[3], where={"source": "a.pdf"}) != "id3"
+    result = collection.query([embeddings[3]], n_results=10, where={"source": "b.pdf"})
+    assert sorted(result["ids"][0]) == ["id1", "id3", "id5", "id7", "id9"]
+    assert collection.get(where={"page": {"$eq": 4}})["ids"] == ["id4"]
+    with pytest.raises(ValueError):
+        collection.get(where={"page": 1, "source": "a.pdf"})
+
+def test_ivf_finds_mostly_same_nearest_as_exact_search(tmp_path):
+    embeddings = vectors(400, seed=1)
+    exact = NumpyCollection("exact", str(tmp_path / "exact"))
+    ivf = NumpyCollection("ivf", str(tmp_path / "ivf"), ivf_lists=8, ivf_nprobe=4)
+    for collection in (exact, ivf):
+        collection.upsert([str(i) for i in range(400)], embeddings,
+                          [""] * 400, [{"page": i} for i in range(400)])
+
+    queries = vectors(50, seed=2)
+    matches = sum(top_id(ivf, query) == top_id(exact, query) for query in queries)
+    assert ivf._ivf is not None
+    assert matches >= 0.8 * len(queries)
+    # Запрос к существующей строке находит ее и при опросе одного кластера
+    ivf.ivf_nprobe = 1
+    assert top_id(ivf, embeddings[42]) == "42"
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_compact_dtypes_find_same_nearest(tmp_path, dtype):
+    collection = NumpyCollection("c", str(tmp_path), dtype=dtype, rescore_factor=0)
+    embeddings = fill(collection, 50)
+    collection.persist()
+
+    reloaded = NumpyCollection("c", str(tmp_path), dtype=dtype, rescore_factor=0)
+    info = reloaded.storage_info()
+    assert info["dtype"] == dtype and not info["full_precision"]
+    assert info["scan_bytes"] < 50 * DIM * 4
+    assert all(top_id(reloaded, embeddings[i]) == f"id{i}" for i in range(50))
+    # Восстановленные векторы близки к исходным нормированным
+    restored = reloaded.get(ids=["id7"], include=["embeddings"])["embeddings"][0]
+    expected = embeddings[7] / np.linalg.norm(embeddings[7])
+    assert np.allclose(restored, expected, atol=0.02)
+
+def test_rescore_uses_full_precision_distances(tmp_path):
+    collection = NumpyCollection("c", str(tmp_path), dtype="int8", rescore_factor=4)
+    embeddings = fill(collection, 30)
+    collection.persist()
+
+    reloaded = NumpyCollection("c", str(tmp_path), dtype="int8", rescore_factor=4)
+    assert reloaded.storage_info()["full_precision"]
+    result = reloaded.query([embeddings[4]], n_results=3)
+    assert result["ids"][0][0] == "id4"
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
+
+def test_compressed_text_round_trip(tmp_path):
+    collection = NumpyCollection("c", str(tmp_path), compress_text=True)
+    embeddings = fill(collection, 5)
+    collection.persist()
+
+    reloaded = NumpyCollection("c", str(tmp_path), compress_text=True)
+    assert reloaded.storage_info()["text_memory_bytes"] == 0
+    assert reloaded.get(ids=["id3"])["documents"] == ["Текст 3"]
+    assert reloaded.query([embeddings[1]], n_results=1)["documents"][0] == ["Текст 1"]
+
+    # Сжатые и новые тексты вместе переживают следующий persist
+    reloaded.upsert(["new"], [embeddings[0]], ["Новый"], [{"page": 0}])
+    reloaded.delete(["id2"])
+    reloaded.persist()
+    again = NumpyCollection("c", str(tmp_path), compress_text=True)
+    assert again.get(ids=["id1", "new", "id2"])["documents"] == ["Текст 1", "Новый"]
+
+@pytest.mark.parametrize("before, after", [
+    ({"dtype": "float32", "compress_text": False}, {"dtype": "int8", "rescore_factor": 4, "compress_text": True}),
+    ({"dtype": "int8", "rescore_factor": 4, "compress_text": True}, {"dtype": "float16", "rescore_factor": 0}),
+    ({"dtype": "float16", "rescore_factor": 0}, {"dtype": "float32", "compress_text": False})
+])
+def test_layout_conversion_on_reload(tmp_path, before, after):
+    collection = NumpyCollection("c", str(tmp_path), **before)
+    embeddings = fill(collection, 20)
+    collection.persist()
+
+    converted = NumpyCollection("c", str(tmp_path), **after)
+    converted.persist()
+    reloaded = NumpyCollection("c", str(tmp_path), **after)
+
+    info = reloaded.storage_info()
+    assert info["dtype"] == after["dtype"]
+    assert info["full_precision"] == (after["dtype"] != "float32" and after.get("rescore_factor", 4) > 0)
+    assert info["compressed_text"] == after.get("compress_text", False)
+    assert reloaded.count() == 20
+    assert reloaded.get(ids=["id9"])["documents"] == ["Текст 9"]
+    assert all(top_id(reloaded, embeddings[i]) == f"id{i}" for i in range(20))
+    # Файлы прежнего формата удалены
+    files = set(os.listdir(tmp_path))
+    assert ("vectors_full.npy" in files) == info["full_precision"]
+    assert ("documents.bin" in files) == info["compressed_text"]
+
+def test_compaction_keeps_full_precision_on_disk(tmp_path):
+    collection = NumpyCollection("c", str(tmp_path), dtype="int8", rescore_factor=4)
+    embeddings = fill(collection, 20)
+    collection.persist()
+
+    extra = vectors(5, seed=3)
+    collection.upsert([f"x{i}" for i in range(5)], extra, [""] * 5, [{}] * 5)
+    collection.delete(["id0"])
+    assert top_id(collection, extra[2]) == "x2"
+    # Точные векторы после добавления строк остаются memmap-файлом, а не массивом в памяти
+    assert isinstance(collection._full, np.memmap)
+    assert collection.count() == 24
+
+    collection.upsert(["x5"], [embeddings[0]], [""], [{}])
+    collection.delete(["x0"])
+    assert top_id(collection, embeddings[0]) == "x5"
+    collection.persist()
+    assert not [name for name in os.listdir(tmp_path) if "pending" in name]
+
+    reloaded = NumpyCollection("c", str(tmp_path), dtype="int8", rescore_factor=4)
+    assert reloaded.count() == 24
+    assert top_id(reloaded, extra[4]) == "x4"
+    assert top_id(reloaded, embeddings[0]) == "x5"
+
+def test_delete_all_rows_with_full_precision_on_disk(tmp_path):
+    collection = NumpyCollection("c", str(tmp_path), dtype="int8", rescore_factor=4)
+    fill(collection, 3)
+    collection.persist()
+    collection.delete(["id0", "id1", "id2"])
+    collection.persist()
+
+    reloaded = NumpyCollection("c", str(tmp_path), dtype="int8", rescore_factor=4)
+    assert reloaded.count() == 0
+    assert reloaded.query([vectors(1)[0]], n_results=3)["ids"] == [[]]
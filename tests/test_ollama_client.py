@@ -0,0 +1,74 @@
+import threading
+import time
+from types import SimpleNamespace
+from agents.ollama_client import LLMResponseError, OllamaClient
+
+class FakeOllama:
+    """ollama.Client: chat ждет сигнала release, чтобы запросы успели совпасть по времени"""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.calls = []
+        self.release = threading.Event()
+
+    def chat(self, model, messages, options=None, keep_alive=None, stream=False):
+        self.calls.append(messages[-1]["content"])
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(message=SimpleNamespace(content=f" ответ: {messages[-1]['content']} "))
+
+def make_client(fake: FakeOllama) -> OllamaClient:
+    client = OllamaClient("http://localhost:11434", "test-model", timeout=5, max_parallel=4, max_retries=0)
+    client.client = fake
+    client.stats = SimpleNamespace(record=lambda response: None)
+    return client
+
+def ask(client: OllamaClient, question: str, answers: list, errors: list):
+    try:
+        answers.append(client.chat([{"role": "user", "content": question}]))
+    except Exception as e:
+        errors.append(e)
+
+def run_concurrently(client: OllamaClient, fake: FakeOllama, questions):
+    answers, errors = [], []
+    threads = [threading.Thread(target=ask, args=(client, q, answers, errors)) for q in questions]
+    for thread in threads:
+        thread.start()
+    # Ведущие запросы дошли до сервера, повторы успевают встать в ожидание
+    deadline = time.monotonic() + 5
+    while len(fake.calls) < len(set(questions)) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.2)
+    fake.release.set()
+    for thread in threads:
+        thread.join(5)
+    return answers, errors
+
+def test_identical_concurrent_requests_share_one_generation():
+    fake = FakeOllama()
+    client = make_client(fake)
+
+    answers, errors = run_concurrently(client, fake, ["масло", "масло", "масло"])
+    assert errors == []
+    assert answers == ["ответ: масло"] * 3
+    assert fake.calls == ["масло"]
+    assert client._flights == {}
+
+def test_different_requests_are_sent_separately():
+    fake = FakeOllama()
+    client = make_client(fake)
+
+    answers, errors = run_concurrently(client, fake, ["масло", "шины"])
+    assert sorted(answers) == ["ответ: масло", "ответ: шины"]
+    assert sorted(fake.calls) == ["масло", "шины"]
+
+def test_error_is_shared_with_waiting_requests():
+    import ollama
+    fake = FakeOllama(error=ollama.ResponseError("model not found", 404))
+    client = make_client(fake)
+
+    answers, errors = run_concurrently(client, fake, ["масло", "масло"])
+    assert answers == []
+    assert len(errors) == 2 and all(isinstance(e, LLMResponseError) for e in errors)
+    assert fake.calls == ["масло"]
@@ -0,0 +1,42 @@
+import fitz
+import pytest
+from agents.pdf_analyzer import extract_page_range, extract_page_structure, has_table_rules
+
+TABLE_HTML = (
+    "<table><tr><th>Жидкость</th><th>Объем</th></tr>"
+    "<tr><td>Моторное масло</td><td>4,2 л</td></tr>"
+    "<tr><td>Охлаждающая жидкость</td><td>6,5 л</td></tr></table>"
+)
+TABLE_CSS = "table, td, th {border: 1px solid black; border-collapse: collapse;}"
+
+@pytest.fixture
+def pdf_path(tmp_path) -> str:
+    """Страница 1 - только текст, страница 2 - разлинованная таблица"""
+    path = str(tmp_path / "manual.pdf")
+    doc = fitz.open()
+    doc.new_page().insert_htmlbox(fitz.Rect(50, 50, 500, 300), "Проверяйте уровень масла каждые 1000 км.")
+    doc.new_page().insert_htmlbox(fitz.Rect(50, 50, 500, 300), TABLE_HTML, css=TABLE_CSS)
+    doc.save(path)
+    doc.close()
+    return path
+
+def test_table_rules_only_on_lined_page(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        assert not has_table_rules(doc[0])
+        assert has_table_rules(doc[1])
+
+def test_find_tables_skipped_on_text_page(pdf_path, monkeypatch):
+    calls = []
+    original = fitz.Page.find_tables
+    monkeypatch.setattr(fitz.Page, "find_tables",
+                        lambda page, *args, **kwargs: calls.append(page.number) or original(page, *args, **kwargs))
+
+    documents = extract_page_range(pdf_path, 0, 2, structured=True)
+    assert calls == [1]
+    assert documents[0]["tables"] == []
+    assert documents[1]["tables"][0]["header"] == ["Жидкость", "Объем"]
+    assert ["Моторное масло", "4,2 л"] in documents[1]["tables"][0]["rows"]
+
+def test_tables_disabled(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        assert extract_page_structure(doc[1], tables=False)["tables"] == []
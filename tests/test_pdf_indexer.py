@@ -0,0 +1,165 @@
+import os
+import zlib
+import numpy as np
+import pytest
+import database.pdf_indexer as pdf_indexer_module
+import database.vector_store as vector_store_module
+from agents.pdf_analyzer import PDFAnalyzerAgent
+from config.settings import settings
+from database.embedding_engine import EmbeddingEngine
+from database.index_manifest import IndexManifest
+from database.pdf_indexer import PDFIndexer
+
+fitz = pytest.importorskip("fitz")
+
+class HashingModel:
+    """Детерминированные эмбеддинги без sentence_transformers: вектор по crc32 слов"""
+
+    def encode(self, texts, batch_size=64, convert_to_numpy=True):
+        vectors = np.zeros((len(texts), 16), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode("utf-8")) % 16] += 1.0
+        return vectors
+
+    def get_sentence_embedding_dimension(self):
+        return 16
+
+def page_text(page: int, version: int = 0) -> str:
+    return " ".join(f"Страница {page} версия {version} предложение {i} про обслуживание." for i in range(12))
+
+def write_pdf(path: str, texts):
+    doc = fitz.open()
+    for text in texts:
+        page = doc.new_page()
+        # insert_htmlbox переносит строки и встраивает шрифт с кириллицей
+        page.insert_htmlbox(page.rect + (50, 50, -50, -50), text)
+    doc.save(path)
+    doc.close()
+
+@pytest.fixture
+def indexer(tmp_path, monkeypatch):
+    for name, value in {
+        "VECTOR_DB_PATH": str(tmp_path / "vector_db"), "VECTOR_BACKEND": "numpy",
+        "NUMPY_VECTOR_DTYPE": "float32", "NUMPY_RESCORE_FACTOR": 0, "NUMPY_COMPRESS_TEXT": False,
+        "IVF_LISTS": 0, "SHARED_COLLECTION": False, "STRUCTURED_LOOKUP": False,
+        "CHUNKER": "sentence", "CHUNK_TOKENIZER": "estimate", "CHUNK_MAX_TOKENS": 60,
+        "CHUNK_OVERLAP_TOKENS": 0, "INGEST_WORKERS": 1
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+
+    engine = EmbeddingEngine("hashing", settings.VECTOR_DB_PATH)
+    engine._model = HashingModel()
+    monkeypatch.setattr(vector_store_module, "embedding_engine", engine)
+
+    pdf_folder = tmp_path / "pdf"
+    pdf_folder.mkdir()
+    manifest = IndexManifest(str(tmp_path / "vector_db" / "manifest.json"))
+    return PDFIndexer(PDFAnalyzerAgent(str(pdf_folder)), manifest)
+
+def pdf_path(indexer) -> str:
+    return os.path.join(indexer.pdf_analyzer.pdf_folder, "manual.pdf")
+
+def chunk_pages(vector_db):
+    data = vector_db.collection.get(include=["metadatas"])
+    return {chunk_id: metadata["page"] for chunk_id, metadata in zip(data["ids"], data["metadatas"])}
+
+def test_first_index_adds_all_chunks(indexer):
+    write_pdf(pdf_path(indexer), [page_text(page) for page in range(1, 5)])
+    vector_db, stats = indexer.index("manual.pdf")
+
+    assert stats["status"] == "updated"
+    assert stats["added"] == stats["chunks"] == vector_db.count() > 4
+    assert stats["removed"] == 0
+    assert stats["changed_pages"] == [1, 2, 3, 4]
+    entry = indexer.manifest.get("manual.pdf")
+    assert entry["chunks"] == stats["chunks"]
+    assert sorted(entry["pages"]) == ["1", "2", "3", "4"]
+
+def test_unchanged_file_uses_size_and_mtime_without_hashing(indexer, monkeypatch):
+    write_pdf(pdf_path(indexer), [page_text(page) for page in range(1, 4)])
+    _, first = indexer.index("manual.pdf")
+
+    def fail(path):
+        raise AssertionError("файл не должен читаться на быстрой проверке")
+    monkeypatch.setattr(pdf_indexer_module, "file_sha256", fail)
+
+    _, stats = indexer.index("manual.pdf")
+    assert stats["status"] == "up_to_date"
+    assert stats["index_version"] == first["index_version"]
+
+def test_touched_file_with_same_content_is_checked_by_hash(indexer):
+    path = pdf_path(indexer)
+    write_pdf(path, [page_text(page) for page in range(1, 4)])
+    vector_db, _ = indexer.index("manual.pdf")
+    ids = set(vector_db.get_ids())
+
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 100))
+    _, stats = indexer.index("manual.pdf")
+
+    assert stats["status"] == "up_to_date"
+    assert indexer.manifest.get("manual.pdf")["mtime"] == stat.st_mtime + 100
+    assert set(vector_db.get_ids()) == ids
+
+def test_edited_page_replaces_only_its_chunks(indexer):
+    path = pdf_path(indexer)
+    write_pdf(path, [page_text(page) for page in range(1, 5)])
+    vector_db, _ = indexer.index("manual.pdf")
+    before = chunk_pages(vector_db)
+
+    write_pdf(path, [page_text(page, version=1 if page == 2 else 0) for page in range(1, 5)])
+    vector_db, stats = indexer.index("manual.pdf")
+    after = chunk_pages(vector_db)
+
+    removed = before.keys() - after.keys()
+    added = after.keys() - before.keys()
+    assert stats["status"] == "updated"
+    assert stats["changed_pages"] == [2]
+    assert (stats["added"], stats["removed"]) == (len(added), len(removed))
+    assert removed and added
+    # Затронуты только чанки второй страницы: id остальных не меняются
+    assert {before[chunk_id] for chunk_id in removed} == {2}
+    assert {after[chunk_id] for chunk_id in added} == {2}
+    assert {chunk_id for chunk_id, page in before.items() if page != 2} <= after.keys()
+    assert vector_db.count() == stats["chunks"] == len(after)
+    # В коллекции нет старого текста страницы
+    documents = vector_db.collection.get(include=["documents"])["documents"]
+    assert not any("Страница 2 версия 0" in document for document in documents)
+
+def test_removed_page_deletes_stale_chunks(indexer):
+    path = pdf_path(indexer)
+    write_pdf(path, [page_text(page) for page in range(1, 5)])
+    vector_db, _ = indexer.index("manual.pdf")
+
+    write_pdf(path, [page_text(page) for page in range(1, 4)])
+    vector_db, stats = indexer.index("manual.pdf")
+
+    assert stats["added"] == 0
+    assert stats["removed"] > 0
+    assert set(chunk_pages(vector_db).values()) == {1, 2, 3}
+
+def test_chunk_count_mismatch_forces_reindex(indexer):
+    write_pdf(pdf_path(indexer), [page_text(page) for page in range(1, 4)])
+    vector_db, first = indexer.index("manual.pdf")
+    lost = vector_db.get_ids()[0]
+    vector_db.delete_ids([lost])
+
+    vector_db, stats = indexer.index("manual.pdf")
+    assert stats["status"] == "updated"
+    assert (stats["added"], stats["removed"]) == (1, 0)
+    assert lost in vector_db.get_ids()
+    assert vector_db.count() == first["chunks"]
+
+def test_chunker_change_rebuilds_index(indexer, monkeypatch):
+    write_pdf(pdf_path(indexer), [page_text(page) for page in range(1, 4)])
+    _, first = indexer.index("manual.pdf")
+
+    monkeypatch.setattr(settings, "CHUNK_MAX_TOKENS", 30)
+    indexer._sentence_chunker = None
+    vector_db, stats = indexer.index("manual.pdf")
+
+    assert stats["status"] == "updated"
+    assert stats["index_version"] != first["index_version"]
+    assert stats["chunks"] > first["chunks"]
+    assert vector_db.count() == stats["chunks"]
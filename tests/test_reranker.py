@@ -0,0 +1,59 @@
+import threading
+import time
+from agents.reranker import RerankerAgent
+
+class FakeCrossEncoder:
+    """Оценка пары - длина текста фрагмента; predict занимает delay секунд"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def predict(self, pairs, batch_size=16, show_progress_bar=False):
+        self.calls += 1
+        time.sleep(self.delay)
+        return [float(len(text)) for _, text in pairs]
+
+def make_reranker(model: FakeCrossEncoder, budget_ms: float = 100) -> RerankerAgent:
+    reranker = RerankerAgent("unused", time_budget_ms=budget_ms, top_k=3)
+    reranker._model = model
+    return reranker
+
+RESULTS = [{"id": "short", "text": "a"}, {"id": "long", "text": "aaaa"}, {"id": "mid", "text": "aa"}]
+
+def test_reranks_within_budget():
+    reranker = make_reranker(FakeCrossEncoder())
+
+    reranked = reranker.rerank("вопрос", RESULTS)
+    assert [r["id"] for r in reranked] == ["long", "mid", "short"]
+    assert reranker.skipped == 0
+
+def test_lock_wait_longer_than_budget_returns_input_order():
+    model = FakeCrossEncoder()
+    reranker = make_reranker(model, budget_ms=30)
+    # Кросс-энкодер занят другим вопросом
+    reranker._lock.acquire()
+    try:
+        started = time.perf_counter()
+        reranked = reranker.rerank("вопрос", RESULTS)
+        waited_ms = (time.perf_counter() - started) * 1000
+    finally:
+        reranker._lock.release()
+
+    assert [r["id"] for r in reranked] == ["short", "long", "mid"]
+    assert reranker.skipped == 1
+    assert model.calls == 0
+    assert waited_ms < 30 + 200
+
+def test_lock_wait_shrinks_candidates_to_remaining_budget():
+    reranker = make_reranker(FakeCrossEncoder(), budget_ms=100)
+    reranker._ms_per_pair = 30.0
+    # Блокировку освобождают через 50 мс: на оставшиеся ~50 мс хватает одной пары - этап пропускается
+    reranker._lock.acquire()
+    threading.Timer(0.05, reranker._lock.release).start()
+
+    reranked = reranker.rerank("вопрос", RESULTS)
+    assert [r["id"] for r in reranked] == ["short", "long", "mid"]
+    assert reranker.skipped == 1
+    # Ожидание в очереди не меняет оценку скорости модели
+    assert reranker._ms_per_pair == 30.0
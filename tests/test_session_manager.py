@@ -0,0 +1,140 @@
+import pytest
+import agents.session_manager as session_manager_module
+from agents.session_manager import CollectionPool, SessionManager
+from config.settings import settings
+
+class FakeVectorDatabase:
+    def __init__(self, pdf_name: str):
+        self.pdf_name = pdf_name
+
+class FakeLoader:
+    """Загрузчик вместо PDFIndexer.index: считает открытия коллекций"""
+
+    def __init__(self):
+        self.loaded = []
+
+    def __call__(self, pdf_name, progress_callback=None):
+        self.loaded.append(pdf_name)
+        return FakeVectorDatabase(pdf_name), {"index_version": f"v-{pdf_name}"}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(session_manager_module.time, "monotonic", clock)
+    monkeypatch.setattr(settings, "STRUCTURED_LOOKUP", False)
+    return clock
+
+def test_acquire_opens_collection_once_and_counts_references(clock):
+    loader = FakeLoader()
+    pool = CollectionPool(loader, max_handles=2)
+
+    first, stats = pool.acquire("a.pdf")
+    second, again = pool.acquire("a.pdf")
+
+    assert first is second
+    assert stats == {"index_version": "v-a.pdf"} and again is None
+    assert first.index_version == "v-a.pdf"
+    assert loader.loaded == ["a.pdf"]
+    assert pool.stats()["refcounts"] == {"a.pdf": 2}
+
+    pool.release("a.pdf")
+    pool.release("a.pdf")
+    pool.release("a.pdf")
+    assert pool.stats()["refcounts"] == {"a.pdf": 0}
+
+def test_eviction_skips_handles_in_use(clock):
+    pool = CollectionPool(FakeLoader(), max_handles=2)
+    pool.acquire("a.pdf")
+    pool.acquire("b.pdf")
+    pool.release("b.pdf")
+
+    # a.pdf используется - вытесняется свободная b.pdf, хотя a.pdf старше
+    pool.acquire("c.pdf")
+    assert sorted(pool.stats()["refcounts"]) == ["a.pdf", "c.pdf"]
+
+    # Свободных нет - пул временно превышает лимит, но занятые не закрывает
+    pool.acquire("d.pdf")
+    assert sorted(pool.stats()["refcounts"]) == ["a.pdf", "c.pdf", "d.pdf"]
+
+def test_eviction_is_least_recently_used(clock):
+    pool = CollectionPool(FakeLoader(), max_handles=2)
+    for name in ("a.pdf", "b.pdf"):
+        pool.acquire(name)
+        pool.release(name)
+    pool.get("a.pdf")
+
+    pool.acquire("c.pdf")
+    assert sorted(pool.stats()["refcounts"]) == ["a.pdf", "c.pdf"]
+
+def test_attach_switches_manual_and_releases_previous(clock):
+    pool = CollectionPool(FakeLoader(), max_handles=4)
+    sessions = SessionManager(pool)
+
+    sessions.attach(1, "a.pdf")
+    sessions.attach(2, "a.pdf")
+    sessions.attach(1, "b.pdf")
+
+    assert sessions.current_pdf(1) == "b.pdf"
+    assert sessions.get(2).pdf_name == "a.pdf"
+    assert pool.stats()["refcounts"] == {"a.pdf": 1, "b.pdf": 1}
+    assert sessions.active_chats() == 2
+
+    sessions.detach(2)
+    assert sessions.get(2) is None
+    assert pool.stats()["refcounts"]["a.pdf"] == 0
+
+def test_idle_sessions_expire_and_release_collections(clock):
+    pool = CollectionPool(FakeLoader(), max_handles=1)
+    sessions = SessionManager(pool, ttl=100)
+    sessions.attach(1, "a.pdf")
+    sessions.attach(2, "b.pdf")
+
+    clock.now += 101
+    assert sessions.get(1) is None
+    assert sessions.get(2) is None
+    assert set(pool.stats()["refcounts"].values()) == {0}
+
+    # Освобожденные коллекции снова можно вытеснять
+    sessions.attach(3, "c.pdf")
+    assert list(pool.stats()["refcounts"]) == ["c.pdf"]
+
+def test_get_extends_session(clock):
+    pool = CollectionPool(FakeLoader(), max_handles=4)
+    sessions = SessionManager(pool, ttl=100)
+    sessions.attach(1, "a.pdf")
+
+    for _ in range(3):
+        clock.now += 80
+        assert sessions.get(1).pdf_name == "a.pdf"
+
+    clock.now += 101
+    assert sessions.expire_idle() == 1
+    assert sessions.current_pdf(1) is None
+
+def test_expiry_check_is_throttled(clock):
+    sessions = SessionManager(CollectionPool(FakeLoader()), ttl=10)
+    sessions.attach(1, "a.pdf")
+
+    # С проверки при attach не прошло EXPIRY_CHECK_INTERVAL - сессия еще числится
+    clock.now += 11
+    sessions.get(2)
+    assert sessions.current_pdf(1) == "a.pdf"
+
+    clock.now += SessionManager.EXPIRY_CHECK_INTERVAL
+    sessions.get(2)
+    assert sessions.current_pdf(1) is None
+
+def test_zero_ttl_never_expires(clock):
+    sessions = SessionManager(CollectionPool(FakeLoader()), ttl=0)
+    sessions.attach(1, "a.pdf")
+    clock.now += 10 ** 6
+
+    assert sessions.expire_idle() == 0
+    assert sessions.get(1).pdf_name == "a.pdf"
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+from utils.startup import BackgroundCoordinator, StartupTimer
+
+class FakeCoordinator:
+    """CoordinatorAgent: Ollama отвечает на прогрев начиная с попытки ready_on"""
+    created = 0
+
+    def __init__(self, ready_on: int):
+        FakeCoordinator.created += 1
+        self.warm_ups = 1
+        self.llm_ready = ready_on <= 1
+
+        def warm_up():
+            self.warm_ups += 1
+            return self.warm_ups >= ready_on
+        self.response_formatter = SimpleNamespace(warm_up=warm_up)
+
+class FakeStartup(BackgroundCoordinator):
+    """Без импорта моделей: каждая попытка записывает один шаг импорта и создает координатор"""
+
+    def __init__(self, ready_on: int, **kwargs):
+        super().__init__(timer=StartupTimer(), retry_delay=0, exit_on_failure=False, **kwargs)
+        self.ready_on = ready_on
+
+    def _create_coordinator(self):
+        with self.timer.step("импорт агентов"):
+            pass
+        return self._warmed_coordinator(lambda: FakeCoordinator(self.ready_on))
+
+def run(ready_on: int, max_attempts: int) -> FakeStartup:
+    FakeCoordinator.created = 0
+    return FakeStartup(ready_on, max_attempts=max_attempts).start(background=False)
+
+def test_ollama_ready_first_time():
+    startup = run(ready_on=1, max_attempts=3)
+
+    assert startup.ready and startup.attempts == 1
+    assert [name for name, _ in startup.status()["steps"]] == ["импорт агентов", "агенты и прогрев Ollama"]
+
+def test_failed_warm_up_is_retried_without_recreating_agents():
+    startup = run(ready_on=3, max_attempts=5)
+
+    assert startup.ready and startup.attempts == 3
+    assert startup.error is None
+    assert FakeCoordinator.created == 1
+    assert startup.coordinator.warm_ups == 3
+
+def test_steps_show_only_last_attempt():
+    startup = run(ready_on=2, max_attempts=5)
+
+    assert [name for name, _ in startup.status()["steps"]] == ["импорт агентов", "прогрев Ollama"]
+
+def test_ollama_down_fails_after_max_attempts():
+    startup = run(ready_on=10, max_attempts=2)
+
+    assert startup.state == BackgroundCoordinator.FAILED
+    assert startup.coordinator is None
+    assert "Ollama" in startup.error
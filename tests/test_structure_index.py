@@ -0,0 +1,98 @@
+import pytest
+from database.structure_index import StructureIndex, stem, terms
+
+TOC = [
+    {"level": 1, "title": "Техническое обслуживание", "page": 10},
+    {"level": 2, "title": "Заправочные емкости", "page": 12},
+    {"level": 2, "title": "Регламент ТО", "page": 14},
+    {"level": 1, "title": "Электрооборудование", "page": 20},
+    {"level": 2, "title": "Замена ламп", "page": 24}
+]
+
+PAGES = [
+    {"page": 12, "tables": [{
+        "header": ["Наименование", "Объем"],
+        "rows": [["Моторное масло", "4,5 л"], ["Охлаждающая жидкость", "7,2 л"], ["Топливный бак", "55 л"]]
+    }]},
+    {"page": 14, "tables": [{
+        "header": ["Работа", "Пробег, км"],
+        "rows": [["Масло двигателя", "15000"], ["Воздушный фильтр", "30000"]]
+    }]},
+    {"page": 22, "tables": [{
+        "header": ["Предохранитель", "Ток, А", "Цепь"],
+        "rows": [["F1", "10", "Стеклоподъемники"], ["F12", "15", "Прикуриватель"],
+                 ["F13", "20", "Обогрев заднего стекла"]]
+    }]}
+]
+
+@pytest.fixture(scope="module")
+def index():
+    return StructureIndex.build(TOC, PAGES, total_pages=30)
+
+@pytest.mark.parametrize("short, long", [
+    ("обогрев", "обогрева"), ("объем", "объема"), ("масло", "масла"), ("емкость", "емкости"),
+    ("предохранитель", "предохранителя"), ("замена", "замену")
+])
+def test_stem_is_same_for_word_forms(short, long):
+    assert stem(short) == stem(long)
+
+def test_terms_skip_stop_words():
+    assert terms("Какой объем масла в машине?") == {stem("объем"), stem("масло")}
+
+def test_build_assigns_sections_to_pages(index):
+    assert index.section_title(13) == "Заправочные емкости"
+    assert index.section_title(22) == "Электрооборудование"
+    assert index.tables[2]["section"] == "Электрооборудование"
+
+def test_answer_from_table_rows(index):
+    result = index.lookup("Какой объем масла?")
+
+    assert result["kind"] == "answer"
+    assert "Моторное масло: 4,5 л" in result["text"]
+    assert result["page"] == "12"
+
+def test_answer_matches_inflected_forms(index):
+    result = index.lookup("Какой ток у предохранителя обогрева стекла?")
+
+    assert result["kind"] == "answer"
+    assert "F13: 20 / Обогрев заднего стекла" in result["text"]
+
+@pytest.mark.parametrize("query", ["масло", "10"])
+def test_single_term_is_never_a_direct_answer(index, query):
+    result = index.lookup(query)
+
+    assert result["kind"] == "context"
+    assert not result["complete"]
+
+def test_table_covering_question_is_complete_context(index):
+    result = index.lookup("интервал ТО")
+
+    assert result["kind"] == "context"
+    assert result["complete"]
+    assert result["text"].startswith("Таблица «Регламент ТО» (стр. 14)")
+
+@pytest.mark.parametrize("query, page", [("Как заменить масло?", "12"), ("Где находится F12?", "22")])
+def test_partially_matching_table_only_supplements_retrieval(index, query, page):
+    result = index.lookup(query)
+
+    assert result["kind"] == "context"
+    assert not result["complete"]
+    assert result["page"] == page
+
+def test_section_title_narrows_search(index):
+    result = index.lookup("Как поменять лампы?")
+
+    assert result["kind"] == "section"
+    assert (result["title"], result["page"], result["page_end"]) == ("Замена ламп", 24, 30)
+
+def test_unrelated_question_has_no_hit(index):
+    assert index.lookup("Почему горит индикатор подушки безопасности?") is None
+    assert index.lookup("Как?") is None
+
+def test_save_and_load(index, tmp_path):
+    index.path = str(tmp_path / "structure" / "manual.json")
+    index.save()
+
+    loaded = StructureIndex.load(index.path)
+    assert loaded.lookup("Какой объем масла?") == index.lookup("Какой объем масла?")
+    assert StructureIndex.load(str(tmp_path / "missing.json")) is None
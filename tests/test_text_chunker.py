@@ -0,0 +1,73 @@
+from utils.text_chunker import SentenceChunker, default_max_tokens, estimate_tokens
+
+def word_tokens(text: str) -> int:
+    """Токен на слово - чтобы размеры в тестах считались в уме"""
+    return len(text.split())
+
+def page(text: str, number: int = 1) -> dict:
+    return {"text": text, "page": number, "source": "manual.pdf"}
+
+def test_split_units_keeps_sentences_and_paragraph_ends():
+    chunker = SentenceChunker(max_tokens=50, count_tokens=word_tokens)
+    units = list(chunker.split_units("Проверьте уровень масла. Долейте масло.\n\nЗамените фильтр."))
+
+    assert [unit[0] for unit in units] == ["Проверьте уровень масла.", "Долейте масло.", "Замените фильтр."]
+    assert [unit[2] for unit in units] == [False, True, True]
+
+def test_split_units_ignores_abbreviations_and_hyphen_breaks():
+    chunker = SentenceChunker(max_tokens=50, count_tokens=word_tokens)
+    units = list(chunker.split_units("Давление в шинах 2.2 бар, т.е. по норме. Проверяйте по-\nмесячно."))
+
+    assert [unit[0] for unit in units] == ["Давление в шинах 2.2 бар, т.е. по норме.", "Проверяйте помесячно."]
+
+def test_long_sentence_is_split_by_words_within_limit():
+    chunker = SentenceChunker(max_tokens=4, count_tokens=word_tokens)
+    units = list(chunker.split_units(" ".join(f"слово{i}" for i in range(10))))
+
+    assert all(tokens <= 4 for _, tokens, _ in units)
+    assert " ".join(unit[0] for unit in units).split() == [f"слово{i}" for i in range(10)]
+
+def test_chunks_respect_token_limit_and_cover_text():
+    sentences = [f"Предложение номер {i} про масло." for i in range(20)]
+    chunker = SentenceChunker(max_tokens=12, count_tokens=word_tokens)
+    chunks = list(chunker.iter_chunks([page(" ".join(sentences))]))
+
+    assert len(chunks) > 1
+    assert all(chunk["tokens"] <= 12 for chunk in chunks)
+    assert all(chunk["tokens"] == word_tokens(chunk["text"]) for chunk in chunks)
+    assert " ".join(chunk["text"] for chunk in chunks) == " ".join(sentences)
+
+def test_overlap_repeats_last_sentences_of_previous_chunk():
+    sentences = [f"Предложение номер {i} про масло." for i in range(12)]
+    chunker = SentenceChunker(max_tokens=15, overlap_tokens=5, count_tokens=word_tokens)
+    chunks = list(chunker.iter_chunks([page(" ".join(sentences))]))
+
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current["text"].startswith(previous["text"].split(". ")[-1])
+        assert current["tokens"] <= 15
+    # Все предложения попали хотя бы в один чанк
+    joined = " ".join(chunk["text"] for chunk in chunks)
+    assert all(sentence in joined for sentence in sentences)
+
+def test_overlap_is_capped_at_half_of_chunk():
+    assert SentenceChunker(max_tokens=10, overlap_tokens=8).overlap_tokens == 5
+
+def test_chunk_spans_pages_with_page_range():
+    chunker = SentenceChunker(max_tokens=100, count_tokens=word_tokens)
+    chunks = list(chunker.iter_chunks([page("Первая страница.", 3), page("Вторая страница.", 4)]))
+
+    assert len(chunks) == 1
+    assert (chunks[0]["page"], chunks[0]["page_end"]) == (3, 4)
+    assert chunks[0]["source"] == "manual.pdf"
+
+def test_paragraph_closes_filled_chunk():
+    chunker = SentenceChunker(max_tokens=8, count_tokens=word_tokens)
+    chunks = list(chunker.iter_chunks([page("Один два три четыре пять шесть.\n\nСемь восемь.")]))
+
+    assert [chunk["text"] for chunk in chunks] == ["Один два три четыре пять шесть.", "Семь восемь."]
+
+def test_estimate_and_default_limit():
+    assert estimate_tokens("масло") == 2
+    assert default_max_tokens(100) == 100
+    assert default_max_tokens(10 ** 6) < 10 ** 6
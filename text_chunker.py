@@ -0,0 +1,142 @@
+import re
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from config.settings import settings
+
+WORD_RE = re.compile(r"\w+|[^\w\s]")
+PARAGRAPH_RE = re.compile(r"\n\s*\n")
+# Конец предложения: . ! ? … перед пробелом и заглавной буквой / цифрой / кавычкой
+SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+(?=[«\"(\[A-ZА-ЯЁ0-9•—-])")
+HYPHEN_BREAK_RE = re.compile(r"(\w)-\n(\w)")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Быстрая оценка числа токенов без токенизатора:
+    подсловные токенизаторы дробят русские слова примерно на 1 токен на каждые 5 букв.
+    """
+    return sum(len(word) // 5 + 1 for word in WORD_RE.findall(text))
+
+def default_max_tokens(embedding_limit: int) -> int:
+    """
+    Размер чанка: не больше, чем модель эмбеддингов видит целиком,
+    и так, чтобы CONTEXT_PASSAGES чанков помещались в num_ctx вместе с промптом и ответом.
+    """
+    generation_budget = (settings.OLLAMA_NUM_CTX - settings.OLLAMA_NUM_PREDICT
+                         - settings.PROMPT_RESERVE_TOKENS) // settings.CONTEXT_PASSAGES
+    return max(16, min(embedding_limit, generation_budget))
+
+class SentenceChunker:
+    """
+    Чанкер по границам предложений и абзацев с размером в токенах.
+    Чанк может переходить через границу страниц - тогда в нем записан диапазон page..page_end.
+    Работает за линейное время: каждое предложение токенизируется один раз,
+    текст чанка собирается одним join.
+    """
+
+    def __init__(self, max_tokens: int, overlap_tokens: int = 0,
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self.count_tokens = count_tokens or estimate_tokens
+        # Абзац закрывает чанк, если тот уже заполнен на 3/4
+        self.paragraph_flush_tokens = max_tokens * 3 // 4
+
+    def settings(self) -> Dict:
+        return {
+            "chunker": "sentence",
+            "max_tokens": self.max_tokens,
+            "overlap_tokens": self.overlap_tokens
+        }
+
+    def split_units(self, text: str) -> Iterator[Tuple[str, int, bool]]:
+        """Предложения страницы: (текст, токены, конец абзаца)"""
+        text = HYPHEN_BREAK_RE.sub(r"\1\2", text)
+
+        for paragraph in PARAGRAPH_RE.split(text):
+            paragraph = " ".join(paragraph.split())
+            if not paragraph:
+                continue
+
+            sentences = SENTENCE_END_RE.split(paragraph)
+            for i, sentence in enumerate(sentences):
+                is_last = i == len(sentences) - 1
+                tokens = self.count_tokens(sentence)
+
+                if tokens <= self.max_tokens:
+                    yield sentence, tokens, is_last
+                    continue
+
+                # Слишком длинное "предложение" (таблица, список) режем по словам
+                yield from self._split_long(sentence, tokens, is_last)
+
+    def _split_long(self, sentence: str, tokens: int,
+                    is_last: bool) -> Iterator[Tuple[str, int, bool]]:
+        words = sentence.split()
+        words_per_piece = max(1, len(words) * self.max_tokens // tokens)
+
+        for start in range(0, len(words), words_per_piece):
+            piece = " ".join(words[start:start + words_per_piece])
+            piece_is_last = is_last and start + words_per_piece >= len(words)
+            yield piece, self.count_tokens(piece), piece_is_last
+
+    def iter_chunks(self, documents: Iterable[Dict]) -> Iterator[Dict]:
+        """Чанки из потока страниц {"text", "page", "source"}"""
+        # Текущий чанк: (текст, токены, страница, смещение на странице)
+        current: deque = deque()
+        current_tokens = 0
+        source = None
+
+        def emit() -> Dict:
+            first, last = current[0], current[-1]
+            return {
+                "text": " ".join(unit[0] for unit in current),
+                "page": first[2],
+                "page_end": last[2],
+                "source": source,
+                "offset": first[3],
+                "tokens": current_tokens
+            }
+
+        # Сколько предложений добавлено после последнего чанка (без перекрытия)
+        fresh = 0
+
+        for doc in documents:
+            source = doc["source"]
+            offset = 0
+
+            for sentence, tokens, paragraph_end in self.split_units(doc["text"]):
+                if current and current_tokens + tokens > self.max_tokens:
+                    if fresh:
+                        yield emit()
+                    current_tokens = self._keep_overlap(current, tokens)
+                    fresh = 0
+
+                current.append((sentence, tokens, doc["page"], offset))
+                current_tokens += tokens
+                offset += 1
+                fresh += 1
+
+                if paragraph_end and current_tokens >= self.paragraph_flush_tokens:
+                    yield emit()
+                    current_tokens = self._keep_overlap(current, 0)
+                    fresh = 0
+
+        if fresh:
+            yield emit()
+
+    def _keep_overlap(self, current: deque, next_tokens: int) -> int:
+        """Оставляет в начале следующего чанка последние предложения в пределах overlap_tokens"""
+        budget = min(self.overlap_tokens, self.max_tokens - next_tokens)
+        kept: List = []
+        kept_tokens = 0
+
+        while current:
+            unit = current.pop()
+            if kept_tokens + unit[1] > budget:
+                break
+            kept.append(unit)
+            kept_tokens += unit[1]
+
+        current.clear()
+        current.extend(reversed(kept))
+        return kept_tokens
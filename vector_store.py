@@ -1,110 +1,257 @@
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from sentence_transformers import SentenceTransformer
+import os
+import threading
 import uuid
 from typing import List, Dict, Optional
+import numpy as np
+from database.embedding_engine import EmbeddingEngine, embedding_engine
+from database.lexical_index import LexicalIndex
+from config.settings import settings
+from utils.metrics import metrics
 
 class VectorDatabase:
-    """Класс для работы с векторной базой данных ChromaDB"""
+    """
+    Класс для работы с векторной базой данных.
+    Хранилище (ChromaDB или numpy) выбирается Settings.VECTOR_BACKEND,
+    коллекции обоих бэкендов поддерживают одинаковый набор операций.
+    """
     
-    def __init__(self, pdf_name: Optional[str] = None):
+    def __init__(self, pdf_name: Optional[str] = None,
+                 engine: Optional[EmbeddingEngine] = None,
+                 shared: Optional[bool] = None):
         """
         Инициализация векторной базы.
         Если указан pdf_name - создается коллекция с уникальным именем для этого PDF.
+        В режиме общей коллекции (SHARED_COLLECTION) все PDF лежат в одной коллекции,
+        а операции ограничиваются фильтром по метаданным source; без pdf_name
+        такой объект видит весь каталог.
+        Модель эмбеддингов и клиент ChromaDB берутся из общего движка процесса.
         """
         self.pdf_name = pdf_name
-        self.persist_directory = "data/vector_db/"
+        self.engine = engine or embedding_engine
+        self.persist_directory = self.engine.persist_directory
+        self.client = self.engine.client
+        self.shared = settings.SHARED_COLLECTION if shared is None else shared
         
-        # Модель для эмбеддингов
-        self.embedding_model = SentenceTransformer(
-            "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-        )
-        
-        # Инициализация ChromaDB
-        self.client = chromadb.PersistentClient(
-            path=self.persist_directory,
-            settings=ChromaSettings(anonymized_telemetry=False)
-        )
+        # Создаем безопасное имя (убираем расширение .pdf и спецсимволы)
+        safe_name = (pdf_name.replace('.pdf', '').replace(' ', '_').replace('-', '_').lower()
+                     if pdf_name else "default")
         
-        # УНИКАЛЬНОЕ имя коллекции для каждого PDF
-        if pdf_name:
-            # Создаем безопасное имя коллекции (убираем расширение .pdf и спецсимволы)
-            safe_name = pdf_name.replace('.pdf', '').replace(' ', '_').replace('-', '_').lower()
-            collection_name = f"pdf_{safe_name}"
+        if self.shared:
+            collection_name = settings.SHARED_COLLECTION_NAME
+            # id чанков уникальны только внутри PDF - в общей коллекции добавляем префикс
+            self.where = {"source": pdf_name} if pdf_name else None
+            self.id_prefix = f"{safe_name}:" if pdf_name else ""
+            self.lexical_name = f"{collection_name}__{safe_name}"
         else:
-            collection_name = "pdf_default"
+            # УНИКАЛЬНОЕ имя коллекции для каждого PDF
+            collection_name = f"pdf_{safe_name}"
+            self.where = None
+            self.id_prefix = ""
+            self.lexical_name = collection_name
         
         # Создание или получение коллекции
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
             metadata={
                 "hnsw:space": "cosine",
-                "source_pdf": pdf_name if pdf_name else "default"
+                "source_pdf": "catalogue" if self.shared else (pdf_name or "default")
             }
         )
         
+        self._lexical_index: Optional[LexicalIndex] = None
+        self._lexical_lock = threading.Lock()
+        self._count: Optional[int] = None
+        
         print(f"📁 Коллекция: '{collection_name}' (PDF: {pdf_name or 'default'})")
     
-    def create_embeddings(self, texts: List[str]) -> List[List[float]]:
+    @property
+    def lexical_index(self) -> LexicalIndex:
+        """BM25-индекс коллекции: загружается с диска или строится по документам Chroma"""
+        if self._lexical_index is None:
+            with self._lexical_lock:
+                if self._lexical_index is None:
+                    index = LexicalIndex(
+                        path=os.path.join(self.persist_directory, "lexical", f"{self.lexical_name}.json"),
+                        k1=settings.BM25_K1,
+                        b=settings.BM25_B
+                    )
+                    if not index.load() or len(index) != self.count():
+                        index = LexicalIndex(path=index.path, k1=index.k1, b=index.b)
+                        data = self.collection.get(where=self.where, include=["documents"])
+                        index.add_many(zip(self._local_ids(data["ids"]), data["documents"]))
+                        index.save()
+                    self._lexical_index = index
+        return self._lexical_index
+    
+    def _store_ids(self, ids: List[str]) -> List[str]:
+        return [self.id_prefix + chunk_id for chunk_id in ids]
+    
+    def _local_ids(self, ids: List[str]) -> List[str]:
+        prefix_length = len(self.id_prefix)
+        return [chunk_id[prefix_length:] for chunk_id in ids]
+    
+    def count(self) -> int:
+        """Число чанков этого PDF (в общей коллекции - по фильтру source)"""
+        if self.where is None:
+            return self.collection.count()
+        if self._count is None:
+            self._count = len(self.collection.get(where=self.where, include=[])["ids"])
+        return self._count
+    
+    def create_embeddings(self, texts: List[str]) -> np.ndarray:
         """Создание эмбеддингов для текстов"""
-        return self.embedding_model.encode(texts).tolist()
+        return self.engine.encode(texts, batch_size=settings.EMBED_BATCH_SIZE)
     
     def add_documents(self, documents: List[Dict]):
-        """Добавление документов в векторную базу"""
+        """Добавление документов в векторную базу (запись пакетами ограниченного размера)"""
         if not self.pdf_name:
             raise ValueError("Не указано имя PDF для добавления документов")
         
+        batch_size = settings.INDEX_WRITE_BATCH_SIZE
+        for start in range(0, len(documents), batch_size):
+            # Время эмбеддингов вычитается из этапа index и пишется в embed
+            with metrics.span("index"):
+                self._add_batch(documents[start:start + batch_size])
+        
+        print(f"✅ Добавлено {len(documents)} чанков в коллекцию для '{self.pdf_name}'")
+    
+    def _add_batch(self, documents: List[Dict]):
         texts = [doc["text"] for doc in documents]
+        # Детерминированные id приходят от индексатора, uuid - только для старых вызовов
+        ids = [doc.get("id") or str(uuid.uuid4()) for doc in documents]
         metadatas = [
             {
                 "source": self.pdf_name,
                 "page": doc.get("page", 0),
-                "chunk_id": str(uuid.uuid4())[:8]
+                "page_end": doc.get("page_end", doc.get("page", 0)),
+                "chunk_id": chunk_id
             } 
-            for doc in documents
+            for doc, chunk_id in zip(documents, ids)
         ]
         
         embeddings = self.create_embeddings(texts)
-        ids = [str(uuid.uuid4()) for _ in range(len(texts))]
         
-        self.collection.add(
+        self.collection.upsert(
             embeddings=embeddings,
             documents=texts,
             metadatas=metadatas,
-            ids=ids
+            ids=self._store_ids(ids)
         )
+        self._count = None
         
-        print(f"✅ Добавлено {len(documents)} чанков в коллекцию для '{self.pdf_name}'")
+        if settings.HYBRID_SEARCH:
+            self.lexical_index.add_many(zip(ids, texts))
+    
+    def flush(self):
+        """Сохранение лексического индекса (и коллекции numpy) после загрузки документов"""
+        persist = getattr(self.collection, "persist", None)
+        if persist is not None:
+            persist()
+        if self._lexical_index is not None:
+            self._lexical_index.save()
     
-    def search(self, query: str, n_results: int = 5) -> List[Dict]:
+    def get_ids(self) -> List[str]:
+        """Все id чанков в коллекции"""
+        return self._local_ids(self.collection.get(where=self.where, include=[])["ids"])
+    
+    def delete_ids(self, ids: List[str]):
+        """Удаление чанков по id"""
+        if ids:
+            self.collection.delete(ids=self._store_ids(ids))
+            self._count = None
+            if settings.HYBRID_SEARCH:
+                self.lexical_index.remove(ids)
+            print(f"🗑️ Удалено {len(ids)} устаревших чанков из коллекции '{self.collection.name}'")
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Эмбеддинг поискового запроса (с кэшем и микробатчингом)"""
+        return self.engine.embed_query(query)
+    
+    def search(self, query: str, n_results: int = 5,
+               query_embedding: Optional[np.ndarray] = None) -> List[Dict]:
         """Поиск релевантных документов в текущей коллекции"""
-        if not self.collection.count():
+        if not self.count():
             return []  # Коллекция пуста
         
-        query_embedding = self.create_embeddings([query])[0]
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        
+        candidates = max(n_results, settings.HYBRID_CANDIDATES) if settings.HYBRID_SEARCH else n_results
         
         results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results,
+            query_embeddings=np.asarray(query_embedding, dtype=np.float32).reshape(1, -1),
+            n_results=candidates,
+            where=self.where,
             include=["documents", "metadatas", "distances"]
         )
         
         formatted_results = []
         if results["documents"] and len(results["documents"][0]) > 0:
+            ids = self._local_ids(results["ids"][0])
             for i in range(len(results["documents"][0])):
                 formatted_results.append({
+                    "id": ids[i],
                     "text": results["documents"][0][i],
                     "metadata": results["metadatas"][0][i],
                     "score": 1 - results["distances"][0][i]
                 })
         
-        return formatted_results
+        # Без pdf_name в общей коллекции (поиск по всему каталогу) - только векторный поиск
+        if not settings.HYBRID_SEARCH or (self.shared and not self.pdf_name):
+            return formatted_results[:n_results]
+        
+        return self._fuse_lexical(query, formatted_results)[:n_results]
+    
+    def _fuse_lexical(self, query: str, vector_results: List[Dict]) -> List[Dict]:
+        """
+        Гибридный поиск: объединение плотного и BM25-ранжирования через reciprocal rank fusion.
+        score остается в шкале 0..1: косинусная близость или нормированный BM25 (что больше).
+        """
+        lexical_results = self.lexical_index.search(query, settings.HYBRID_CANDIDATES)
+        rrf_k = settings.RRF_K
+        
+        fused: Dict[str, Dict] = {}
+        for rank, result in enumerate(vector_results):
+            fused[result["id"]] = dict(result, rrf_score=1 / (rrf_k + rank + 1), lexical_score=0.0)
+        
+        lexical_only = []
+        for rank, (doc_id, bm25) in enumerate(lexical_results):
+            lexical_score = bm25 / (bm25 + settings.BM25_HALF_SCORE)
+            if doc_id not in fused:
+                fused[doc_id] = {"id": doc_id, "score": 0.0, "rrf_score": 0.0}
+                lexical_only.append(doc_id)
+            entry = fused[doc_id]
+            entry["rrf_score"] += 1 / (rrf_k + rank + 1)
+            entry["lexical_score"] = lexical_score
+            entry["score"] = max(entry["score"], lexical_score)
+        
+        if lexical_only:
+            data = self.collection.get(ids=self._store_ids(lexical_only), include=["documents", "metadatas"])
+            for doc_id, text, metadata in zip(self._local_ids(data["ids"]), data["documents"], data["metadatas"]):
+                fused[doc_id].update({"text": text, "metadata": metadata})
+        
+        return sorted(
+            (result for result in fused.values() if "text" in result),
+            key=lambda result: result["rrf_score"],
+            reverse=True
+        )
+    
+    def search_by_source(self, query: str, n_results: int = 30,
+                         per_source: int = 2) -> Dict[str, List[Dict]]:
+        """Поиск с группировкой результатов по PDF (для поиска по всем руководствам)"""
+        grouped: Dict[str, List[Dict]] = {}
+        for result in self.search(query, n_results):
+            source = result["metadata"].get("source", self.pdf_name or "default")
+            if len(grouped.setdefault(source, [])) < per_source:
+                grouped[source].append(result)
+        return grouped
     
     def get_collection_info(self) -> Dict:
         """Получение информации о коллекции"""
         return {
             "name": self.collection.name,
             "pdf_name": self.pdf_name,
-            "count": self.collection.count(),
+            "count": self.count(),
+            "backend": settings.VECTOR_BACKEND,
             "metadata": self.collection.metadata
         }
\ No newline at end of file